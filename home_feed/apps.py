@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def _repair_fts_index(sender, using, **kwargs):
+    from .fts import ensure_fts_triggers
+    ensure_fts_triggers(using)
 
 
 class HomeFeedConfig(AppConfig):
     default_auto_field: str = 'django.db.models.BigAutoField'
     name = 'home_feed'
+
+    def ready(self):
+        from .profiling import start_tracemalloc
+
+        post_migrate.connect(_repair_fts_index, sender=self)
+        start_tracemalloc()
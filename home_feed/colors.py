@@ -0,0 +1,300 @@
+import io
+import logging
+import re
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ImageColor, ImageURL
+
+logger = logging.getLogger(__name__)
+
+Color = ImageColor.Color
+HEX_COLOR_RE = re.compile(r'^#?([0-9a-fA-F]{6})$')
+
+# Upper hue bound (degrees) of each chromatic bucket; red wraps around 360
+_HUE_EDGES = np.array([15, 45, 70, 165, 195, 255, 310, 345])
+_HUE_BUCKETS = np.array([Color.RED, Color.ORANGE, Color.YELLOW, Color.GREEN, Color.TEAL,
+                         Color.BLUE, Color.PURPLE, Color.PINK, Color.RED])
+
+
+def quantize_colors(rgb):
+    """
+    Map RGB colors (0-255, shape (..., 3)) to ImageColor.Color buckets
+
+    Very dark colors are black, unsaturated ones white or gray, dark
+    oranges brown; everything else is bucketed by hue.
+    """
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    value = rgb.max(axis=-1)
+    delta = value - rgb.min(axis=-1)
+    saturation = np.where(value > 0, delta / np.maximum(value, 1e-9), 0.0)
+
+    safe = np.where(delta > 0, delta, 1.0)
+    hue = 60.0 * np.select(
+        [delta == 0, value == r, value == g],
+        [0.0, ((g - b) / safe) % 6, (b - r) / safe + 2],
+        (r - g) / safe + 4
+    )
+    chromatic = _HUE_BUCKETS[np.searchsorted(_HUE_EDGES, hue, side='right')]
+
+    return np.select(
+        [
+            value < 0.2,
+            (saturation < 0.15) & (value > 0.85),
+            saturation < 0.15,
+            (hue >= 15) & (hue < 45) & (value < 0.6),
+        ],
+        [Color.BLACK, Color.WHITE, Color.GRAY, Color.BROWN],
+        chromatic
+    ).astype(np.int64)
+
+
+def parse_color(value):
+    """
+    Color bucket for a `color=` parameter: a bucket name or '#rrggbb'
+
+    Raises:
+        ValueError: if the value is neither
+    """
+    value = (value or '').strip()
+    if value.upper() in Color.names:
+        return int(Color[value.upper()])
+    match = HEX_COLOR_RE.match(value)
+    if not match:
+        raise ValueError(f'Unknown color: {value}')
+    rgb = [int(match.group(1)[i:i + 2], 16) for i in (0, 2, 4)]
+    return int(quantize_colors(rgb))
+
+
+def pixel_buffer(image_bytes, size):
+    """
+    Decode an image into a (size * size, 3) uint8 RGB sample
+
+    The aspect ratio is not kept; only the color distribution matters.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img.draft('RGB', (size * 2, size * 2))
+        sample = img.convert('RGB').resize((size, size), Image.Resampling.BILINEAR)
+        return np.asarray(sample, dtype=np.uint8).reshape(-1, 3)
+
+
+def kmeans(pixels, k, iterations):
+    """
+    Lloyd's k-means run on a whole batch of images at once
+
+    Every step is a handful of array operations over all images, so the
+    Python overhead is per iteration rather than per image: distances are
+    computed in place per centroid over the (images, pixels) planes and the centroid
+    update is one bincount per channel, with labels offset by image so all
+    clusters of the batch are summed in a single pass. Centroids start at
+    evenly spaced luminance quantiles, which is deterministic and spreads
+    them across dark and light regions.
+
+    Args:
+        pixels (np.ndarray): (images, pixels, 3) float32
+        k (int): Clusters per image
+        iterations (int): Upper bound on Lloyd iterations
+
+    Returns:
+        tuple: (centroids (images, k, 3), shares (images, k))
+    """
+    batch, count, _ = pixels.shape
+    channels = [np.ascontiguousarray(pixels[..., c]) for c in range(3)]
+    luma = 0.299 * channels[0] + 0.587 * channels[1] + 0.114 * channels[2]
+    quantiles = (np.arange(k) * 2 + 1) * count // (2 * k)
+    seeds = np.argsort(luma, axis=1)[:, quantiles]
+    centroids = np.take_along_axis(pixels, seeds[..., None], axis=1)
+    offsets = (np.arange(batch) * k)[:, None]
+    # Preallocated planes; the loop below does its arithmetic in place
+    best = np.empty((batch, count), dtype=np.float32)
+    distance = np.empty_like(best)
+    scratch = np.empty_like(best)
+    nearest = np.empty((batch, count), dtype=np.intp)
+
+    for _ in range(iterations):
+        best.fill(np.inf)
+        for j in range(k):
+            np.subtract(channels[0], centroids[:, j, 0, None], out=distance)
+            np.square(distance, out=distance)
+            for c in (1, 2):
+                np.subtract(channels[c], centroids[:, j, c, None], out=scratch)
+                np.square(scratch, out=scratch)
+                distance += scratch
+            closer = distance < best
+            np.copyto(best, distance, where=closer)
+            np.copyto(nearest, j, where=closer)
+        labels = (nearest + offsets).ravel()
+
+        counts = np.bincount(labels, minlength=batch * k).reshape(batch, k)
+        sums = np.stack([
+            np.bincount(labels, weights=channels[c].ravel(), minlength=batch * k).reshape(batch, k)
+            for c in range(3)
+        ], axis=-1)
+        # Empty clusters keep their previous centroid
+        updated = np.where(counts[..., None] > 0, sums / np.maximum(counts, 1)[..., None], centroids)
+        updated = updated.astype(np.float32)
+        shift = np.abs(updated - centroids).max()
+        centroids = updated
+        if shift < 1.0:
+            break
+
+    return centroids, counts / count
+
+
+def _pixel_result(size):
+    def pixel_result(result):
+        """Runs in the fetcher's worker threads so decoding is parallel too"""
+        from PIL import Image
+
+        if not result.ok:
+            return None
+        try:
+            return pixel_buffer(result.content, size)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+    return pixel_result
+
+
+def summarize(centroids, shares, min_share):
+    """
+    Palette and bucket shares of one image's clusters
+
+    Returns:
+        tuple: (hex colors by decreasing share, {bucket: share} for buckets
+               covering at least min_share of the image)
+    """
+    order = np.argsort(-shares)
+    palette = [
+        '#{:02x}{:02x}{:02x}'.format(*np.clip(np.rint(centroids[i]), 0, 255).astype(int))
+        for i in order if shares[i] > 0
+    ]
+    buckets = {}
+    for bucket, share in zip(quantize_colors(centroids).tolist(), shares.tolist()):
+        buckets[bucket] = buckets.get(bucket, 0.0) + share
+    return palette, {bucket: share for bucket, share in buckets.items() if share >= min_share}
+
+
+def extract_colors(batch_size=None, fetcher=None):
+    """
+    Store the dominant colors of active images that have not been processed
+
+    Images are downloaded and downsampled in the fetcher's thread pool, then
+    clustered together in one batched k-means per batch. Images that cannot
+    be decoded are stamped anyway so they are not retried on every scrape.
+
+    Returns:
+        dict: extracted and failed counts plus images_per_second
+    """
+    # Ingest-only dependencies (requests, Pillow) stay out of web workers
+    from .fetch import ImageFetcher
+
+    config = settings.COLOR_EXTRACTION
+    batch_size = batch_size or config['BATCH_SIZE']
+
+    started = time.monotonic()
+    stats = {'extracted': 0, 'failed': 0}
+    own_fetcher = fetcher is None
+    fetcher = fetcher or ImageFetcher()
+
+    try:
+        last_id = 0
+        while True:
+            batch = list(
+                ImageURL.objects.filter(is_active=True, colors_extracted_at__isnull=True, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'src')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            buffers = fetcher.map(_pixel_result(config['SAMPLE_SIZE']), [src for _, src in batch])
+            decoded = [i for i, buffer in enumerate(buffers) if buffer is not None]
+            clusters = {}
+            if decoded:
+                pixels = np.stack([buffers[i] for i in decoded]).astype(np.float32)
+                centroids, shares = kmeans(pixels, config['CLUSTERS'], config['ITERATIONS'])
+                clusters = {index: (centroids[n], shares[n]) for n, index in enumerate(decoded)}
+
+            now = timezone.now()
+            updates = []
+            colors = []
+            for index, (image_id, src) in enumerate(batch):
+                image = ImageURL(id=image_id, palette=[], colors_extracted_at=now)
+                if index in clusters:
+                    image.palette, buckets = summarize(*clusters[index], config['MIN_SHARE'])
+                    colors.extend(
+                        ImageColor(image_id=image_id, color=bucket, share=share)
+                        for bucket, share in buckets.items()
+                    )
+                    stats['extracted'] += 1
+                else:
+                    stats['failed'] += 1
+                    logger.debug(f"Could not decode {src}")
+                updates.append(image)
+
+            ImageColor.objects.bulk_create(colors, ignore_conflicts=True)
+            ImageURL.objects.bulk_update(updates, ['palette', 'colors_extracted_at'])
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    if stats['extracted']:
+        color_index.invalidate()
+
+    elapsed = time.monotonic() - started
+    processed = stats['extracted'] + stats['failed']
+    stats['images_per_second'] = processed / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Color extraction: {stats['extracted']} images, {stats['failed']} failed "
+        f"({stats['images_per_second']:.1f} images/s)"
+    )
+    return stats
+
+
+class ColorIndex:
+    """
+    Per-process id arrays of the active images of each color
+
+    Loaded lazily from the (color, image) index and reloaded after
+    INDEX_TTL_SECONDS, so a color= feed samples in memory instead of
+    sorting the matching rows randomly on every request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self._ids = {}
+
+    def invalidate(self):
+        self._ids = {}
+
+    def ids(self, color):
+        entry = self._ids.get(color)
+        if entry is None or time.monotonic() - entry[0] > settings.COLOR_EXTRACTION['INDEX_TTL_SECONDS']:
+            with self._lock:
+                rows = (
+                    ImageColor.objects.filter(color=color, image__is_active=True)
+                    .values_list('image_id', flat=True)
+                    .iterator(chunk_size=10000)
+                )
+                entry = (time.monotonic(), np.fromiter(rows, dtype=np.int64))
+                self._ids[color] = entry
+        return entry[1]
+
+    def sample(self, color, count):
+        """Up to `count` distinct random ids of images with this color"""
+        ids = self.ids(color)
+        if ids.size <= count:
+            return ids.tolist()
+        return ids[self._rng.choice(ids.size, size=count, replace=False)].tolist()
+
+
+color_index = ColorIndex()
@@ -0,0 +1,219 @@
+import io
+import logging
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from .fetch import ImageFetcher
+from .models import ImageURL
+from .pools import response_pools
+from .sampling import weighted_sampler
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = 8
+_DCT_SIZE = 32
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis so that dct(x) = M @ x"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+# Bits set per byte value, for CPUs/NumPy builds without bitwise_count
+_POPCOUNT8 = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def perceptual_hash(image_bytes):
+    """
+    64-bit DCT perceptual hash (pHash) of an encoded image
+
+    The image is reduced to 32x32 grayscale, transformed with a 2D DCT and
+    the 8x8 lowest frequencies are thresholded at their median. Rescaled,
+    recompressed or lightly edited copies land within a few bits.
+
+    Raises:
+        OSError / ValueError: if the bytes are not a decodable image
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        # Let JPEG decode at reduced size; much faster than a full decode
+        img.draft('L', (_DCT_SIZE * 2, _DCT_SIZE * 2))
+        pixels = np.asarray(
+            img.convert('L').resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.LANCZOS),
+            dtype=np.float64
+        )
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE].ravel()
+    # The DC term only reflects overall brightness, keep it out of the median
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def to_signed(value):
+    """Store an unsigned 64-bit hash in a signed BIGINT column"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def hamming_distances(hashes, value):
+    """Hamming distance from `value` to every hash in a uint64 array"""
+    diff = np.bitwise_xor(hashes, np.uint64(value))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(diff)
+    return _POPCOUNT8[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class HashIndex:
+    """
+    In-memory index of perceptual hashes for near-duplicate lookups
+
+    A lookup is one vectorized XOR + popcount pass over a contiguous uint64
+    array (8 bytes per image), which takes a few milliseconds per million
+    hashes and needs no tuning, unlike BK-trees or multi-index hashing.
+    """
+
+    def __init__(self, ids=None, hashes=None):
+        ids = np.asarray(ids if ids is not None else [], dtype=np.int64)
+        hashes = np.asarray(hashes if hashes is not None else [], dtype=np.int64).view(np.uint64)
+        capacity = max(1024, ids.size * 2)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._hashes = np.empty(capacity, dtype=np.uint64)
+        self._ids[:ids.size] = ids
+        self._hashes[:ids.size] = hashes
+        self._size = ids.size
+
+    @classmethod
+    def from_db(cls):
+        """Index every active image that already has a hash"""
+        rows = (
+            ImageURL.objects.filter(is_active=True, phash__isnull=False)
+            .order_by('id')
+            .values_list('id', 'phash')
+            .iterator(chunk_size=10000)
+        )
+        ids = []
+        hashes = []
+        for image_id, phash in rows:
+            ids.append(image_id)
+            hashes.append(phash)
+        return cls(ids, hashes)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, image_id, value):
+        if self._size == self._ids.size:
+            self._ids = np.resize(self._ids, self._size * 2)
+            self._hashes = np.resize(self._hashes, self._size * 2)
+        self._ids[self._size] = image_id
+        self._hashes[self._size] = np.uint64(value)
+        self._size += 1
+
+    def nearest(self, value, max_distance):
+        """
+        Closest indexed image within `max_distance` bits
+
+        Returns:
+            tuple: (image_id, distance), or None if nothing is close enough
+        """
+        if not self._size:
+            return None
+        distances = hamming_distances(self._hashes[:self._size], value)
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return int(self._ids[best]), int(distances[best])
+
+
+def _hash_result(result):
+    """Runs in the fetcher's worker threads so decoding is parallel too"""
+    if not result.ok:
+        return None, result.error
+    try:
+        return perceptual_hash(result.content), None
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        return None, f'Undecodable image: {e}'
+
+
+def detect_near_duplicates(batch_size=None, max_distance=None, fetcher=None):
+    """
+    Hash every active image without a perceptual hash and deactivate near-duplicates
+
+    An image whose hash is within `max_distance` bits of an already indexed
+    active image is marked inactive with `duplicate_of` pointing at it, so
+    the first copy ingested wins. Images that fail to download are left
+    unhashed and retried on the next run.
+
+    Returns:
+        dict: hashed, duplicates and failed counts plus images_per_second
+    """
+    config = settings.NEAR_DUPLICATES
+    batch_size = batch_size or config['BATCH_SIZE']
+    max_distance = config['MAX_DISTANCE'] if max_distance is None else max_distance
+
+    started = time.monotonic()
+    index = HashIndex.from_db()
+    stats = {'hashed': 0, 'duplicates': 0, 'failed': 0}
+    own_fetcher = fetcher is None
+    fetcher = fetcher or ImageFetcher()
+
+    try:
+        last_id = 0
+        while True:
+            # Keyset pagination: failed images stay unhashed without looping forever
+            batch = list(
+                ImageURL.objects.filter(is_active=True, phash__isnull=True, id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'src')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            originals = []
+            duplicates = []
+            hashes = fetcher.map(_hash_result, [src for _, src in batch])
+            for (image_id, src), (value, error) in zip(batch, hashes):
+                if value is None:
+                    stats['failed'] += 1
+                    logger.debug(f"Could not hash {src}: {error}")
+                    continue
+
+                image = ImageURL(id=image_id, phash=to_signed(value))
+                match = index.nearest(value, max_distance)
+                if match:
+                    image.duplicate_of_id = match[0]
+                    duplicates.append(image)
+                else:
+                    index.add(image_id, value)
+                    originals.append(image)
+
+            # is_active is only ever cleared here, never written back: a row
+            # deactivated while this batch was downloading stays inactive
+            with transaction.atomic():
+                ImageURL.objects.bulk_update(originals, ['phash'])
+                ImageURL.objects.bulk_update(duplicates, ['phash', 'duplicate_of'])
+                ImageURL.objects.filter(id__in=[image.id for image in duplicates]).update(is_active=False)
+            stats['hashed'] += len(originals) + len(duplicates)
+            stats['duplicates'] += len(duplicates)
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    if stats['duplicates']:
+        weighted_sampler.invalidate()
+        transaction.on_commit(response_pools.invalidate)
+
+    elapsed = time.monotonic() - started
+    stats['images_per_second'] = (stats['hashed'] + stats['failed']) / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Near-duplicate scan: hashed {stats['hashed']}, deactivated {stats['duplicates']} duplicates, "
+        f"{stats['failed']} failed ({stats['images_per_second']:.1f} images/s)"
+    )
+    return stats
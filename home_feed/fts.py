@@ -0,0 +1,95 @@
+import logging
+from contextlib import contextmanager
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# FTS5 index over ImageURL.alt (created by migration 0002)
+FTS_TABLE = 'home_feed_imageurl_fts'
+CONTENT_TABLE = 'home_feed_imageurl'
+
+TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {CONTENT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, alt) VALUES (new.id, new.alt);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {CONTENT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, alt) VALUES ('delete', old.id, old.alt);
+        END
+    """,
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF alt ON {CONTENT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, alt) VALUES ('delete', old.id, old.alt);
+            INSERT INTO {FTS_TABLE}(rowid, alt) VALUES (new.id, new.alt);
+        END
+    """,
+}
+
+
+def ensure_fts_triggers(using='default'):
+    """
+    Recreate the FTS sync triggers if a migration dropped them
+
+    SQLite applies most ALTERs to ImageURL by rebuilding the table, which
+    silently drops its triggers. Missing triggers are recreated and the
+    index is rebuilt so it matches the table again.
+
+    Returns:
+        bool: True if the triggers had to be repaired
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s",
+            [f'{FTS_TABLE}%']
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            # Migration 0002 has not been applied yet
+            return False
+
+        missing = [name for name in TRIGGERS if name not in existing]
+        if not missing:
+            return False
+
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    logger.info(f"Recreated FTS triggers {', '.join(missing)} and rebuilt {FTS_TABLE}")
+    return True
+
+
+@contextmanager
+def bulk_index(cursor):
+    """
+    Index rows inserted inside the block with one statement instead of a trigger per row
+
+    The insert trigger is dropped for the block and the new rows are added
+    to the index in a single INSERT ... SELECT afterwards. Must run inside a
+    transaction: dropping the trigger takes the write lock, so no other
+    connection can insert rows that would be missed, and readers never see
+    the table without its trigger.
+    """
+    name = f'{FTS_TABLE}_ai'
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [name])
+    if cursor.fetchone() is None:
+        # No FTS index yet (or a non-default setup): nothing to maintain
+        yield
+        return
+
+    cursor.execute(f'DROP TRIGGER {name}')
+    cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {CONTENT_TABLE}')
+    last_id = cursor.fetchone()[0]
+    yield
+    cursor.execute(
+        f'INSERT INTO {FTS_TABLE}(rowid, alt) SELECT id, alt FROM {CONTENT_TABLE} WHERE id > %s',
+        [last_id]
+    )
+    cursor.execute(TRIGGERS[name])
@@ -0,0 +1,142 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import ImageImpression, ImageURL
+
+logger = logging.getLogger(__name__)
+
+
+class ImpressionBuffer:
+    """
+    Per-worker impression counter
+
+    record() only bumps an in-memory dict; a background thread writes the
+    counts as one batched upsert every FLUSH_SECONDS (or as soon as
+    MAX_PENDING distinct images are buffered), and they are written again
+    at interpreter exit. Request threads never wait for the database here,
+    and a crashed worker loses at most one flush interval of counts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def record(self, image_ids):
+        """Count one impression for each id (never writes on the caller's thread while the flusher runs)"""
+        with self._lock:
+            counts = self._counts
+            for image_id in image_ids:
+                counts[image_id] = counts.get(image_id, 0) + 1
+            pending = len(counts)
+
+        if pending >= settings.IMPRESSIONS['MAX_PENDING']:
+            if self.running():
+                self._wakeup.set()
+            else:
+                self.flush()  # Commands and shells have no flusher thread
+
+    def pending(self):
+        """Snapshot of counts not yet written to the database"""
+        with self._lock:
+            return dict(self._counts)
+
+    def flush(self):
+        """
+        Write buffered counts as one batched upsert
+
+        Returns:
+            int: Number of images whose counters were updated
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+
+        table = ImageImpression._meta.db_table
+        now = timezone.now()
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Images deleted since they were served are skipped by the EXISTS guard
+                cursor.executemany(
+                    f"""
+                    INSERT INTO {table} (image_id, served_count, last_served_at)
+                    SELECT %s, %s, %s
+                    WHERE EXISTS (SELECT 1 FROM {ImageURL._meta.db_table} WHERE id = %s)
+                    ON CONFLICT (image_id) DO UPDATE SET
+                        served_count = {table}.served_count + excluded.served_count,
+                        last_served_at = excluded.last_served_at
+                    """,
+                    [(image_id, count, now, image_id) for image_id, count in counts.items()]
+                )
+        except Exception as e:
+            logger.error(f"Failed to flush {len(counts)} impression counters: {e}")
+            self._restore(counts)
+            return 0
+
+        return len(counts)
+
+    def _restore(self, counts):
+        """Put unflushed counts back, dropping them if the buffer is already full"""
+        with self._lock:
+            if len(self._counts) + len(counts) > settings.IMPRESSIONS['MAX_PENDING'] * 2:
+                logger.warning(f"Dropping {len(counts)} impression counters after failed flush")
+                return
+            for image_id, count in counts.items():
+                self._counts[image_id] = self._counts.get(image_id, 0) + count
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(settings.IMPRESSIONS['FLUSH_SECONDS'])
+            self._wakeup.clear()
+            close_old_connections()
+            self.flush()
+        connection.close()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background flush thread (idempotent, per process)"""
+        with self._lock:
+            if self.running():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='impression-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def get_served_counts():
+    """
+    All persisted serve counts
+
+    Returns:
+        tuple: (image_ids, served_counts) lists ordered by image id
+    """
+    rows = ImageImpression.objects.order_by('image_id').values_list('image_id', 'served_count')
+    image_ids = []
+    served_counts = []
+    for image_id, served_count in rows.iterator(chunk_size=10000):
+        image_ids.append(image_id)
+        served_counts.append(served_count)
+    return image_ids, served_counts
+
+
+impression_buffer = ImpressionBuffer()
+atexit.register(impression_buffer.flush)
+
+
+def start_impression_flusher():
+    """Called from the WSGI/ASGI entry points so only server processes run the flush thread"""
+    impression_buffer.start()
@@ -0,0 +1,206 @@
+"""
+The one path by which scraped or imported pins become ImageURL rows
+
+Rows are validated, de-duplicated within the run and written in chunks,
+each in its own short transaction. On SQLite a chunk is a single
+executemany of INSERT OR IGNORE, whose rowcount gives the exact number of
+new rows, with the full-text index updated once per chunk; other databases
+pre-filter existing URLs and use bulk_create.
+"""
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fts import bulk_index
+from .models import ImageURL
+from .pools import response_pools
+from .profiling import memory_phase
+from .sampling import weighted_sampler
+from .stream import image_stream
+from .utils import clean_alt_text, validate_image_url
+
+logger = logging.getLogger(__name__)
+
+# Columns taken from the input row; everything else gets the model default
+_ROW_FIELDS = ('src', 'alt', 'origin', 'fallback_urls', 'is_active', 'source', 'created_at')
+
+
+class IngestStats:
+    """Per-process totals of everything ingested, for throughput tracking"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.inserted = 0
+        self.seconds = 0.0
+
+    def record(self, rows, inserted, seconds):
+        with self._lock:
+            self.rows += rows
+            self.inserted += inserted
+            self.seconds += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'rows': self.rows,
+                'inserted': self.inserted,
+                'seconds': self.seconds,
+                'rows_per_second': self.rows / self.seconds if self.seconds else 0.0,
+            }
+
+
+ingest_stats = IngestStats()
+
+
+def _normalize(row, source):
+    """Input row (dict or bare URL string) as a dict of _ROW_FIELDS"""
+    if not isinstance(row, dict):
+        row = {'src': str(row)}
+    return {
+        'src': row.get('src'),
+        'alt': clean_alt_text(row.get('alt', '')),
+        'origin': row.get('origin') or '',
+        'fallback_urls': row.get('fallback_urls') or [],
+        'is_active': row.get('is_active', True),
+        'source': row.get('source') or source or '',
+        # Exported rows keep their age; new pins are stamped on insert
+        'created_at': _parse_created_at(row.get('created_at')),
+    }
+
+
+def _parse_created_at(value):
+    """Aware datetime from an ISO 8601 string, or None"""
+    if not value:
+        return None
+    try:
+        created_at = parse_datetime(value) if isinstance(value, str) else value
+    except ValueError:
+        return None
+    if created_at is not None and timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at, datetime.timezone.utc)
+    return created_at
+
+
+class _SQLiteWriter:
+    """executemany INSERT OR IGNORE; rowcount counts only the rows actually inserted"""
+
+    def __init__(self):
+        fields = [field for field in ImageURL._meta.concrete_fields if not field.primary_key]
+        self.fields = fields
+        self.row_positions = [
+            (position, field) for position, field in enumerate(fields) if field.attname in _ROW_FIELDS
+        ]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        self.sql = (
+            f'INSERT OR IGNORE INTO {connection.ops.quote_name(ImageURL._meta.db_table)} '
+            f'({columns}) VALUES ({placeholders})'
+        )
+
+    def _defaults(self):
+        # Evaluated per chunk so default timestamps stay current
+        template = ImageURL()
+        return [field.get_db_prep_save(field.pre_save(template, True), connection) for field in self.fields]
+
+    def write(self, rows):
+        defaults = self._defaults()
+        params = []
+        for row in rows:
+            values = list(defaults)
+            for position, field in self.row_positions:
+                value = row[field.attname]
+                if value is not None:
+                    values[position] = field.get_db_prep_save(value, connection)
+            params.append(values)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # One FTS insert per chunk instead of the per-row trigger, which
+            # otherwise costs more than the insert itself
+            with bulk_index(cursor):
+                cursor.executemany(self.sql, params)
+                inserted = cursor.rowcount
+        return inserted
+
+
+class _ORMWriter:
+    def write(self, rows):
+        with transaction.atomic():
+            existing = set(
+                ImageURL.objects.filter(src__in=[row['src'] for row in rows]).values_list('src', flat=True)
+            )
+            new_rows = [
+                ImageURL(**{name: value for name, value in row.items() if value is not None})
+                for row in rows if row['src'] not in existing
+            ]
+            ImageURL.objects.bulk_create(new_rows, ignore_conflicts=True)
+        return len(new_rows)
+
+
+def ingest_images(rows, source=None, chunk_size=None):
+    """
+    Validate, de-duplicate and insert pins
+
+    Args:
+        rows (iterable): dicts with src/alt/origin/fallback_urls (optionally
+                         is_active, source) or bare URL strings
+        source (str): Scrape source recorded on rows that don't name one
+        chunk_size (int): Rows per transaction (default: INGEST['CHUNK_SIZE'])
+
+    Returns:
+        dict: rows seen, inserted, skipped (= invalid + duplicates + existing)
+              and rows_per_second
+    """
+    with memory_phase('ingest'):
+        return _ingest(rows, source, chunk_size or settings.INGEST['CHUNK_SIZE'])
+
+
+def _ingest(rows, source, chunk_size):
+    writer = _SQLiteWriter() if connection.vendor == 'sqlite' else _ORMWriter()
+
+    started = time.perf_counter()
+    stats = {'rows': 0, 'inserted': 0, 'invalid': 0, 'duplicates': 0, 'existing': 0}
+    seen = set()
+    chunk = []
+
+    def flush():
+        with memory_phase('ingest.write'):
+            inserted = writer.write(chunk)
+        stats['inserted'] += inserted
+        stats['existing'] += len(chunk) - inserted
+        chunk.clear()
+
+    for row in rows:
+        stats['rows'] += 1
+        row = _normalize(row, source)
+        src = row['src']
+        if not validate_image_url(src):
+            stats['invalid'] += 1
+            continue
+        if src in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(src)
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+
+    elapsed = time.perf_counter() - started
+    stats['skipped'] = stats['invalid'] + stats['duplicates'] + stats['existing']
+    stats['rows_per_second'] = stats['rows'] / elapsed if elapsed > 0 else 0.0
+    ingest_stats.record(stats['rows'], stats['inserted'], elapsed)
+
+    if stats['inserted']:
+        weighted_sampler.mark_stale()
+        transaction.on_commit(image_stream.notify)
+        transaction.on_commit(response_pools.invalidate)
+    if stats['invalid']:
+        logger.warning(f"Ingest: skipped {stats['invalid']} rows with invalid image URLs")
+    return stats
@@ -0,0 +1,7 @@
+"""Callables run by the scheduler (settings.SCHEDULER['JOBS'])"""
+
+
+def scrape_home_feed(count=20, sources=None):
+    """Scrape the configured sources and run the post-scrape pipeline"""
+    from .services import ImageScrapingService
+    return ImageScrapingService().scrape_home_images(count=count, sources=sources)
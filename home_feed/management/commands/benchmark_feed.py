@@ -0,0 +1,111 @@
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from home_feed.ingest import ingest_images
+from home_feed.management.commands.benchmark_scrape import delete_pins
+from home_feed.pools import response_pools
+from home_feed.simulator import generate_pins
+from home_feed.views import home_feed
+
+
+def percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Compare home_feed latency built in-line and served from the pre-encoded response pools'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=10000, help='Active images in the table (default: 10000)')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per variant (default: 2000)')
+        parser.add_argument('--warmup', type=int, default=5000,
+                            help='Unmeasured pooled requests first, so pools size themselves to the load '
+                                 '(default: 5000)')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Concurrent clients in this process (default: 1, like a sync Gunicorn worker)')
+        parser.add_argument('--count', type=int, default=10, help='Images per request (default: 10)')
+        parser.add_argument('--mode', choices=['uniform', 'weighted'], default=settings.HOME_FEED_SAMPLING)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated images in the database')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"🧪 home_feed benchmark: {options['requests']} requests over {options['threads']} threads, "
+            f"count={options['count']}, mode={options['mode']}"
+        )
+        self.stdout.write('=' * 60)
+        rows = generate_pins(f'benchmark:feed:{time.time()}', options['images'])
+        ingest_images(rows)
+
+        # Measure the view itself, not the rate limiter in front of it
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            RATE_LIMIT=dict(settings.RATE_LIMIT, ENABLED=False),
+            RESPONSE_POOLS=dict(settings.RESPONSE_POOLS, COUNTS=(options['count'],),
+                                STAMP=f'{directory}/pool_version')
+        ):
+            try:
+                with override_settings(RESPONSE_POOLS=dict(settings.RESPONSE_POOLS, ENABLED=False)):
+                    self.run_requests(options, 10)
+                    inline = self.run_requests(options, options['requests'])
+                self.report('in-line', inline)
+
+                response_pools.clear()
+                response_pools.start()
+                self.run_requests(options, options['warmup'])
+                before = response_pools.snapshot()
+                pooled = self.run_requests(options, options['requests'])
+                self.report('pooled', pooled)
+                after = response_pools.snapshot()
+                hits, misses = after['hits'] - before['hits'], after['misses'] - before['misses']
+                self.stdout.write(f'   Pool hits: {hits}, misses: {misses}')
+            finally:
+                response_pools.stop()
+                response_pools.clear()
+                if not options['keep']:
+                    delete_pins([row['src'] for row in rows])
+
+        speedup = percentile(inline[0], 0.99) / percentile(pooled[0], 0.99)
+        self.stdout.write(self.style.SUCCESS(f'\n✅ p99 {speedup:.1f}x lower with response pools'))
+
+    def run_requests(self, options, requests):
+        """(sorted latencies in ms, wall seconds) of `requests` back-to-back calls spread over --threads"""
+        factory = RequestFactory()
+        params = {'count': options['count'], 'mode': options['mode']}
+        latencies = []
+        lock = threading.Lock()
+
+        def client(requests):
+            timings = []
+            try:
+                for _ in range(requests):
+                    request = factory.get('/api/home_feed/', params)
+                    started = time.perf_counter()
+                    response = home_feed(request)
+                    if hasattr(response, 'render'):
+                        response.render()  # DRF Responses serialize lazily
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.content
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(timings)
+
+        threads = options['threads']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            for future in [executor.submit(client, requests // threads) for _ in range(threads)]:
+                future.result()
+        return sorted(latencies), time.perf_counter() - started
+
+    def report(self, name, result):
+        latencies, elapsed = result
+        self.stdout.write(
+            f'   {name:<8} p50 {percentile(latencies, 0.5):6.2f} ms  p99 {percentile(latencies, 0.99):6.2f} ms  '
+            f'max {latencies[-1]:7.2f} ms  {len(latencies) / elapsed:8.0f} req/s'
+        )
@@ -0,0 +1,173 @@
+import contextlib
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from home_feed.ingest import ingest_images
+from home_feed.models import ImageURL
+from home_feed.services import download_home_feed
+from home_feed.simulator import FakePinterestDL, FakePinterestServer, generate_pins
+from home_feed.sources import get_sources
+
+INGEST_CHUNK_SIZE = 1000
+
+
+def ingest_pipeline(rows):
+    return ingest_images(iter(rows))['inserted']
+
+
+def ingest_bulk_create(rows):
+    """The ORM baseline: one bulk_create(ignore_conflicts=True) per chunk"""
+    before = ImageURL.objects.count()
+    for start in range(0, len(rows), INGEST_CHUNK_SIZE):
+        ImageURL.objects.bulk_create([ImageURL(**row) for row in rows[start:start + INGEST_CHUNK_SIZE]],
+                                     ignore_conflicts=True)
+    return ImageURL.objects.count() - before
+
+
+def ingest_per_row(rows):
+    inserted = 0
+    for row in rows:
+        _, created = ImageURL.objects.get_or_create(src=row['src'], defaults={
+            'alt': row['alt'], 'origin': row['origin'], 'fallback_urls': row['fallback_urls']
+        })
+        inserted += created
+    return inserted
+
+
+# Ways of getting scraped rows into the database, compared by --strategies
+INGEST_STRATEGIES = {
+    'pipeline': ingest_pipeline,
+    'bulk_create': ingest_bulk_create,
+    'per_row': ingest_per_row,
+}
+
+
+def measure(func, *args):
+    """(result, seconds, peak traced MB) of one call"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 ** 2
+
+
+def delete_pins(srcs):
+    for start in range(0, len(srcs), 500):
+        ImageURL.objects.filter(src__in=srcs[start:start + 500]).delete()
+
+
+@contextlib.contextmanager
+def simulated_sources(sources, pins, simulator):
+    """
+    Settings that point scraping at the simulator: `sources` search sources
+    of `pins` pins each, sharing one freshly logged-in cookie file
+
+    Yields:
+        list: src of every pin those sources will scrape
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        cookies = os.path.join(directory, 'cookies.json')
+        with open(cookies, 'w') as f:
+            json.dump(FakePinterestDL.with_browser(**simulator).login('bench@example.com', '').get_cookies(), f)
+
+        with override_settings(
+            PINTEREST_DL={'BACKEND': 'home_feed.simulator.FakePinterestDL', 'OPTIONS': simulator},
+            SCRAPE_SOURCES={
+                f'bench-{i}': {'TYPE': 'search', 'QUERY': f'benchmark {i}', 'COOKIES': cookies, 'QUOTA': pins}
+                for i in range(sources)
+            }
+        ):
+            yield [
+                pin['src']
+                for source in get_sources()
+                for pin in generate_pins(source['url'], pins, simulator.get('seed', 0))
+            ]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark scraping and ingest offline against the simulated Pinterest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sources', type=int, default=4, help='Simulated sources scraped in parallel (default: 4)')
+        parser.add_argument('--pins', type=int, default=500, help='Pins per source (default: 500)')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Delay per page of 25 pins (default: 0)')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Chance that a page load fails the whole source (default: 0)')
+        parser.add_argument('--server', action='store_true',
+                            help='Serve pins over HTTP from a local fake Pinterest server')
+        parser.add_argument('--ingest-rows', type=int, default=10000,
+                            help='Rows per ingest strategy (default: 10000)')
+        parser.add_argument('--strategies', nargs='+', choices=list(INGEST_STRATEGIES),
+                            default=list(INGEST_STRATEGIES), help='Ingest strategies to compare (default: all)')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Pin seed (default: current time, so runs never collide)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated images in the database')
+
+    def handle(self, *args, **options):
+        seed = options['seed'] if options['seed'] is not None else int(time.time())
+        self.stdout.write(f'🧪 Offline scrape benchmark (seed {seed})')
+        self.stdout.write('=' * 60)
+        self.benchmark_pipeline(seed, options)
+        self.benchmark_ingest(seed, options)
+
+    def benchmark_pipeline(self, seed, options):
+        """Cookie check, parallel scrape workers and DB insert via download_home_feed"""
+        simulator = {'seed': seed, 'latency_ms': options['latency_ms'], 'error_rate': options['error_rate']}
+        with contextlib.ExitStack() as stack:
+            if options['server']:
+                server = stack.enter_context(FakePinterestServer(**simulator))
+                simulator['server_url'] = server.url
+            srcs = stack.enter_context(simulated_sources(options['sources'], options['pins'], simulator))
+
+            self.stdout.write(
+                f"\n🔽 Pipeline: {options['sources']} sources x {options['pins']} pins"
+                f"{' over HTTP' if options['server'] else ''}"
+            )
+            stats, elapsed, peak = measure(download_home_feed)
+
+        if stats is None:
+            self.stdout.write(self.style.ERROR('   ❌ Pipeline failed, see the log'))
+            return
+        failed = [result['name'] for result in stats['sources'] if result['error']]
+        # ru_maxrss is in KB on Linux: the largest scrape worker so far
+        worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"   ✅ {stats['scraped']} pins in {elapsed:.2f}s ({stats['scraped'] / elapsed:.0f} pins/s), "
+            f"{stats['inserted']} inserted, {stats['processes']} processes"
+        ))
+        self.stdout.write(f'   Memory: {peak:.1f} MB traced in this process, {worker_rss:.1f} MB max worker RSS')
+        if failed:
+            self.stdout.write(self.style.WARNING(f"   ⚠️  Failed sources: {', '.join(failed)}"))
+        if not options['keep']:
+            delete_pins(srcs)
+
+    def benchmark_ingest(self, seed, options):
+        """Insert rate and memory of each ingest strategy on fresh pins"""
+        count = options['ingest_rows']
+        self.stdout.write(f'\n💾 Ingest strategies: {count} rows each')
+        for name in options['strategies']:
+            rows = generate_pins(f'benchmark:{name}', count, seed)
+            try:
+                # Memory is traced on a separate set of rows so tracing does not skew the timing
+                started = time.perf_counter()
+                inserted = INGEST_STRATEGIES[name](rows)
+                elapsed = time.perf_counter() - started
+                traced_rows = generate_pins(f'benchmark:{name}:traced', count, seed)
+                rows += traced_rows
+                _, _, peak = measure(INGEST_STRATEGIES[name], traced_rows)
+            finally:
+                if not options['keep']:
+                    delete_pins([row['src'] for row in rows])
+            self.stdout.write(
+                f'   {name:<14} {inserted:>8} inserted  {count / elapsed:>10.0f} rows/s  {peak:>7.1f} MB peak'
+            )
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.dedup import detect_near_duplicates
+from home_feed.models import ImageURL
+
+
+class Command(BaseCommand):
+    help = 'Hash unhashed images and deactivate perceptual near-duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-distance',
+            type=int,
+            default=settings.NEAR_DUPLICATES['MAX_DISTANCE'],
+            help=f"Hamming distance treated as a duplicate (default: {settings.NEAR_DUPLICATES['MAX_DISTANCE']})",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.NEAR_DUPLICATES['BATCH_SIZE'],
+            help=f"Images downloaded per batch (default: {settings.NEAR_DUPLICATES['BATCH_SIZE']})",
+        )
+        parser.add_argument(
+            '--rehash',
+            action='store_true',
+            help='Clear existing hashes first and re-check every active image',
+        )
+
+    def handle(self, *args, **options):
+        if options['rehash']:
+            cleared = ImageURL.objects.filter(is_active=True).update(phash=None)
+            self.stdout.write(f'🧹 Cleared hashes of {cleared} active images')
+
+        pending = ImageURL.objects.filter(is_active=True, phash__isnull=True).count()
+        self.stdout.write(f'🔍 Hashing {pending} images and looking for near-duplicates...')
+
+        stats = detect_near_duplicates(
+            batch_size=options['batch_size'],
+            max_distance=options['max_distance'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Hashed {stats['hashed']} images, deactivated {stats['duplicates']} duplicates, "
+            f"{stats['failed']} failed ({stats['images_per_second']:.1f} images/s)"
+        ))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.enrichment import enrich_images
+from home_feed.models import ImageURL
+
+
+class Command(BaseCommand):
+    help = 'Read image headers to store width, height, format and byte size'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.ENRICHMENT['BATCH_SIZE'],
+            help=f"Images probed per batch (default: {settings.ENRICHMENT['BATCH_SIZE']})",
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Probe again images whose header could not be read earlier',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            reset = ImageURL.objects.filter(enriched_at__isnull=False, width__isnull=True).update(enriched_at=None)
+            self.stdout.write(f'🔁 Retrying {reset} images that failed before')
+
+        pending = ImageURL.objects.filter(is_active=True, enriched_at__isnull=True).count()
+        self.stdout.write(f'📐 Enriching {pending} images...')
+
+        stats = enrich_images(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Enriched {stats['enriched']} images, {stats['failed']} failed "
+            f"({stats['images_per_second']:.1f} images/s)"
+        ))
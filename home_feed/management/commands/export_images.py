@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.managers import ImageURLManager
+from home_feed.utils import ndjson_line, open_ndjson
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = 'Stream ImageURL rows to an NDJSON file (gzip-compressed when the path ends in .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Output path, e.g. images.ndjson.gz ("-" writes to stdout)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=settings.BULK_EXPORT_CHUNK_SIZE,
+            help=f'Rows fetched from the database at a time (default: {settings.BULK_EXPORT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--active-only',
+            action='store_true',
+            help='Only export active images',
+        )
+        parser.add_argument('--start-id', type=int, help='Inclusive lower id bound')
+        parser.add_argument('--end-id', type=int, help='Exclusive upper id bound')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        chunk_size = options['chunk_size']
+        # Progress goes to stderr so stdout can carry the data when output is "-"
+        log = self.stderr if output == '-' else self.stdout
+
+        rows = ImageURLManager.iter_images(
+            options['start_id'],
+            options['end_id'],
+            chunk_size,
+            active_only=options['active_only'],
+        )
+
+        log.write(f'📤 Exporting images to {output}...')
+        start = time.monotonic()
+        exported = 0
+
+        stream = sys.stdout if output == '-' else open_ndjson(output, 'wt')
+        try:
+            lines = []
+            for row in rows:
+                # Ids are local to this database and are not re-imported
+                del row['id']
+                lines.append(ndjson_line(row))
+                if len(lines) >= chunk_size:
+                    stream.write('\n'.join(lines) + '\n')
+                    exported += len(lines)
+                    lines = []
+                    elapsed = time.monotonic() - start
+                    rate = exported / elapsed if elapsed > 0 else 0
+                    log.write(f'   {exported} rows ({rate:,.0f} rows/s)')
+            if lines:
+                stream.write('\n'.join(lines) + '\n')
+                exported += len(lines)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        elapsed = time.monotonic() - start
+        rate = exported / elapsed if elapsed > 0 else 0
+        log.write(self.style.SUCCESS(
+            f'✅ Exported {exported} images in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+        ))
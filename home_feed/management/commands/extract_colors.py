@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.colors import extract_colors
+from home_feed.models import ImageColor, ImageURL
+
+
+class Command(BaseCommand):
+    help = 'Extract the dominant colors of images for the home_feed color filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.COLOR_EXTRACTION['BATCH_SIZE'],
+            help=f"Images clustered per batch (default: {settings.COLOR_EXTRACTION['BATCH_SIZE']})",
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-extract colors of images that were already processed',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            ImageColor.objects.all().delete()
+            reset = ImageURL.objects.filter(colors_extracted_at__isnull=False).update(colors_extracted_at=None)
+            self.stdout.write(f'🔁 Re-extracting colors of {reset} images')
+
+        pending = ImageURL.objects.filter(is_active=True, colors_extracted_at__isnull=True).count()
+        self.stdout.write(f'🎨 Extracting colors of {pending} images...')
+
+        stats = extract_colors(batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Extracted colors of {stats['extracted']} images, {stats['failed']} failed "
+            f"({stats['images_per_second']:.1f} images/s)"
+        ))
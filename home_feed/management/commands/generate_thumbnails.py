@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.thumbnails import thumbnail_generator
+
+
+class Command(BaseCommand):
+    help = 'Pre-render thumbnails of every mirrored image in the configured widths'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--width',
+            type=int,
+            action='append',
+            choices=settings.THUMBNAILS['WIDTHS'],
+            help='Only render this width (repeatable; default: all configured widths)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Renders queued on the process pool at once (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        widths = options['width'] or settings.THUMBNAILS['WIDTHS']
+        self.stdout.write(f"🖼️ Rendering {', '.join(map(str, widths))}px thumbnails into {settings.THUMBNAILS['ROOT']}...")
+        stats = thumbnail_generator.generate_all(widths, options['batch_size'])
+        evicted = thumbnail_generator.evict()
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rendered {stats['rendered']} thumbnails, {stats['failed']} failed, evicted {evicted} files "
+            f"({stats['thumbnails_per_second']:.1f} thumbnails/s)"
+        ))
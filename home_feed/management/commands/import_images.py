@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand, CommandError
+from home_feed.managers import ImageURLManager
+from home_feed.utils import open_ndjson
+import json
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Stream ImageURL rows from an NDJSON file produced by export_images (resumable)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='Input path, e.g. images.ndjson.gz',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Rows inserted per transaction (default: 5000)',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file recording committed lines (default: <input>.checkpoint)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and import from the first line',
+        )
+
+    def handle(self, *args, **options):
+        input_path = options['input']
+        batch_size = options['batch_size']
+        checkpoint_path = options['checkpoint'] or f'{input_path}.checkpoint'
+
+        if not os.path.exists(input_path):
+            raise CommandError(f'Input file not found: {input_path}')
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        resume_from = 0
+        if not options['restart'] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r') as f:
+                resume_from = int(f.read().strip() or 0)
+            self.stdout.write(f'⏩ Resuming after line {resume_from} (checkpoint: {checkpoint_path})')
+
+        self.stdout.write(f'📥 Importing images from {input_path}...')
+        start = time.monotonic()
+        inserted = skipped = processed = 0
+        line_number = 0
+        batch = []
+
+        def commit(batch, line_number):
+            added, dropped = ImageURLManager.import_batch(batch)
+            self._write_checkpoint(checkpoint_path, line_number)
+            return added, dropped
+
+        with open_ndjson(input_path, 'rt') as stream:
+            for line in stream:
+                line_number += 1
+                if line_number <= resume_from:
+                    continue
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    batch.append(json.loads(line))
+                except json.JSONDecodeError:
+                    raise CommandError(f'Invalid JSON on line {line_number}')
+
+                if len(batch) >= batch_size:
+                    added, dropped = commit(batch, line_number)
+                    inserted += added
+                    skipped += dropped
+                    processed += len(batch)
+                    batch = []
+                    elapsed = time.monotonic() - start
+                    rate = processed / elapsed if elapsed > 0 else 0
+                    self.stdout.write(
+                        f'   line {line_number}: +{inserted} new, {skipped} skipped '
+                        f'({rate:,.0f} rows/s)'
+                    )
+
+            if batch:
+                added, dropped = commit(batch, line_number)
+                inserted += added
+                skipped += dropped
+                processed += len(batch)
+
+        elapsed = time.monotonic() - start
+        rate = processed / elapsed if elapsed > 0 else 0
+        # The whole file is committed, a later run should start from scratch
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Imported {inserted} new images, skipped {skipped} duplicates '
+            f'in {elapsed:.1f}s ({rate:,.0f} rows/s)'
+        ))
+
+    @staticmethod
+    def _write_checkpoint(path, line_number):
+        """Atomically record the last committed line"""
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(line_number))
+        os.replace(tmp_path, path)
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.mirror import evict_mirror, get_mirror_stats, mirror_images
+
+
+class Command(BaseCommand):
+    help = 'Download active images into the local content-addressed mirror'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.IMAGE_MIRROR['BATCH_SIZE'],
+            help=f"Images downloaded per batch (default: {settings.IMAGE_MIRROR['BATCH_SIZE']})",
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Only print mirror disk usage (scans the store)',
+        )
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Only apply the size budget (LRU eviction)',
+        )
+
+    def handle(self, *args, **options):
+        if options['evict']:
+            evicted = evict_mirror()
+            self.stdout.write(self.style.SUCCESS(f'✅ Evicted {evicted} files'))
+        elif not options['stats']:
+            self.stdout.write(f"🪞 Mirroring images into {settings.IMAGE_MIRROR['ROOT']}...")
+            stats = mirror_images(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ Mirrored {stats['mirrored']} images ({stats['bytes'] / 1024 ** 2:.1f} MB), "
+                f"{stats['failed']} failed, evicted {stats['evicted']} files "
+                f"({stats['images_per_second']:.1f} images/s)"
+            ))
+
+        stats = get_mirror_stats(scan=True)
+        self.stdout.write('\n📊 Mirror Statistics:')
+        self.stdout.write(f"   Files on disk: {stats['files']}")
+        self.stdout.write(
+            f"   Disk usage: {stats['bytes'] / 1024 ** 2:.1f} MB of "
+            f"{stats['max_bytes'] / 1024 ** 2:.0f} MB ({stats['usage']:.0%})"
+        )
+        self.stdout.write(f"   Mirrored images: {stats['mirrored_images']}")
+        self.stdout.write(f"   Evicted images: {stats['evicted_images']}")
@@ -0,0 +1,111 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from home_feed.management.commands.benchmark_scrape import delete_pins, simulated_sources
+from home_feed.profiling import StackSampler, format_stat, memory_phase, memory_phases, profile_path, take_snapshot
+from home_feed.services import download_home_feed
+from home_feed.views import home_feed
+
+
+class Command(BaseCommand):
+    help = 'Profile simulated scrape + serve cycles: memory per phase, allocation growth and serve flamegraphs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Scrape + serve cycles (default: 3)')
+        parser.add_argument('--sources', type=int, default=2, help='Simulated sources per scrape (default: 2)')
+        parser.add_argument('--pins', type=int, default=500, help='Pins per source (default: 500)')
+        parser.add_argument('--requests', type=int, default=200, help='home_feed requests per cycle (default: 200)')
+        parser.add_argument('--count', type=int, default=10, help='Images per request (default: 10)')
+        parser.add_argument('--top', type=int, default=10, help='Allocation sites listed per diff (default: 10)')
+        parser.add_argument('--frames', type=int, default=settings.PROFILING['TRACEMALLOC_FRAMES'],
+                            help='Traceback depth recorded by tracemalloc')
+        parser.add_argument('--flamegraph', action='store_true',
+                            help="Sample the serve loop and write collapsed stacks to PROFILING['OUTPUT_DIR']")
+        parser.add_argument('--dump', help='Save the final allocation snapshot to this file')
+        parser.add_argument('--compare', help='Diff the final snapshot against one saved earlier with --dump')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated images in the database')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = tracemalloc.Snapshot.load(options['compare'])
+            except OSError as e:
+                raise CommandError(f"Cannot read snapshot {options['compare']}: {e}")
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(options['frames'])
+
+        self.stdout.write(
+            f"🔬 Profiling {options['runs']} cycles: {options['sources']} sources x {options['pins']} pins, "
+            f"{options['requests']} requests"
+        )
+        self.stdout.write('=' * 60)
+        seed = int(time.time())
+        previous = snapshot = None
+        srcs = []
+        try:
+            for run in range(1, options['runs'] + 1):
+                memory_phases.reset()
+                # A new seed per cycle: every scrape brings new pins, like the real feed
+                with simulated_sources(options['sources'], options['pins'], {'seed': seed + run}) as run_srcs:
+                    srcs += run_srcs
+                    with memory_phase('download_home_feed'):
+                        download_home_feed()
+                with memory_phase('serve'):
+                    self.serve(options, run)
+
+                snapshot = take_snapshot()
+                self.report_phases(run)
+                if previous is not None:
+                    self.report_diff(f'Growth since cycle {run - 1}', snapshot.compare_to(previous, 'lineno'),
+                                     options['top'])
+                previous = snapshot
+        finally:
+            if not options['keep']:
+                delete_pins(srcs)
+
+        if options['dump']:
+            snapshot.dump(options['dump'])
+            self.stdout.write(f"\n💾 Snapshot saved to {options['dump']} (diff a later run with --compare)")
+        if baseline is not None:
+            self.report_diff(f"Change since {options['compare']}", snapshot.compare_to(baseline, 'lineno'),
+                             options['top'])
+
+    def serve(self, options, run):
+        """In-line home_feed calls, optionally stack-sampled into a flamegraph file"""
+        factory = RequestFactory()
+        sampler = None
+        if options['flamegraph']:
+            sampler = StackSampler(interval=settings.PROFILING['SAMPLE_INTERVAL_MS'] / 1000).start()
+        try:
+            with override_settings(RATE_LIMIT=dict(settings.RATE_LIMIT, ENABLED=False)):
+                for _ in range(options['requests']):
+                    response = home_feed(factory.get('/api/home_feed/', {'count': options['count']}))
+                    response.render()
+        finally:
+            if sampler is not None:
+                sampler.stop()
+        if sampler is not None:
+            path = sampler.write(profile_path(f'serve-cycle-{run}'))
+            self.stdout.write(f'   🔥 {sampler.samples} serve samples written to {path}')
+
+    def report_phases(self, run):
+        self.stdout.write(f'\n📊 Cycle {run}')
+        self.stdout.write(f"   {'phase':<20} {'calls':>5} {'seconds':>9} {'net KB':>10} {'peak KB':>10}")
+        for name, record in memory_phases.snapshot().items():
+            self.stdout.write(
+                f"   {name:<20} {record['calls']:>5} {record['seconds']:>9.3f} "
+                f"{record['net_bytes'] / 1024:>+10.1f} {record['peak_bytes'] / 1024:>10.1f}"
+            )
+            for line in record['top'][:3]:
+                self.stdout.write(f'      {line}')
+
+    def report_diff(self, title, diff, top):
+        growth = sum(stat.size_diff for stat in diff)
+        self.stdout.write(f'\n🧮 {title}: {growth / 1024:+.1f} KB')
+        for stat in diff[:top]:
+            self.stdout.write(f'   {format_stat(stat)}')
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from home_feed.models import ScheduledJob
+from home_feed.scheduler import job_runner
+
+
+class Command(BaseCommand):
+    help = 'Run the job scheduler in the foreground (web workers run it in a background thread)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs that are due and exit',
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Show each job with its next run and last result',
+        )
+
+    def handle(self, *args, **options):
+        if options['list']:
+            jobs = {job.name: job for job in ScheduledJob.objects.all()}
+            for name, config in settings.SCHEDULER['JOBS'].items():
+                job = jobs.get(name)
+                self.stdout.write(f"📅 {name} ({config.get('CRON') or 'manual only'})")
+                if job:
+                    state = f'running on {job.owner}' if job.owner else 'idle'
+                    self.stdout.write(f'   {state}, next run: {job.next_run_at}, failures: {job.failures}')
+                    self.stdout.write(f'   last finished: {job.last_finished_at}, result: {job.last_result}')
+            return
+
+        if options['once']:
+            job_runner.run_due_jobs()
+            return
+
+        self.stdout.write(f"⏰ Scheduler running for: {', '.join(settings.SCHEDULER['JOBS'])} (Ctrl+C to stop)")
+        job_runner.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            job_runner.stop()
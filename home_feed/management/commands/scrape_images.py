@@ -1,18 +1,24 @@
 from django.core.management.base import BaseCommand
-from home_feed.services import ImageScrapingService
+from home_feed.scheduler import job_runner
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Scrape images from Pinterest home feed - automated for cron tasks'
+    help = 'Scrape images from Pinterest home feed now (joins a scrape that is already running)'
     
     def add_arguments(self, parser):
         parser.add_argument(
             '--count',
             type=int,
             default=20,
-            help='Number of images to scrape (default: 20)'
+            help='Maximum number of images to scrape per source (default: 20)'
+        )
+        parser.add_argument(
+            '--source',
+            action='append',
+            dest='sources',
+            help='Only scrape this source from settings.SCRAPE_SOURCES (repeatable; default: all)'
         )
     
     def handle(self, *args, **options):
@@ -22,11 +28,10 @@ class Command(BaseCommand):
         logger.info(f'Starting automated image scraping for {count} images')
         
         try:
-            # Create scraping service instance
-            scraping_service = ImageScrapingService()
-            
-            # Call the scraping method with specified count
-            result = scraping_service.scrape_home_images(count=count)
+            # Runs under the scheduler's lease, so it never overlaps another scrape
+            result = job_runner.run('scrape_home_feed', count=count, sources=options['sources'])
+            if result.get('joined'):
+                self.stdout.write('🔗 A scrape was already running; joined it')
             
             # Handle result (now expecting dictionary format)
             if result and result.get('success', False):
@@ -34,11 +39,14 @@ class Command(BaseCommand):
                 total_count = result.get('total_images', 0)
                 message = result.get('message', 'Success')
                 
+                for source in result.get('sources', []):
+                    status = f"❌ {source['error']}" if source['error'] else f"{source['scraped']} scraped, {source['inserted']} new"
+                    self.stdout.write(f"   {source['name']}: {status}")
                 success_message = f"✅ {message} - Added {new_count} new images (Total: {total_count})"
                 self.stdout.write(success_message)
                 logger.info(success_message)
                 
-                # Exit with success code for cron monitoring
+                # Exit with success code for monitoring
                 return
                 
             else:
@@ -47,7 +55,7 @@ class Command(BaseCommand):
                 self.stdout.write(error_output)
                 logger.error(error_output)
                 
-                # Exit with error code for cron monitoring
+                # Exit with error code for monitoring
                 exit(1)
                 
         except Exception as e:
@@ -55,7 +63,7 @@ class Command(BaseCommand):
             self.stdout.write(error_message)
             logger.error(error_message, exc_info=True)
             
-            # Exit with error code for cron monitoring
+            # Exit with error code for monitoring
             exit(1)
         
         logger.info('Image scraping completed') 
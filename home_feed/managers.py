@@ -0,0 +1,263 @@
+"""
+ImageURL queries and ingest helpers used by the web workers
+
+Deliberately free of the scraping stack (pinterest_dl / selenium, dotenv,
+requests): views import this module, services.py is only loaded by the
+scraping paths.
+"""
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .colors import color_index, parse_color
+from .fts import FTS_TABLE
+from .ingest import ingest_images
+from .models import ImageImpression, ImageURL
+from .pools import response_pools
+from .sampling import weighted_sampler
+from .utils import build_fts_query
+
+
+class ImageURLManager:
+    """Helper class to manage ImageURL database operations"""
+    
+    @staticmethod
+    def add_urls(urls, source='unknown'):
+        """Add new URLs (dicts or plain strings) to database, returns count of added URLs"""
+        if not urls:
+            return 0
+        rows = (url_data if isinstance(url_data, dict) else {'src': str(url_data)} for url_data in urls)
+        return ingest_images({'origin': source, **row} for row in rows)['inserted']
+    
+    # Named ?aspect= buckets as (min, max) width/height ratios
+    ASPECT_RANGES = {
+        'portrait': (0.0, 0.9),
+        'square': (0.9, 1.1),
+        'landscape': (1.1, float('inf')),
+    }
+
+    @staticmethod
+    def build_feed_filters(max_bytes=None, aspect=None, color=None, source=None):
+        """
+        Translate feed filter parameters into ORM lookups
+
+        Args:
+            max_bytes (str|int): Only images of at most this many bytes
+            aspect (str): 'portrait', 'square', 'landscape' or a 'min-max' ratio range
+            color (str): A color bucket name ('blue') or '#rrggbb', matched
+                         against the images' dominant colors
+            source (str): Only images scraped from this source
+
+        Returns:
+            dict: filter kwargs (empty when no filter is requested)
+
+        Raises:
+            ValueError: if a parameter is malformed
+        """
+        filters = {}
+        if max_bytes not in (None, ''):
+            filters['byte_size__lte'] = int(max_bytes)
+        if aspect:
+            if aspect in ImageURLManager.ASPECT_RANGES:
+                low, high = ImageURLManager.ASPECT_RANGES[aspect]
+            else:
+                low, _, high = aspect.partition('-')
+                low, high = float(low), float(high)
+            filters['aspect_ratio__gte'] = low
+            if high != float('inf'):
+                filters['aspect_ratio__lt'] = high
+        if color:
+            filters['colors__color'] = parse_color(color)
+        if source:
+            filters['source'] = source
+        return filters
+
+    @staticmethod
+    def get_random_urls(count=10, mode=None, filters=None):
+        """
+        Get random active URLs from database
+
+        Args:
+            count (int): Number of images to return
+            mode (str): 'uniform' or 'weighted' (defaults to settings.HOME_FEED_SAMPLING)
+            filters (dict): Extra lookups from build_feed_filters(); filtered
+                            feeds are always sampled uniformly
+        """
+        mode = mode or settings.HOME_FEED_SAMPLING
+        if mode == 'weighted' and not filters:
+            ids = weighted_sampler.sample(count)
+            if ids:
+                # The table may lag behind deactivations until its next full rebuild
+                images = ImageURL.objects.filter(is_active=True).in_bulk(ids)
+                return [images[image_id] for image_id in ids if image_id in images]
+
+        if filters and list(filters) == ['colors__color']:
+            # Oversample a little: the in-memory index may lag behind deactivations
+            ids = color_index.sample(filters['colors__color'], count * 2)
+            images = ImageURL.objects.filter(is_active=True).in_bulk(ids)
+            return [images[image_id] for image_id in ids if image_id in images][:count]
+
+        active_images = ImageURL.objects.filter(is_active=True, **(filters or {}))
+        
+        if not active_images.exists():
+            return []
+        
+        # Get random selection
+        if active_images.count() <= count:
+            return list(active_images)
+        else:
+            return list(active_images.order_by('?')[:count])  # Random order
+    
+    @staticmethod
+    def get_shard_bounds(shard, shards):
+        """
+        Split the active id space into `shards` contiguous ranges
+
+        Returns:
+            tuple: (start_id, end_id) half-open range for the requested shard,
+                   or (None, None) if there are no active images
+        """
+        bounds = ImageURL.objects.filter(is_active=True).aggregate(
+            min_id=models.Min('id'),
+            max_id=models.Max('id')
+        )
+        min_id, max_id = bounds['min_id'], bounds['max_id']
+        if min_id is None:
+            return None, None
+
+        span = max_id - min_id + 1
+        start_id = min_id + span * shard // shards
+        end_id = min_id + span * (shard + 1) // shards
+        return start_id, end_id
+
+    @staticmethod
+    def iter_active_images(start_id=None, end_id=None, chunk_size=2000):
+        """
+        Stream active images as dicts ordered by id
+
+        Rows are read through a server-side iterator so memory stays constant
+        regardless of how many rows are exported.
+
+        Args:
+            start_id (int): Inclusive lower id bound (optional)
+            end_id (int): Exclusive upper id bound (optional)
+            chunk_size (int): Number of rows fetched from the cursor at a time
+        """
+        return ImageURLManager.iter_images(start_id, end_id, chunk_size, active_only=True)
+
+    @staticmethod
+    def iter_images(start_id=None, end_id=None, chunk_size=2000, active_only=False):
+        """Stream images as dicts ordered by id (see iter_active_images)"""
+        queryset = ImageURL.objects.all()
+        fields = ['id', 'src', 'alt', 'origin', 'fallback_urls', 'source', 'created_at']
+        if active_only:
+            queryset = queryset.filter(is_active=True)
+        else:
+            fields.append('is_active')
+        if start_id is not None:
+            queryset = queryset.filter(id__gte=start_id)
+        if end_id is not None:
+            queryset = queryset.filter(id__lt=end_id)
+
+        return queryset.order_by('id').values(*fields).iterator(chunk_size=chunk_size)
+
+    @staticmethod
+    def import_batch(rows):
+        """
+        Insert a batch of exported image dicts (see home_feed.ingest)
+
+        Invalid URLs, duplicate `src` values inside the batch and rows
+        already present in the database are skipped.
+
+        Returns:
+            tuple: (inserted_count, skipped_count)
+        """
+        stats = ingest_images(rows)
+        return stats['inserted'], stats['skipped']
+
+    @staticmethod
+    def search(query, page=1, page_size=10, random_order=False):
+        """
+        Full-text search over active images' alt text
+
+        Uses the FTS5 index on SQLite (ranked by bm25) and falls back to
+        `icontains` on other databases.
+
+        Args:
+            query (str): Free-form search text
+            page (int): 1-based page number (ignored when random_order is set)
+            page_size (int): Number of results per page
+            random_order (bool): Sample randomly among all matches instead of ranking
+
+        Returns:
+            tuple: (list of ImageURL, has_next)
+        """
+        match = build_fts_query(query)
+        if not match:
+            return [], False
+
+        offset = 0 if random_order else (page - 1) * page_size
+        # Fetch one extra row to know whether there is a next page
+        limit = page_size + 1
+
+        if connection.vendor == 'sqlite':
+            order = 'random()' if random_order else f'{FTS_TABLE}.rank'
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT i.id FROM {FTS_TABLE}
+                    JOIN {ImageURL._meta.db_table} AS i ON i.id = {FTS_TABLE}.rowid
+                    WHERE {FTS_TABLE} MATCH %s AND i.is_active
+                    ORDER BY {order}
+                    LIMIT %s OFFSET %s
+                    """,
+                    [match, limit, offset]
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+        else:
+            queryset = ImageURL.objects.filter(is_active=True)
+            for word in re.findall(r'\w+', query):
+                queryset = queryset.filter(alt__icontains=word)
+            queryset = queryset.order_by('?') if random_order else queryset.order_by('-id')
+            ids = list(queryset.values_list('id', flat=True)[offset:offset + limit])
+
+        has_next = len(ids) > page_size and not random_order
+        ids = ids[:page_size]
+        images = ImageURL.objects.in_bulk(ids)
+        return [images[image_id] for image_id in ids if image_id in images], has_next
+
+    @staticmethod
+    def get_most_served(limit=10):
+        """
+        Most frequently served active images (served_count is indexed)
+
+        Returns:
+            list: (ImageURL, served_count) tuples, most served first
+        """
+        impressions = (
+            ImageImpression.objects.select_related('image')
+            .filter(image__is_active=True)
+            .order_by('-served_count')[:limit]
+        )
+        return [(impression.image, impression.served_count) for impression in impressions]
+
+    @staticmethod
+    def get_active_count():
+        """Get count of active URLs in database"""
+        return ImageURL.objects.filter(is_active=True).count()
+    
+    @staticmethod
+    def deactivate_old_urls(days=30):
+        """Deactivate URLs older than specified days"""
+        cutoff_date = timezone.now() - timedelta(days=days)
+        updated_count = ImageURL.objects.filter(
+            created_at__lt=cutoff_date,
+            is_active=True
+        ).update(is_active=False)
+        if updated_count:
+            weighted_sampler.invalidate()
+            transaction.on_commit(response_pools.invalidate)
+        return updated_count
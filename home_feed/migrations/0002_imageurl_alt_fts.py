@@ -0,0 +1,60 @@
+from django.db import migrations
+
+FTS_TABLE = 'home_feed_imageurl_fts'
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        alt,
+        content='home_feed_imageurl',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON home_feed_imageurl BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, alt) VALUES (new.id, new.alt);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON home_feed_imageurl BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, alt) VALUES ('delete', old.id, old.alt);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF alt ON home_feed_imageurl BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, alt) VALUES ('delete', old.id, old.alt);
+        INSERT INTO {FTS_TABLE}(rowid, alt) VALUES (new.id, new.alt);
+    END
+    """,
+    # Index rows that existed before the table was created
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends fall back to icontains search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_SQL), _run(DROP_SQL)),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0003_imageurl_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageImpression',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='impressions', serialize=False, to='home_feed.imageurl')),
+                ('served_count', models.PositiveBigIntegerField(db_index=True, default=0)),
+                ('last_served_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Image impression',
+                'verbose_name_plural': 'Image impressions',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0004_imageimpression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageurl',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='home_feed.imageurl'),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='phash',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0005_imageurl_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageurl',
+            name='aspect_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='byte_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='enriched_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='image_format',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='imageurl',
+            index=models.Index(fields=['is_active', 'byte_size'], name='imageurl_active_bytes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imageurl',
+            index=models.Index(fields=['is_active', 'aspect_ratio'], name='imageurl_active_aspect_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0006_imageurl_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MirroredImage',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='mirror', serialize=False, to='home_feed.imageurl')),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('content_type', models.CharField(max_length=50)),
+                ('byte_size', models.PositiveBigIntegerField()),
+                ('mirrored_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Mirrored image',
+                'verbose_name_plural': 'Mirrored images',
+            },
+        ),
+    ]
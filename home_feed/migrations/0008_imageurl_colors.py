@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0007_mirroredimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageurl',
+            name='colors_extracted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imageurl',
+            name='palette',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='ImageColor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('color', models.PositiveSmallIntegerField(choices=[(0, 'Black'), (1, 'Gray'), (2, 'White'), (3, 'Red'), (4, 'Orange'), (5, 'Yellow'), (6, 'Green'), (7, 'Teal'), (8, 'Blue'), (9, 'Purple'), (10, 'Pink'), (11, 'Brown')])),
+                ('share', models.FloatField()),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='colors', to='home_feed.imageurl')),
+            ],
+            options={
+                'verbose_name': 'Image color',
+                'verbose_name_plural': 'Image colors',
+                'indexes': [models.Index(fields=['color', 'image'], name='imagecolor_color_image_idx')],
+                'constraints': [models.UniqueConstraint(fields=('image', 'color'), name='imagecolor_image_color_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0008_imageurl_colors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, max_length=100)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('run_count', models.PositiveBigIntegerField(default=0)),
+                ('last_started_at', models.DateTimeField(blank=True, null=True)),
+                ('last_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_result', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name': 'Scheduled job',
+                'verbose_name_plural': 'Scheduled jobs',
+            },
+        ),
+    ]
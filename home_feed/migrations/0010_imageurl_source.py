@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0009_scheduledjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageurl',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='imageurl',
+            index=models.Index(fields=['is_active', 'source'], name='imageurl_active_source_idx'),
+        ),
+    ]
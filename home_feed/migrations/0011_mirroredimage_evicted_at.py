@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0010_imageurl_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mirroredimage',
+            name='evicted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:22
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home_feed', '0011_mirroredimage_evicted_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imageurl',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
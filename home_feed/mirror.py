@@ -0,0 +1,373 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F, Max, Q, Sum
+from django.utils import timezone
+
+from .models import ImageURL, MirroredImage
+
+logger = logging.getLogger(__name__)
+
+CONTENT_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+# Content hashes per UPDATE when marking evicted rows
+EVICT_BATCH = 500
+
+# Leading bytes -> content type, used when the CDN sends no usable Content-Type
+_MAGIC_TYPES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+]
+
+
+def sniff_content_type(data, header=None):
+    """Content type of image bytes, preferring an image/* response header"""
+    if header and header.startswith('image/'):
+        return header.split(';', 1)[0].strip()
+    for magic, content_type in _MAGIC_TYPES:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+class MirrorStore:
+    """
+    Sharded content-addressed files: <root>/ab/cd/<sha256>
+
+    The file mtime doubles as the last-access time for LRU eviction; it is
+    bumped on serve at most once per TOUCH_INTERVAL_SECONDS.
+    """
+
+    def __init__(self, root=None):
+        self.root = Path(root or settings.IMAGE_MIRROR['ROOT'])
+
+    @staticmethod
+    def relative_path(content_hash):
+        return f'{content_hash[:2]}/{content_hash[2:4]}/{content_hash}'
+
+    def path(self, content_hash):
+        return self.root / self.relative_path(content_hash)
+
+    def put(self, data):
+        """
+        Store bytes under their sha256 and return the hash
+
+        Writes go to a temporary file that is renamed into place, so readers
+        (nginx) never see a partial image.
+        """
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(content_hash)
+        if path.exists():
+            os.utime(path)
+            return content_hash
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f'.{content_hash}.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return content_hash
+
+    def touch(self, content_hash):
+        """Mark a file as recently used (throttled to avoid a write per hit)"""
+        self.touch_path(self.path(content_hash))
+
+    @staticmethod
+    def touch_path(path):
+        try:
+            if time.time() - path.stat().st_mtime > settings.IMAGE_MIRROR['TOUCH_INTERVAL_SECONDS']:
+                os.utime(path)
+        except FileNotFoundError:
+            pass
+
+    def scan(self):
+        """Yield (mtime, size, path) for every stored file"""
+        if not self.root.exists():
+            return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for subshard in os.scandir(shard.path):
+                if not subshard.is_dir():
+                    continue
+                for entry in os.scandir(subshard.path):
+                    if entry.is_file() and not entry.name.startswith('.'):
+                        stat = entry.stat()
+                        yield stat.st_mtime, stat.st_size, entry.path
+
+    def usage(self):
+        """(file_count, total_bytes) on disk"""
+        files = total = 0
+        for _, size, _ in self.scan():
+            files += 1
+            total += size
+        return files, total
+
+    def select_lru(self, max_bytes):
+        """
+        Least recently used files to delete to get usage below the budget
+
+        Selects down to LOW_WATERMARK of the budget so the next few mirror
+        runs don't each trigger another full scan.
+
+        Returns:
+            list: (mtime, size, path) tuples, oldest first; empty when within budget
+        """
+        entries = list(self.scan())
+        total = sum(size for _, size, _ in entries)
+        if total <= max_bytes:
+            return []
+
+        target = max_bytes * settings.IMAGE_MIRROR['LOW_WATERMARK']
+        selected = []
+        for mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            selected.append((mtime, size, path))
+            total -= size
+        return selected
+
+    @staticmethod
+    def remove(selected):
+        """
+        Delete files picked by select_lru()
+
+        A file touched or re-stored since it was selected is kept: its
+        mtime is re-checked right before the unlink.
+
+        Returns:
+            tuple: (evicted content hashes, freed bytes)
+        """
+        evicted = []
+        freed = 0
+        for mtime, size, path in selected:
+            try:
+                if os.stat(path).st_mtime > mtime:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            evicted.append(os.path.basename(path))
+            freed += size
+        return evicted, freed
+
+    def evict(self, max_bytes):
+        """
+        Delete least recently used files until usage is below the budget
+
+        Returns:
+            tuple: (evicted content hashes, freed bytes)
+        """
+        return self.remove(self.select_lru(max_bytes))
+
+
+class MirrorStats:
+    """Per-process lookup and serve counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.served = 0
+
+    def record_lookup(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def record_serve(self):
+        with self._lock:
+            self.served += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'served': self.served,
+            }
+
+
+mirror_stats = MirrorStats()
+
+
+def lookup_mirrored(image_ids):
+    """
+    Content hashes of the mirrored copies of `image_ids`
+
+    Returns:
+        dict: image_id -> content_hash for images that have a local copy
+    """
+    hashes = dict(
+        MirroredImage.objects.filter(image_id__in=image_ids, evicted_at__isnull=True)
+        .values_list('image_id', 'content_hash')
+    )
+    mirror_stats.record_lookup(len(hashes), len(image_ids) - len(hashes))
+    return hashes
+
+
+def _store_result(store):
+    def store_result(result):
+        """Runs in the fetcher's worker threads: hash and write the bytes"""
+        if not result.ok:
+            return None
+        content_type = sniff_content_type(result.content, result.headers.get('Content-Type'))
+        if not content_type.startswith('image/'):
+            return None
+        return store.put(result.content), content_type, len(result.content)
+    return store_result
+
+
+def images_to_mirror():
+    """
+    Active images that need a local copy
+
+    Images never mirrored, plus evicted ones that were served again after
+    their eviction. Evicted images nobody asked for since are left out, so
+    a store over budget doesn't download its own overflow on every run.
+    """
+    return ImageURL.objects.filter(is_active=True).filter(
+        Q(mirror__isnull=True)
+        | Q(mirror__evicted_at__isnull=False, impressions__last_served_at__gt=F('mirror__evicted_at'))
+    )
+
+
+def mirror_images(batch_size=None, fetcher=None, store=None):
+    """
+    Download every active image without a local copy into the mirror store
+
+    Returns:
+        dict: mirrored/failed counts, bytes written, evicted files and images_per_second
+    """
+    # requests is only needed here, not by the views that serve the mirror
+    from .fetch import ImageFetcher
+
+    config = settings.IMAGE_MIRROR
+    batch_size = batch_size or config['BATCH_SIZE']
+    store = store or MirrorStore()
+
+    started = time.monotonic()
+    stats = {'mirrored': 0, 'failed': 0, 'bytes': 0}
+    own_fetcher = fetcher is None
+    fetcher = fetcher or ImageFetcher()
+
+    try:
+        last_id = 0
+        while True:
+            batch = list(
+                images_to_mirror().filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'src')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+
+            stored = fetcher.map(_store_result(store), [src for _, src in batch])
+            rows = []
+            for (image_id, src), result in zip(batch, stored):
+                if result is None:
+                    stats['failed'] += 1
+                    logger.debug(f"Could not mirror {src}")
+                    continue
+                content_hash, content_type, byte_size = result
+                rows.append(MirroredImage(
+                    image_id=image_id,
+                    content_hash=content_hash,
+                    content_type=content_type,
+                    byte_size=byte_size
+                ))
+                stats['bytes'] += byte_size
+            # Re-mirrored images replace their eviction tombstone
+            MirroredImage.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['image'],
+                update_fields=['content_hash', 'content_type', 'byte_size', 'mirrored_at', 'evicted_at']
+            )
+            stats['mirrored'] += len(rows)
+    finally:
+        if own_fetcher:
+            fetcher.close()
+
+    stats['evicted'] = evict_mirror(store)
+    elapsed = time.monotonic() - started
+    processed = stats['mirrored'] + stats['failed']
+    stats['images_per_second'] = processed / elapsed if elapsed > 0 else 0.0
+    logger.info(
+        f"Mirror: stored {stats['mirrored']} images ({stats['bytes']} bytes), {stats['failed']} failed, "
+        f"evicted {stats['evicted']} files ({stats['images_per_second']:.1f} images/s)"
+    )
+    return stats
+
+
+def evict_mirror(store=None):
+    """
+    Apply the IMAGE_MIRROR['MAX_BYTES'] budget; returns the number of files removed
+
+    The rows are marked evicted before their files are deleted, so
+    home_feed and /media/<hash> stop pointing at a file before it is gone.
+    Marked rows stay as tombstones for images_to_mirror(). Files re-stored
+    or served in between (mtime bumped) are kept and their rows unmarked.
+    """
+    store = store or MirrorStore()
+    selected = store.select_lru(settings.IMAGE_MIRROR['MAX_BYTES'])
+    if not selected:
+        return 0
+
+    hashes = [os.path.basename(path) for _, _, path in selected]
+    now = timezone.now()
+    for start in range(0, len(hashes), EVICT_BATCH):
+        MirroredImage.objects.filter(
+            content_hash__in=hashes[start:start + EVICT_BATCH], evicted_at__isnull=True
+        ).update(evicted_at=now)
+    evicted, freed = store.remove(selected)
+    kept = sorted(set(hashes) - set(evicted))
+    for start in range(0, len(kept), EVICT_BATCH):
+        MirroredImage.objects.filter(
+            content_hash__in=kept[start:start + EVICT_BATCH], evicted_at=now
+        ).update(evicted_at=None)
+    if evicted:
+        logger.info(f"Mirror: evicted {len(evicted)} least recently used files ({freed} bytes)")
+    return len(evicted)
+
+
+def get_mirror_stats(store=None, scan=False):
+    """
+    Usage of the store plus this process's hit-rate counters
+
+    Files and bytes are summed from the live MirroredImage rows; scan=True
+    walks the store on disk instead, which is too slow for a web request
+    on a large mirror.
+    """
+    live = MirroredImage.objects.filter(evicted_at__isnull=True)
+    if scan:
+        files, total = (store or MirrorStore()).usage()
+    else:
+        # Images with the same content share one file
+        per_file = live.values('content_hash').annotate(size=Max('byte_size'))
+        files = per_file.count()
+        total = per_file.aggregate(total=Sum('size'))['total'] or 0
+    max_bytes = settings.IMAGE_MIRROR['MAX_BYTES']
+    stats = {
+        'files': files,
+        'bytes': total,
+        'max_bytes': max_bytes,
+        'usage': total / max_bytes if max_bytes else 0.0,
+        'mirrored_images': live.count(),
+        'evicted_images': MirroredImage.objects.filter(evicted_at__isnull=False).count(),
+    }
+    stats.update(mirror_stats.snapshot())
+    return stats
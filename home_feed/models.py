@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -13,6 +14,29 @@ class ImageURL(models.Model):
     origin = models.URLField(max_length=500)
     fallback_urls = models.JSONField(default=list)
     is_active = models.BooleanField(default=True)  # type: ignore
+    # Scrape source (key of settings.SCRAPE_SOURCES); empty for rows of unknown origin
+    source = models.CharField(max_length=100, blank=True, default='')
+    # Defaults to now; imports keep the timestamp of the exporting host
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # 64-bit perceptual hash (signed storage), filled by home_feed.dedup
+    phash = models.BigIntegerField(null=True, blank=True, db_index=True)
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
+    # Filled by home_feed.enrichment from the image header
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    image_format = models.CharField(max_length=10, blank=True)
+    byte_size = models.PositiveBigIntegerField(null=True, blank=True)
+    aspect_ratio = models.FloatField(null=True, blank=True)  # width / height
+    enriched_at = models.DateTimeField(null=True, blank=True)
+    # Dominant colors as '#rrggbb', most dominant first (home_feed.colors)
+    palette = models.JSONField(default=list, blank=True)
+    colors_extracted_at = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
         return f"{self.alt}: {str(self.src)[:50]}..."
@@ -20,3 +44,126 @@ class ImageURL(models.Model):
         ordering = ['-id']
         verbose_name = "Image URL"
         verbose_name_plural = "Image URLs"
+        indexes = [
+            # home_feed ?max_bytes= and ?aspect= filters
+            models.Index(fields=['is_active', 'byte_size'], name='imageurl_active_bytes_idx'),
+            models.Index(fields=['is_active', 'aspect_ratio'], name='imageurl_active_aspect_idx'),
+            # home_feed ?source= filter
+            models.Index(fields=['is_active', 'source'], name='imageurl_active_source_idx'),
+        ]
+
+
+class ImageImpression(models.Model):
+    """How often an image was served; written in batches by ImpressionBuffer"""
+    if TYPE_CHECKING:
+        objects: "Manager"
+
+    image = models.OneToOneField(
+        ImageURL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='impressions'
+    )
+    served_count = models.PositiveBigIntegerField(default=0, db_index=True)
+    last_served_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.image_id}: {self.served_count}"
+    class Meta:
+        verbose_name = "Image impression"
+        verbose_name_plural = "Image impressions"
+
+
+class MirroredImage(models.Model):
+    """Local content-addressed copy of an image (see home_feed.mirror)"""
+    if TYPE_CHECKING:
+        objects: "Manager"
+
+    image = models.OneToOneField(
+        ImageURL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='mirror'
+    )
+    # sha256 of the bytes; identical images share one file on disk
+    content_hash = models.CharField(max_length=64, db_index=True)
+    content_type = models.CharField(max_length=50)
+    byte_size = models.PositiveBigIntegerField()
+    mirrored_at = models.DateTimeField(auto_now_add=True)
+    # Set when LRU eviction removed the file; the image is only mirrored
+    # again once it has been served after this
+    evicted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.image_id}: {self.content_hash}"
+    class Meta:
+        verbose_name = "Mirrored image"
+        verbose_name_plural = "Mirrored images"
+
+
+class ImageColor(models.Model):
+    """Quantized dominant color of an image, one row per color (home_feed.colors)"""
+    if TYPE_CHECKING:
+        objects: "Manager"
+
+    class Color(models.IntegerChoices):
+        BLACK = 0
+        GRAY = 1
+        WHITE = 2
+        RED = 3
+        ORANGE = 4
+        YELLOW = 5
+        GREEN = 6
+        TEAL = 7
+        BLUE = 8
+        PURPLE = 9
+        PINK = 10
+        BROWN = 11
+
+    image = models.ForeignKey(
+        ImageURL,
+        on_delete=models.CASCADE,
+        related_name='colors'
+    )
+    color = models.PositiveSmallIntegerField(choices=Color.choices)
+    share = models.FloatField()  # Fraction of the image's pixels
+
+    def __str__(self):
+        return f"{self.image_id}: {self.get_color_display()} ({self.share:.0%})"
+    class Meta:
+        verbose_name = "Image color"
+        verbose_name_plural = "Image colors"
+        constraints = [
+            models.UniqueConstraint(fields=['image', 'color'], name='imagecolor_image_color_uniq'),
+        ]
+        indexes = [
+            # home_feed ?color= filter: all images of one color without touching the table
+            models.Index(fields=['color', 'image'], name='imagecolor_color_image_idx'),
+        ]
+
+
+class ScheduledJob(models.Model):
+    """
+    Shared state of a scheduled job (see home_feed.scheduler)
+
+    The row doubles as a cross-process lease: whoever holds an unexpired
+    lease is running the job, everyone else waits for run_count to change.
+    """
+    if TYPE_CHECKING:
+        objects: "Manager"
+
+    name = models.CharField(max_length=100, primary_key=True)
+    owner = models.CharField(max_length=100, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+    failures = models.PositiveIntegerField(default=0)  # Consecutive, drives the backoff
+    run_count = models.PositiveBigIntegerField(default=0)
+    last_started_at = models.DateTimeField(null=True, blank=True)
+    last_finished_at = models.DateTimeField(null=True, blank=True)
+    last_result = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.name} (next run: {self.next_run_at})"
+    class Meta:
+        verbose_name = "Scheduled job"
+        verbose_name_plural = "Scheduled jobs"
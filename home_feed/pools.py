@@ -0,0 +1,291 @@
+"""
+Pre-encoded home_feed responses, refilled in the background per worker
+
+Each (mode, count) pair requested by plain feed calls (no filters, sizes or
+mirror rewrites) gets a ring buffer of ready-to-send JSON bodies. A request
+pops one and writes it; a refill thread samples and encodes the next ones
+off the request path. Pools are sized by how often they are popped and
+those nobody asks for stop being refilled.
+
+Ingest and deactivations replace a stamp file shared by every process on
+the host; a pool built under an older stamp is dropped on its next pop, so
+new or deactivated images are not served from stale buffers.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .models import ImageURL
+from .sampling import weighted_sampler
+
+logger = logging.getLogger(__name__)
+
+# Responses sampled and encoded per query while refilling
+REFILL_BATCH = 16
+
+
+def encode_feed(images, total_available):
+    """home_feed's JSON body, encoded the way DRF's JSONRenderer would"""
+    from .views import serialize_image  # views imports this module
+
+    return json.dumps({
+        'message': 'Images retrieved successfully',
+        'total_available': total_available,
+        'count': len(images),
+        'images': [serialize_image(img) for img in images]
+    }, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def sample_feeds(mode, count, batches):
+    """
+    `batches` independent feed samples of up to `count` active images
+
+    Ids are drawn from the weighted sampler's in-memory table (uniformly
+    or by weight) and every batch is loaded with a single in_bulk, instead
+    of one ORDER BY RANDOM() scan per response.
+
+    Returns:
+        list: lists of ImageURL
+    """
+    draw = weighted_sampler.sample if mode == 'weighted' else weighted_sampler.sample_uniform
+    id_batches = [draw(count) for _ in range(batches)]
+    images = ImageURL.objects.filter(is_active=True).in_bulk(
+        {image_id for ids in id_batches for image_id in ids}
+    )
+    return [[images[image_id] for image_id in ids if image_id in images] for ids in id_batches]
+
+
+class Pool:
+    """
+    Buffered [built_at, image ids, body, uses] entries for one (mode, count)
+
+    `entries` holds responses not sent to anyone yet; `served` holds the
+    ones that may be sent again when `entries` runs dry.
+    """
+
+    def __init__(self, version, max_size):
+        self.entries = deque(maxlen=max_size)
+        self.served = deque(maxlen=max_size)
+        self.version = version
+        self.pops = 0
+        self.rate = 0.0
+        self.used_at = time.monotonic()
+
+    def reset(self, version):
+        self.clear()
+        self.version = version
+
+    def clear(self):
+        self.entries.clear()
+        self.served.clear()
+
+    def expire(self, oldest):
+        for entries in (self.entries, self.served):
+            while entries and entries[0][0] < oldest:
+                entries.popleft()
+
+
+class ResponsePools:
+    """
+    Per-process pools of pre-encoded home_feed responses
+
+    pop() never samples or queries: it returns a buffered body or None, and
+    the caller builds the response in-line. Every response is sent once
+    before any is repeated; only when a burst outruns the refill rate and no
+    unsent response is left is a served one sent again, up to MAX_USES
+    times in total, instead of falling back to in-line sampling. Buffers are
+    filled by refill(), which the background thread runs every
+    REFILL_SECONDS.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _stamp_path():
+        return Path(settings.RESPONSE_POOLS['STAMP'])
+
+    def version(self):
+        """Current pool-version stamp (changes whenever invalidate() runs anywhere on the host)"""
+        try:
+            stat = os.stat(self._stamp_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def invalidate(self):
+        """
+        Retire every pool built before now, in all processes on the host
+
+        The stamp file is replaced rather than rewritten so its inode
+        changes even when two calls land in the same clock tick.
+        """
+        path = self._stamp_path()
+        tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(str(time.time()))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Could not update response pool stamp {path}: {e}")
+
+    def pop(self, mode, count):
+        """
+        A ready response body for this feed request, or None on a miss
+
+        Returns:
+            tuple: (image ids, encoded JSON body) or None
+        """
+        config = settings.RESPONSE_POOLS
+        if not config['ENABLED'] or count not in config['COUNTS']:
+            return None
+        key = (mode, count)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.setdefault(key, Pool(self.version(), config['MAX_SIZE']))
+        pool.used_at = time.monotonic()
+        pool.pops += 1
+
+        version = self.version()
+        if pool.version != version:
+            pool.reset(version)
+        oldest = time.monotonic() - config['MAX_AGE_SECONDS']
+        entry = self._take(pool.entries, oldest)
+        if entry is None:
+            self._wakeup.set()  # Running dry: refill now rather than at the next tick
+            entry = self._take(pool.served, oldest)
+            if entry is None:
+                self.misses += 1
+                return None
+        entry[3] += 1
+        if entry[3] < config['MAX_USES']:
+            pool.served.append(entry)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    @staticmethod
+    def _take(entries, oldest):
+        """Oldest entry built after `oldest`, dropping expired ones on the way"""
+        while True:
+            try:
+                entry = entries.popleft()
+            except IndexError:
+                return None
+            if entry[0] >= oldest:
+                return entry
+
+    def refill(self):
+        """
+        Top up every pool that was used within IDLE_SECONDS
+
+        Each pool is kept HEADROOM_TICKS worth of its recent pop rate in
+        unsent responses (between MIN_SIZE and MAX_SIZE), so popular
+        count values get deep buffers and rarely used ones stay small.
+
+        Returns:
+            int: Number of responses encoded
+        """
+        from .managers import ImageURLManager
+
+        config = settings.RESPONSE_POOLS
+        version = self.version()
+        now = time.monotonic()
+        total_available = None
+        encoded = 0
+        for (mode, count), pool in list(self._pools.items()):
+            if pool.version != version:
+                pool.reset(version)
+            pool.expire(now - config['MAX_AGE_SECONDS'])
+            pool.rate = (pool.rate + pool.pops) / 2
+            pool.pops = 0
+            if now - pool.used_at > config['IDLE_SECONDS']:
+                pool.clear()
+                continue
+
+            target = min(max(math.ceil(pool.rate * config['HEADROOM_TICKS']), config['MIN_SIZE']),
+                         config['MAX_SIZE'])
+            missing = target - len(pool.entries)
+            if missing <= 0:
+                continue
+            if total_available is None:
+                total_available = ImageURLManager.get_active_count()
+            if not total_available:
+                return encoded  # The in-line path answers with the "no images" message
+
+            for start in range(0, missing, REFILL_BATCH):
+                for images in sample_feeds(mode, count, min(REFILL_BATCH, missing - start)):
+                    if images:
+                        pool.entries.append([now, [img.id for img in images], encode_feed(images, total_available), 0])
+                        encoded += 1
+                time.sleep(0)  # Let request threads in this worker run between batches
+        return encoded
+
+    def clear(self):
+        with self._lock:
+            self._pools.clear()
+        self.hits = self.misses = 0
+
+    def snapshot(self):
+        """Unsent responses per pool plus hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            'pools': {f'{mode}:{count}': len(pool.entries) for (mode, count), pool in list(self._pools.items())},
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(settings.RESPONSE_POOLS['REFILL_SECONDS'])
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            close_old_connections()
+            try:
+                self.refill()
+            except Exception as e:
+                logger.error(f"Response pool refill failed: {e}", exc_info=True)
+        connection.close()
+
+    def start(self):
+        """Warm the pools for COUNTS and start the refill thread (idempotent, per process)"""
+        config = settings.RESPONSE_POOLS
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            version = self.version()
+            for count in config['COUNTS']:
+                self._pools.setdefault((settings.HOME_FEED_SAMPLING, count), Pool(version, config['MAX_SIZE']))
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='home-feed-pools', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+response_pools = ResponsePools()
+
+
+def start_response_pools():
+    """Called from the WSGI/ASGI entry points so only server processes refill pools"""
+    if settings.RESPONSE_POOLS['ENABLED']:
+        response_pools.start()
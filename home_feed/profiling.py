@@ -0,0 +1,286 @@
+"""
+Opt-in CPU and memory profiling for the scrape and serve paths
+
+Two independent tools, both off by default and free when off:
+
+* ProfilingMiddleware samples the stack of the thread serving a staff
+  (or PROFILING['SECRET']-bearing) request and writes it as collapsed
+  stacks ("a;b;c 12" lines) that flamegraph.pl, speedscope or inferno
+  render directly. It removes itself from the middleware chain unless
+  PROFILING['ENABLED'] is set.
+* memory_phase() records allocation size, peak and the top allocating
+  lines of a named phase while tracemalloc is tracing (started at app
+  load by PROFILING['TRACEMALLOC'], or by the profile_cycle command).
+  Otherwise it costs one tracemalloc.is_tracing() call.
+"""
+import hmac
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+# Allocations made by tracemalloc and by this module are not part of any phase
+_TRACEMALLOC_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+]
+
+
+def take_snapshot():
+    """tracemalloc snapshot without tracemalloc's own bookkeeping"""
+    return tracemalloc.take_snapshot().filter_traces(_TRACEMALLOC_FILTERS)
+
+
+def format_stat(stat):
+    """One line for a StatisticDiff: size change, count change and where"""
+    frame = stat.traceback[0]
+    return (
+        f'{stat.size_diff / 1024:+10.1f} KB {stat.count_diff:+8d} blocks  '
+        f'{frame.filename}:{frame.lineno}'
+    )
+
+
+class _Frame:
+    def __init__(self, name, current, snapshot):
+        self.name = name
+        self.started = time.perf_counter()
+        self.current = current
+        self.peak = current
+        self.snapshot = snapshot
+
+
+class MemoryPhases:
+    """
+    Per-process totals of every memory_phase() run while tracing
+
+    Phases nest: a phase's peak includes its children, and each thread has
+    its own stack. tracemalloc itself is process-wide, so phases running
+    at the same time in different threads see each other's allocations.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.records = {}
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, name):
+        stack = self._stack()
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+        tracemalloc.reset_peak()
+        top = settings.PROFILING['PHASE_TOP_ALLOCATIONS']
+        stack.append(_Frame(name, current, take_snapshot() if top else None))
+
+    def exit(self):
+        frame = self._stack().pop()
+        current, peak = tracemalloc.get_traced_memory()
+        frame.peak = max(frame.peak, peak)
+        stack = self._stack()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, frame.peak)
+
+        top = []
+        if frame.snapshot is not None:
+            diff = take_snapshot().compare_to(frame.snapshot, 'lineno')
+            top = [format_stat(stat) for stat in diff[:settings.PROFILING['PHASE_TOP_ALLOCATIONS']]]
+
+        seconds = time.perf_counter() - frame.started
+        with self._lock:
+            record = self.records.setdefault(frame.name, {
+                'calls': 0, 'seconds': 0.0, 'net_bytes': 0, 'peak_bytes': 0, 'top': []
+            })
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['net_bytes'] += current - frame.current
+            record['peak_bytes'] = max(record['peak_bytes'], frame.peak - frame.current)
+            record['top'] = top or record['top']
+        logger.debug(
+            f"Phase {frame.name}: {seconds:.3f}s, {(current - frame.current) / 1024:+.1f} KB net, "
+            f"{(frame.peak - frame.current) / 1024:.1f} KB peak"
+        )
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: phase name -> calls, seconds, net_bytes (still allocated at
+                  exit), peak_bytes (above the level at entry) and top
+                  allocating lines of the last call
+        """
+        with self._lock:
+            return {name: dict(record, top=list(record['top'])) for name, record in self.records.items()}
+
+    def reset(self):
+        with self._lock:
+            self.records = {}
+
+
+memory_phases = MemoryPhases()
+
+
+@contextmanager
+def memory_phase(name):
+    """Record allocations of the enclosed block under `name` (no-op unless tracemalloc is tracing)"""
+    if not tracemalloc.is_tracing():
+        yield
+        return
+    memory_phases.enter(name)
+    try:
+        yield
+    finally:
+        memory_phases.exit()
+
+
+def start_tracemalloc():
+    """Start tracing at app load when PROFILING['TRACEMALLOC'] is set"""
+    config = settings.PROFILING
+    if config['TRACEMALLOC'] and not tracemalloc.is_tracing():
+        tracemalloc.start(config['TRACEMALLOC_FRAMES'])
+        logger.info(f"tracemalloc started ({config['TRACEMALLOC_FRAMES']} frames)")
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack at a fixed interval from a helper thread
+
+    Pure Python and portable (no signals, works in any worker thread); the
+    profiled thread only pays for the GIL handoffs, roughly one per sample.
+    """
+
+    def __init__(self, thread_id=None, interval=0.001):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def collapse(frame):
+        """module.qualname;... from the outermost frame to `frame`"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            self.stacks[self.collapse(frame)] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling; returns the Counter of collapsed stacks"""
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+    def write(self, path):
+        """Write collapsed stacks, most sampled first"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+def profile_path(label):
+    """Unique file for one profile under PROFILING['OUTPUT_DIR']"""
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-') or 'root'
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{os.getpid()}-{uuid.uuid4().hex[:6]}.folded"
+    return Path(settings.PROFILING['OUTPUT_DIR']) / name
+
+
+def prune_profiles(keep):
+    """Delete all but the `keep` newest profiles in PROFILING['OUTPUT_DIR']; returns files removed"""
+    try:
+        entries = [entry for entry in os.scandir(settings.PROFILING['OUTPUT_DIR']) if entry.name.endswith('.folded')]
+    except FileNotFoundError:
+        return 0
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    removed = 0
+    for entry in entries[keep:]:
+        try:
+            os.remove(entry.path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+class ProfilingMiddleware:
+    """
+    Samples requests that carry PROFILING['HEADER'] (or every request with
+    PROFILING['ALL_REQUESTS']) and names the written file in the response
+
+    The header is only honoured for staff users or when its value matches
+    PROFILING['SECRET'], so anonymous clients cannot start samplers or fill
+    the disk; at most MAX_FILES profiles are kept.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    @staticmethod
+    def wants_profile(request, config):
+        if config['ALL_REQUESTS']:
+            return True
+        value = request.headers.get(config['HEADER'])
+        if not value:
+            return False
+        if config['SECRET'] and hmac.compare_digest(value.encode(), config['SECRET'].encode()):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    def __call__(self, request):
+        config = settings.PROFILING
+        if not self.wants_profile(request, config):
+            return self.get_response(request)
+
+        sampler = StackSampler(interval=config['SAMPLE_INTERVAL_MS'] / 1000).start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        try:
+            path = sampler.write(profile_path(request.path))
+        except OSError as e:
+            logger.error(f"Could not write request profile: {e}")
+            return response
+        prune_profiles(config['MAX_FILES'])
+        response['X-Profile-File'] = path.name
+        logger.info(f"Profiled {request.method} {request.path}: {sampler.samples} samples in {path}")
+        return response
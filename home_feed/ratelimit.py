@@ -0,0 +1,177 @@
+"""
+Token buckets and concurrency slots shared by all workers on a host
+
+State lives in a small SQLite file (RATE_LIMIT['STORE']) in WAL mode with
+synchronous=OFF: each check is one atomic statement, nothing has to survive
+a crash, and every gunicorn worker sees the same buckets without a cache
+server.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    granted INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS slots (
+    token TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slots_scope_idx ON slots (scope, expires);
+"""
+
+# Refill by elapsed time, then take `cost` tokens if there are enough.
+# SET expressions see the row as it was before the update.
+_TAKE = """
+INSERT INTO buckets (key, tokens, updated, granted)
+VALUES (:key, :capacity - :cost, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    granted = min(:capacity, tokens + (:now - updated) * :rate) >= :cost,
+    tokens = min(:capacity, tokens + (:now - updated) * :rate)
+             - (CASE WHEN min(:capacity, tokens + (:now - updated) * :rate) >= :cost THEN :cost ELSE 0 END),
+    updated = :now
+RETURNING granted, tokens
+"""
+
+# Buckets idle this long are full again and can be dropped
+_PRUNE_AFTER_SECONDS = 3600
+_PRUNE_EVERY = 1000
+
+
+class RateLimitStore:
+    """Shared token buckets and expiring concurrency slots"""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    @property
+    def path(self):
+        return str(self._path or settings.RATE_LIMIT['STORE'])
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork or a path change
+        key = (os.getpid(), self.path)
+        if getattr(self._local, 'key', None) != key:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.key = conn, key
+        return self._local.conn
+
+    def take(self, key, rate, capacity, cost=1.0):
+        """
+        Take `cost` tokens from a bucket refilling at `rate` tokens/second
+
+        Returns:
+            tuple: (allowed, seconds until enough tokens are available)
+        """
+        now = time.time()
+        conn = self._connection()
+        granted, tokens = conn.execute(
+            _TAKE, {'key': key, 'rate': rate, 'capacity': capacity, 'cost': cost, 'now': now}
+        ).fetchone()
+
+        self._takes += 1
+        if self._takes % _PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - _PRUNE_AFTER_SECONDS,))
+
+        if granted:
+            return True, 0.0
+        return False, (cost - tokens) / rate
+
+    def refund(self, key, capacity, cost=1.0):
+        """Give back tokens taken for a request that was refused further on"""
+        self._connection().execute(
+            'UPDATE buckets SET tokens = min(?, tokens + ?) WHERE key = ?', (capacity, cost, key)
+        )
+
+    def acquire_slot(self, scope, limit, ttl):
+        """
+        Claim one of `limit` concurrent slots of `scope`
+
+        Slots expire after `ttl` seconds so a crashed worker cannot leak them.
+
+        Returns:
+            str: slot token to pass to release_slot(), or None if all are taken
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM slots WHERE scope = ? AND expires <= ?', (scope, now))
+            (taken,) = conn.execute('SELECT count(*) FROM slots WHERE scope = ?', (scope,)).fetchone()
+            token = None
+            if taken < limit:
+                token = uuid.uuid4().hex
+                conn.execute('INSERT INTO slots (token, scope, expires) VALUES (?, ?, ?)', (token, scope, now + ttl))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return token
+
+    def release_slot(self, token):
+        self._connection().execute('DELETE FROM slots WHERE token = ?', (token,))
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM buckets')
+        conn.execute('DELETE FROM slots')
+
+
+rate_limit_store = RateLimitStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle drawing from a per-client and a global bucket of `scope`
+
+    Clients are identified by user id when authenticated, else by IP (DRF's
+    get_ident, which honours NUM_PROXIES). A request the global bucket
+    refuses gets its client token back, so clients are not locked out after
+    a global overload clears. DRF answers a refusal with 429 and a
+    Retry-After header taken from wait().
+    """
+    scope = None
+
+    def allow_request(self, request, view):
+        config = settings.RATE_LIMIT
+        if not config['ENABLED']:
+            return True
+        limits = config['SCOPES'][self.scope]
+
+        user = getattr(request, 'user', None)
+        client = f'user:{user.pk}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        client_key = f'{self.scope}:{client}'
+        allowed, self._wait = rate_limit_store.take(client_key, limits['RATE'], limits['BURST'])
+        if allowed and limits.get('GLOBAL_RATE'):
+            allowed, self._wait = rate_limit_store.take(
+                f'{self.scope}:*', limits['GLOBAL_RATE'], limits['GLOBAL_BURST']
+            )
+            if not allowed:
+                rate_limit_store.refund(client_key, limits['BURST'])
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class FeedThrottle(TokenBucketThrottle):
+    scope = 'feed'
+
+
+class ScrapeThrottle(TokenBucketThrottle):
+    scope = 'scrape'
@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .impressions import get_served_counts
+from .models import ImageURL
+
+logger = logging.getLogger(__name__)
+
+
+def compute_weights(created_ts, now, served=None):
+    """
+    Sampling weight for each image
+
+    Weight decays with age (halving every HALF_LIFE_HOURS, never below
+    MIN_WEIGHT) and is scaled by (1 + served) ** SERVED_EXPONENT so a
+    negative exponent rotates over-served images out of the feed.
+
+    Args:
+        created_ts (np.ndarray): Creation time of each image (epoch seconds)
+        now (float): Current time (epoch seconds)
+        served (np.ndarray): Number of times each image was served (optional)
+
+    Returns:
+        np.ndarray: Positive float64 weights
+    """
+    config = settings.WEIGHTED_SAMPLING
+    age_hours = np.maximum(now - created_ts, 0.0) / 3600.0
+    weights = config['MIN_WEIGHT'] + np.exp2(-age_hours / config['HALF_LIFE_HOURS'])
+    if served is not None and config['SERVED_EXPONENT']:
+        weights *= np.power(1.0 + served, config['SERVED_EXPONENT'])
+    return weights
+
+
+def build_alias_table(weights):
+    """
+    Build a Walker/Vose alias table in O(n) vectorized NumPy operations
+
+    Instead of popping small/large stacks one bucket at a time, deficits of
+    the under-full buckets and surpluses of the over-full ones are laid out
+    on two cumulative lines. Each under-full bucket aliases the donor whose
+    surplus covers the start of its deficit; a donor whose surplus runs out
+    part-way through a deficit becomes under-full itself and aliases the
+    next donor, which is the pairing Vose's algorithm produces when donors
+    are consumed in order.
+
+    Returns:
+        tuple: (prob, alias) arrays for draw()
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    n = weights.size
+    scaled = weights * (n / weights.sum())
+    prob = np.ones(n, dtype=np.float64)
+    alias = np.arange(n, dtype=np.int64)
+
+    small = np.flatnonzero(scaled < 1.0)
+    large = np.flatnonzero(scaled >= 1.0)
+    if small.size == 0 or large.size == 0:
+        return prob, alias
+
+    deficit = 1.0 - scaled[small]
+    deficit_end = np.cumsum(deficit)
+    deficit_start = deficit_end - deficit
+    surplus_end = np.cumsum(scaled[large] - 1.0)
+
+    # Under-full buckets: alias the donor whose surplus covers their start
+    donor = np.searchsorted(surplus_end, deficit_start, side='right')
+    np.minimum(donor, large.size - 1, out=donor)
+    prob[small] = scaled[small]
+    alias[small] = large[donor]
+
+    # Donors that run dry inside a deficit interval keep the remainder and
+    # borrow the rest from the next donor. The last donor closes the table.
+    gap = np.searchsorted(deficit_end, surplus_end[:-1], side='right')
+    inside = np.flatnonzero(gap < small.size)
+    inside = inside[surplus_end[inside] > deficit_start[gap[inside]]]
+    prob[large[inside]] = 1.0 - (deficit_end[gap[inside]] - surplus_end[inside])
+    alias[large[inside]] = large[inside + 1]
+
+    np.clip(prob, 0.0, 1.0, out=prob)
+    return prob, alias
+
+
+def draw(prob, alias, size, rng):
+    """Draw `size` indices from an alias table in O(1) each"""
+    buckets = rng.integers(0, prob.size, size=size)
+    return np.where(rng.random(size) < prob[buckets], buckets, alias[buckets])
+
+
+class WeightedSampler:
+    """
+    Per-process alias table over active image ids
+
+    Ingest calls mark_stale() and the next sample() appends only the new rows
+    (also done every REFRESH_SECONDS to pick up other processes' scrapes).
+    A full reload, which drops deactivated images, happens every
+    FULL_REBUILD_SECONDS or after invalidate(). Weights are recomputed on
+    every rebuild so recency stays current.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+        self._ids = np.empty(0, dtype=np.int64)
+        self._created = np.empty(0, dtype=np.float64)
+        # (ids, prob, alias) swapped atomically so readers never need the lock
+        self._table = None
+        self._refreshed_at = 0.0
+        self._full_rebuild_at = 0.0
+
+    def mark_stale(self):
+        """Pick up newly ingested rows on the next sample()"""
+        self._refreshed_at = 0.0
+
+    def invalidate(self):
+        """Force a full reload on the next sample()"""
+        self._full_rebuild_at = 0.0
+
+    def refresh(self, full=False):
+        """Load new (or, with full=True, all) active images and rebuild the table"""
+        with self._lock:
+            started = time.monotonic()
+            if full or not self._full_rebuild_at:
+                ids, created = self._load()
+            else:
+                last_id = int(self._ids[-1]) if self._ids.size else 0
+                new_ids, new_created = self._load(after_id=last_id)
+                ids = np.concatenate([self._ids, new_ids])
+                created = np.concatenate([self._created, new_created])
+
+            self._ids, self._created = ids, created
+            if ids.size:
+                weights = compute_weights(created, time.time(), self._served(ids))
+                prob, alias = build_alias_table(weights)
+                self._table = (ids, prob, alias)
+            else:
+                self._table = None
+
+            now = time.monotonic()
+            self._refreshed_at = now
+            if full or not self._full_rebuild_at:
+                self._full_rebuild_at = now
+            logger.info(f"Weighted sampler rebuilt over {ids.size} images in {now - started:.3f}s")
+
+    def _current_table(self):
+        config = settings.WEIGHTED_SAMPLING
+        now = time.monotonic()
+        if not self._full_rebuild_at or now - self._full_rebuild_at > config['FULL_REBUILD_SECONDS']:
+            self.refresh(full=True)
+        elif now - self._refreshed_at > config['REFRESH_SECONDS']:
+            self.refresh()
+        return self._table
+
+    def sample(self, count):
+        """
+        Return up to `count` distinct image ids drawn by weight
+
+        Returns an empty list if there are no active images.
+        """
+        table = self._current_table()
+        if table is None:
+            return []
+        ids, prob, alias = table
+        if ids.size <= count:
+            return ids.tolist()
+
+        # Draw with replacement and keep the first `count` distinct picks
+        picked = {}
+        for _ in range(8):
+            for index in draw(prob, alias, count * 2, self._rng).tolist():
+                picked.setdefault(index, None)
+                if len(picked) == count:
+                    return ids[list(picked)].tolist()
+        return ids[list(picked)].tolist()
+
+    def sample_uniform(self, count):
+        """Up to `count` distinct ids drawn uniformly from the same in-memory id list"""
+        table = self._current_table()
+        if table is None:
+            return []
+        ids = table[0]
+        if ids.size <= count:
+            return ids.tolist()
+        return ids[self._rng.choice(ids.size, count, replace=False)].tolist()
+
+    @staticmethod
+    def _load(after_id=0):
+        """Fetch (ids, created timestamps) of active images with id > after_id"""
+        rows = (
+            ImageURL.objects.filter(is_active=True, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'created_at')
+            .iterator(chunk_size=10000)
+        )
+        ids = []
+        created = []
+        for image_id, created_at in rows:
+            ids.append(image_id)
+            created.append(created_at.timestamp() if created_at else 0.0)
+        return np.array(ids, dtype=np.int64), np.array(created, dtype=np.float64)
+
+    @staticmethod
+    def _served(ids):
+        """Persisted serve counts aligned with the (sorted) `ids` array"""
+        served_ids, served_counts = get_served_counts()
+        served = np.zeros(ids.size, dtype=np.float64)
+        if not served_ids:
+            return served
+        served_ids = np.array(served_ids, dtype=np.int64)
+        positions = np.searchsorted(ids, served_ids)
+        np.minimum(positions, ids.size - 1, out=positions)
+        found = ids[positions] == served_ids
+        served[positions[found]] = np.array(served_counts, dtype=np.float64)[found]
+        return served
+
+
+weighted_sampler = WeightedSampler()
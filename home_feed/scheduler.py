@@ -0,0 +1,344 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ScheduledJob
+
+logger = logging.getLogger(__name__)
+
+_CRON_ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+# (low, high) of minute, hour, day of month, month, day of week (0 = Sunday, 7 too)
+_CRON_BOUNDS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression ("*/15 6-18 * * 1-5", "@daily")
+
+    Supports lists, ranges and steps. As in cron, when both day of month
+    and day of week are restricted a day matching either one qualifies.
+    Times are evaluated in UTC.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        fields = _CRON_ALIASES.get(expression.strip(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self._parse_field(field, low, high) for field, (low, high) in zip(fields, _CRON_BOUNDS)
+        )
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            span, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if span == '*':
+                start, end = low, high
+            elif '-' in span:
+                start, end = (int(value) for value in span.split('-', 1))
+            else:
+                start = int(span)
+                end = high if step > 1 else start
+            if not low <= start <= end <= high or step < 1:
+                raise ValueError(f'Invalid cron field {field!r}')
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day or weekday
+        return day and weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after `moment`"""
+        moment = moment.astimezone(dt_timezone.utc).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skip whole months / days / hours at a time; 5 years covers every valid expression
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression never matches: {self.expression!r}')
+
+
+def _job_config(name):
+    try:
+        return settings.SCHEDULER['JOBS'][name]
+    except KeyError:
+        raise ValueError(f'Unknown job: {name}')
+
+
+def next_run_time(name, now, failures=0):
+    """
+    When a job should run next
+
+    After a failure the job is retried with exponential backoff, but never
+    later than its next regular cron slot. Jitter spreads regular runs so
+    they do not all hit Pinterest on the minute.
+    """
+    config = _job_config(name)
+    if not config.get('CRON'):
+        return None
+    scheduled = CronSchedule(config['CRON']).next_after(now)
+    scheduled += timedelta(seconds=random.uniform(0, config.get('JITTER_SECONDS', 0)))
+    if failures:
+        delay = min(config['BACKOFF_BASE_SECONDS'] * 2 ** (failures - 1), config['BACKOFF_MAX_SECONDS'])
+        scheduled = min(scheduled, now + timedelta(seconds=delay))
+    return scheduled
+
+
+class JobRunner:
+    """
+    Runs named jobs at most once at a time across all processes
+
+    A caller that finds the job already running joins it and gets that
+    run's result: threads of this process wait on a shared Future, other
+    processes poll the ScheduledJob row until its run_count moves on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _owner_token():
+        return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    @staticmethod
+    def _ensure_row(name):
+        job, _ = ScheduledJob.objects.get_or_create(
+            name=name,
+            defaults={'next_run_at': next_run_time(name, timezone.now())}
+        )
+        return job
+
+    @staticmethod
+    def acquire(name, owner, due_only=False):
+        """Take the lease if nobody holds an unexpired one (atomic UPDATE)"""
+        now = timezone.now()
+        free = Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lte=now)
+        jobs = ScheduledJob.objects.filter(free, name=name)
+        if due_only:
+            jobs = jobs.filter(next_run_at__lte=now)
+        return jobs.update(
+            owner=owner,
+            lease_expires_at=now + timedelta(seconds=settings.SCHEDULER['LEASE_SECONDS']),
+            last_started_at=now
+        ) == 1
+
+    @staticmethod
+    def _heartbeat(name, owner, done):
+        """Keep extending the lease while the job runs"""
+        lease = settings.SCHEDULER['LEASE_SECONDS']
+        try:
+            while not done.wait(lease / 3):
+                ScheduledJob.objects.filter(name=name, owner=owner).update(
+                    lease_expires_at=timezone.now() + timedelta(seconds=lease)
+                )
+        finally:
+            connection.close()
+
+    def _execute(self, name, owner, kwargs):
+        config = _job_config(name)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(name, owner, done), daemon=True)
+        heartbeat.start()
+        started = time.monotonic()
+        try:
+            result = import_string(config['CALLABLE'])(**{**config.get('KWARGS', {}), **kwargs})
+            if not isinstance(result, dict):
+                result = {'success': True, 'result': result}
+        except Exception as e:
+            logger.error(f"Job {name} failed: {e}", exc_info=True)
+            result = {'success': False, 'message': f'{type(e).__name__}: {e}'}
+        finally:
+            done.set()
+            heartbeat.join()
+
+        success = result.get('success', True)
+        now = timezone.now()
+        job = ScheduledJob.objects.get(name=name)
+        failures = 0 if success else job.failures + 1
+        ScheduledJob.objects.filter(name=name, owner=owner).update(
+            owner='',
+            lease_expires_at=None,
+            last_finished_at=now,
+            last_result=result,
+            failures=failures,
+            run_count=F('run_count') + 1,
+            next_run_at=next_run_time(name, now, failures)
+        )
+        logger.info(f"Job {name} {'succeeded' if success else 'failed'} in {time.monotonic() - started:.1f}s")
+        return result
+
+    @staticmethod
+    def _still_running(name):
+        return {'success': False, 'running': True, 'message': f'Timed out waiting for the running {name} job'}
+
+    def _run_or_join(self, name, kwargs, due_only, join_timeout):
+        owner = self._owner_token()
+        deadline = time.monotonic() + join_timeout
+        while True:
+            seen = self._ensure_row(name).run_count
+            if self.acquire(name, owner, due_only):
+                return self._execute(name, owner, kwargs)
+            if due_only:
+                return None
+
+            # Another process is running it: wait for that run to finish
+            while time.monotonic() < deadline:
+                time.sleep(settings.SCHEDULER['JOIN_POLL_SECONDS'])
+                job = ScheduledJob.objects.get(name=name)
+                if job.run_count != seen:
+                    return dict(job.last_result, joined=True)
+                if job.lease_expires_at is None or job.lease_expires_at <= timezone.now():
+                    break  # The holder died; try to take over
+            else:
+                return self._still_running(name)
+
+    def run(self, name, due_only=False, join_timeout=None, **kwargs):
+        """
+        Run a job now, or join the run already in progress
+
+        Args:
+            name (str): Key in settings.SCHEDULER['JOBS']
+            due_only (bool): Scheduler mode; only run if next_run_at has passed
+                             and return None instead of joining
+            join_timeout (float): Longest wait for a run started by someone else
+                                  (default: SCHEDULER['JOIN_TIMEOUT_SECONDS'])
+            **kwargs: Override the job's configured KWARGS
+
+        Returns:
+            dict: the job's result; `joined` is True when another caller ran it,
+                  `running` is True when the wait timed out
+        """
+        if join_timeout is None:
+            join_timeout = settings.SCHEDULER['JOIN_TIMEOUT_SECONDS']
+        _job_config(name)
+        with self._lock:
+            future = self._inflight.get(name)
+            joined = future is not None
+            if not joined:
+                future = self._inflight[name] = Future()
+
+        if joined:
+            if due_only:
+                return None
+            try:
+                result = future.result(timeout=join_timeout)
+            except FutureTimeoutError:
+                return self._still_running(name)
+            return None if result is None else dict(result, joined=True)
+
+        try:
+            result = self._run_or_join(name, kwargs, due_only, join_timeout)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(name, None)
+
+    def submit(self, name, join_timeout=None, **kwargs):
+        """
+        run() in a background thread, so the caller can stop waiting early
+
+        A request thread waits on the returned Future for as long as it may
+        and answers while the job keeps running; a killed or timed-out web
+        request no longer takes the job (and its browsers) down with it.
+
+        Returns:
+            Future: resolves to run()'s result
+        """
+        future = Future()
+
+        def target():
+            try:
+                future.set_result(self.run(name, join_timeout=join_timeout, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                connection.close()
+
+        threading.Thread(target=target, name=f'job-{name}', daemon=True).start()
+        return future
+
+    def run_due_jobs(self):
+        """Run every scheduled job whose time has come (one scheduler tick)"""
+        for name, config in settings.SCHEDULER['JOBS'].items():
+            if config.get('CRON'):
+                self.run(name, due_only=True)
+
+    def _loop(self):
+        poll = settings.SCHEDULER['POLL_SECONDS']
+        # Stagger workers so they don't all poll the table at the same moment
+        self._stop.wait(random.uniform(0, poll))
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                self.run_due_jobs()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}", exc_info=True)
+            self._stop.wait(poll)
+        connection.close()
+
+    def start(self):
+        """Start the background scheduler thread (idempotent, per process)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='home-feed-scheduler', daemon=True)
+            self._thread.start()
+        logger.info(f"Scheduler started for jobs: {', '.join(settings.SCHEDULER['JOBS'])}")
+
+    def stop(self):
+        self._stop.set()
+
+
+job_runner = JobRunner()
+
+
+def start_scheduler():
+    """Called from the WSGI/ASGI entry points so only server processes schedule"""
+    if settings.SCHEDULER['ENABLED']:
+        job_runner.start()
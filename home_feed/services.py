@@ -1,10 +1,13 @@
-import requests
-import random
 import logging
-from django.db import IntegrityError
-from datetime import datetime, timedelta
+from django.conf import settings
+from .colors import extract_colors
+from .dedup import detect_near_duplicates
+from .enrichment import enrich_images
+from .managers import ImageURLManager
+from .mirror import mirror_images
 from .models import ImageURL
-from pinterest_dl import PinterestDL
+from .profiling import memory_phase
+from .sources import get_sources, pinterest_client, run_sources, uses_default_cookies
 from dotenv import load_dotenv
 import os
 import json
@@ -12,67 +15,6 @@ import time
 
 logger = logging.getLogger(__name__)
 
-class ImageURLManager:
-    """Helper class to manage ImageURL database operations"""
-    
-    @staticmethod
-    def add_urls(urls, source='unknown'):
-        """Add new URLs to database, returns count of added URLs"""
-        if not urls:
-            return 0
-        
-        image_instances = []
-        for url_data in urls:
-            if isinstance(url_data, dict):
-                image_instances.append(ImageURL(
-                    src=url_data.get('src', ''),
-                    alt=url_data.get('alt', ''),
-                    origin=url_data.get('origin', source),
-                    fallback_urls=url_data.get('fallback_urls', [])
-                ))
-            else:
-                # Handle simple string URLs
-                image_instances.append(ImageURL(
-                    src=str(url_data),
-                    alt='',
-                    origin=source,
-                    fallback_urls=[]
-                ))
-        
-        if image_instances:
-            ImageURL.objects.bulk_create(image_instances, ignore_conflicts=True)
-            return len(image_instances)
-        return 0
-    
-    @staticmethod
-    def get_random_urls(count=10):
-        """Get random active URLs from database"""
-        active_images = ImageURL.objects.filter(is_active=True)
-        
-        if not active_images.exists():
-            return []
-        
-        # Get random selection
-        if active_images.count() <= count:
-            return list(active_images)
-        else:
-            return list(active_images.order_by('?')[:count])  # Random order
-    
-    @staticmethod
-    def get_active_count():
-        """Get count of active URLs in database"""
-        return ImageURL.objects.filter(is_active=True).count()
-    
-    @staticmethod
-    def deactivate_old_urls(days=30):
-        """Deactivate URLs older than specified days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        updated_count = ImageURL.objects.filter(
-            created_at__lt=cutoff_date,
-            is_active=True
-        ).update(is_active=False)
-        return updated_count
-
 class ImageScrapingService:
     def __init__(self):
         self.url_manager = ImageURLManager()
@@ -80,11 +22,18 @@ class ImageScrapingService:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
     
-    def scrape_home_images(self, count=20):
-        """Scrape images from Pinterest home feed - automated for cron tasks"""
+    def scrape_home_images(self, count=20, sources=None):
+        """
+        Scrape the configured sources (settings.SCRAPE_SOURCES) in parallel
+        and run the post-scrape pipeline - automated for scheduled runs
+
+        Args:
+            count (int): Cap on the number of images scraped per source
+            sources (list): Source names (default: all)
+        """
         try:
             # first check if we have cookies (automated, no user interaction)
-            if not get_valid_pinterest_cookies():
+            if uses_default_cookies(get_sources(sources)) and not get_valid_pinterest_cookies():
                 logger.error("Failed to get valid Pinterest cookies")
                 return {
                     'success': False,
@@ -94,17 +43,61 @@ class ImageScrapingService:
                 }
             
             # download the images
-            download_home_feed()
+            with memory_phase('scrape'):
+                stats = run_sources(sources, count)
+            failed = [result['name'] for result in stats['sources'] if result['error']]
+            if len(failed) == len(stats['sources']):
+                return {
+                    'success': False,
+                    'message': f"All sources failed: {', '.join(failed)}",
+                    'new_images_count': 0,
+                    'total_images': ImageURL.objects.count(),
+                    'sources': stats['sources']
+                }
+
+            if settings.NEAR_DUPLICATES['RUN_AFTER_SCRAPE']:
+                try:
+                    with memory_phase('dedupe'):
+                        detect_near_duplicates()
+                except Exception as e:
+                    logger.error(f"Near-duplicate detection failed: {e}")
+
+            if settings.ENRICHMENT['RUN_AFTER_SCRAPE']:
+                try:
+                    with memory_phase('enrich'):
+                        enrich_images()
+                except Exception as e:
+                    logger.error(f"Image enrichment failed: {e}")
+
+            if settings.COLOR_EXTRACTION['RUN_AFTER_SCRAPE']:
+                try:
+                    with memory_phase('colors'):
+                        extract_colors()
+                except Exception as e:
+                    logger.error(f"Color extraction failed: {e}")
+
+            if settings.IMAGE_MIRROR['ENABLED']:
+                try:
+                    with memory_phase('mirror'):
+                        mirror_images()
+                except Exception as e:
+                    logger.error(f"Image mirroring failed: {e}")
             
             # Get current count from database
             total_images = ImageURL.objects.count()
             
-            # For now, we'll return success - in the future we can track new vs existing
+            message = (
+                f"Scraped {stats['scraped']} images from {len(stats['sources']) - len(failed)} sources "
+                f"with {stats['processes']} processes ({stats['images_per_second']:.1f} images/s)"
+            )
+            if failed:
+                message += f"; failed: {', '.join(failed)}"
             return {
                 'success': True,
-                'message': 'Images downloaded successfully',
-                'new_images_count': count,  # placeholder - will be accurate once we implement proper tracking
-                'total_images': total_images
+                'message': message,
+                'new_images_count': stats['inserted'],
+                'total_images': total_images,
+                'sources': stats['sources']
             }
             
         except Exception as e:
@@ -234,11 +227,12 @@ def get_pinterest_cookies_python(force_refresh=False, automated=False):
         
         # Login using browser - use headless mode for automated tasks
         cookies = (
-            PinterestDL.with_browser(
+            pinterest_client().with_browser(
                 browser_type="firefox",
                 headless=automated,  # Use headless mode for automated tasks
                 incognito=False,
                 verbose=not automated,  # Reduce verbosity for automated tasks
+                **settings.PINTEREST_DL['OPTIONS']
             )
             .login(email, password)
             .get_cookies(after_sec=7)
@@ -315,48 +309,24 @@ def format_cookies_for_requests(cookies_list):
     return {cookie['name']: cookie['value'] for cookie in cookies_list if 'name' in cookie and 'value' in cookie}
 
 
-def download_home_feed():
-    # Simple example: Download 10 images from home feed using scrape_and_download
-    print("🚀 Home Feed Download Example")
+def download_home_feed(sources=None):
+    """Scrape the configured sources and print a per-source summary"""
+    print("🚀 Feed Download")
     print("=" * 50)
     
     try:
-        print("📱 Downloading images from your Pinterest home feed...")
-        
-        # Use scrape_and_download directly - this will actually download the files
-        ## List[PinterestImage]
-        images = (
-            PinterestDL.with_browser(
-                browser_type="firefox",
-                timeout=10,
-                headless=True,
-                incognito=False,
-                verbose=True,
-                ensure_alt=False,
-            )
-            .with_cookies_path(os.path.join(os.path.dirname(os.path.dirname(__file__)), "cookies.json"))
-            .scrape(
-                url="https://www.pinterest.com",
-                num=10,
-            )
+        with memory_phase('scrape'):
+            stats = run_sources(sources)
+        for result in stats['sources']:
+            if result['error']:
+                print(f"❌ {result['name']}: {result['error']}")
+            else:
+                print(f"📱 {result['name']}: scraped {result['scraped']} images, {result['inserted']} new")
+        logger.info(
+            f"✅ Scraped {stats['scraped']} images, {stats['inserted']} new, using {stats['processes']} processes "
+            f"({stats['images_per_second']:.1f} images/s)"
         )
-
-        # Save the images to a database
-        image_instances = []
-        for image in images:
-            image_instances.append(ImageURL(
-                src=image.src,
-                alt=image.alt,
-                origin=image.origin,
-                fallback_urls=image.fallback_urls
-            ))
-        
-        # save to database using bulk_create for better performance
-        if image_instances:
-            ImageURL.objects.bulk_create(image_instances, ignore_conflicts=True)
-            logger.info(f"✅ Successfully saved {len(image_instances)} images to database")
+        return stats
 
     except Exception as e:
         logger.error(f"❌ Error: {e}")
-
-  
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Offline stand-in for Pinterest: deterministic pins, a fake feed server and
+a PinterestDL test double
+
+Set PINTEREST_DL['BACKEND'] to 'home_feed.simulator.FakePinterestDL' to run
+login, scraping and ingest without a browser or network access. Like
+home_feed.sources this runs in spawned scrape workers, so it must not
+import models or read settings.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from urllib.request import urlopen
+
+PAGE_SIZE = 25
+COOKIE_LIFETIME_SECONDS = 14 * 24 * 3600
+
+_WORDS = (
+    'autumn', 'kitchen', 'minimal', 'garden', 'vintage', 'coastal', 'recipe', 'cozy', 'outfit', 'travel',
+    'wedding', 'modern', 'rustic', 'watercolor', 'bedroom', 'summer', 'floral', 'pasta', 'mountain', 'design',
+)
+
+
+def generate_pins(url, count, seed=0, start=0):
+    """
+    Deterministic fake pins for a source URL
+
+    The same (seed, url, index) always yields the same pin and different
+    URLs never collide, so any number of pins can be generated on demand.
+
+    Returns:
+        list: image dicts (src, alt, origin, fallback_urls)
+    """
+    pins = []
+    for index in range(start, start + count):
+        digest = hashlib.sha1(f'{seed}:{url}:{index}'.encode()).hexdigest()
+        path = f'{digest[:2]}/{digest[2:4]}/{digest[4:6]}/{digest}.jpg'
+        words = [_WORDS[int(digest[i:i + 2], 16) % len(_WORDS)] for i in range(0, 12, 2)]
+        pins.append({
+            'src': f'https://i.pinimg.com/736x/{path}',
+            'alt': ' '.join(words).capitalize(),
+            'origin': f'https://www.pinterest.com/pin/{int(digest[:15], 16)}/',
+            'fallback_urls': [f'https://i.pinimg.com/originals/{path}'],
+        })
+    return pins
+
+
+def fake_cookies(email, now=None):
+    """Session cookies shaped like the ones the real login captures"""
+    now = int(now or time.time())
+    token = hashlib.sha1(email.encode()).hexdigest()
+    return [
+        {'name': '_pinterest_sess', 'value': token, 'domain': '.pinterest.com', 'path': '/',
+         'secure': True, 'httpOnly': True, 'expiry': now + COOKIE_LIFETIME_SECONDS},
+        {'name': 'csrftoken', 'value': token[:32], 'domain': '.pinterest.com', 'path': '/',
+         'secure': True, 'httpOnly': False, 'expiry': now + COOKIE_LIFETIME_SECONDS},
+    ]
+
+
+class SimulatedScrapeError(RuntimeError):
+    pass
+
+
+class _FeedPage:
+    """Pages of generated pins with latency and failure injection"""
+
+    def __init__(self, seed, latency_ms, error_rate):
+        self.seed = seed
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+    def fetch(self, url, offset, limit):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        # Seeded per page so failures are reproducible with or without the server
+        if self.error_rate and random.Random(f'{self.seed}:{url}:{offset}').random() < self.error_rate:
+            raise SimulatedScrapeError(f'Simulated failure loading {url} at pin {offset}')
+        return generate_pins(url, limit, self.seed, offset)
+
+
+class FakePinterestServer:
+    """
+    Local HTTP server that pages through generated pins
+
+    GET /resource/feed/?url=<source url>&offset=N&limit=M returns
+    {"pins": [...]}; POST /login returns cookies. Every request waits
+    `latency_ms` and fails with 503 with probability `error_rate`.
+    """
+
+    def __init__(self, seed=0, latency_ms=0, error_rate=0.0, host='127.0.0.1', port=0):
+        self.page = _FeedPage(seed, latency_ms, error_rate)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path.rstrip('/') != '/resource/feed':
+                    return self._send(404, {'error': 'not found'})
+                query = parse_qs(parsed.query)
+                try:
+                    pins = server.page.fetch(
+                        query['url'][0], int(query.get('offset', ['0'])[0]),
+                        int(query.get('limit', [str(PAGE_SIZE)])[0])
+                    )
+                except (KeyError, ValueError):
+                    return self._send(400, {'error': 'url, offset and limit are required'})
+                except SimulatedScrapeError as e:
+                    return self._send(503, {'error': str(e)})
+                self._send(200, {'pins': pins})
+
+            def do_POST(self):
+                if self.path.rstrip('/') != '/login':
+                    return self._send(404, {'error': 'not found'})
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                self._send(200, {'cookies': fake_cookies(body.get('email', ''))})
+
+            def _send(self, code, payload):
+                with server._lock:
+                    server.requests += 1
+                data = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-pinterest', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakePin:
+    """Mimics the image objects PinterestDL.scrape() returns"""
+
+    def __init__(self, src, alt, origin, fallback_urls):
+        self.src = src
+        self.alt = alt
+        self.origin = origin
+        self.fallback_urls = fallback_urls
+
+
+class FakeWebDriver:
+    """Browser handle whose quit() takes `quit_delay_ms`, like a hung Firefox"""
+
+    def __init__(self, quit_delay_ms=0):
+        self.quit_delay_ms = quit_delay_ms
+
+    def quit(self):
+        if self.quit_delay_ms:
+            time.sleep(self.quit_delay_ms / 1000)
+
+
+class FakePinterestDL:
+    """
+    Drop-in for the parts of pinterest_dl.PinterestDL this project uses
+
+    Pins come from a FakePinterestServer when `server_url` is given,
+    otherwise they are generated in-process with the same latency and
+    failure injection. A scrape that hits a failure raises, like a browser
+    session that times out.
+    """
+
+    def __init__(self, seed=0, latency_ms=0, error_rate=0.0, server_url=None, quit_delay_ms=0):
+        self.page = _FeedPage(seed, latency_ms, error_rate)
+        self.server_url = server_url.rstrip('/') if server_url else None
+        self.webdriver = FakeWebDriver(quit_delay_ms)
+        self.cookies = None
+        self.email = None
+
+    @classmethod
+    def with_browser(cls, browser_type='chrome', timeout=3, headless=True, incognito=False, verbose=False,
+                     ensure_alt=False, seed=0, latency_ms=0, error_rate=0.0, server_url=None, quit_delay_ms=0,
+                     **kwargs):
+        return cls(seed=seed, latency_ms=latency_ms, error_rate=error_rate, server_url=server_url,
+                   quit_delay_ms=quit_delay_ms)
+
+    def with_cookies_path(self, path):
+        with open(path) as f:
+            self.cookies = json.load(f)
+        return self
+
+    def login(self, email, password):
+        self.email = email
+        return self
+
+    def get_cookies(self, after_sec=0):
+        if self.server_url:
+            with urlopen(f'{self.server_url}/login', json.dumps({'email': self.email}).encode()) as response:
+                return json.load(response)['cookies']
+        return fake_cookies(self.email or '')
+
+    def _fetch_page(self, url, offset, limit):
+        if not self.server_url:
+            return self.page.fetch(url, offset, limit)
+        query = urlencode({'url': url, 'offset': offset, 'limit': limit})
+        try:
+            with urlopen(f'{self.server_url}/resource/feed/?{query}') as response:
+                return json.load(response)['pins']
+        except OSError as e:
+            raise SimulatedScrapeError(f'Feed request failed: {e}') from e
+
+    def scrape(self, url, num, **kwargs):
+        pins = []
+        while len(pins) < num:
+            pins.extend(self._fetch_page(url, len(pins), min(PAGE_SIZE, num - len(pins))))
+        return [FakePin(**pin) for pin in pins]
@@ -0,0 +1,297 @@
+"""
+Scrape source registry and the process-pool scrape runner
+
+Worker processes are spawned (not forked from a threaded web worker) and
+only import this module, so it must not import models at module level.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+from pathlib import Path
+from urllib.parse import quote_plus
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PINTEREST_URL = 'https://www.pinterest.com'
+SOURCE_TYPES = ('home', 'board', 'search')
+# Where the automated login (services.get_pinterest_cookies_python) stores cookies
+DEFAULT_COOKIES_PATH = Path(__file__).resolve().parent.parent / 'cookies.json'
+
+
+def get_sources(names=None):
+    """
+    Normalized scrape sources from settings.SCRAPE_SOURCES
+
+    Args:
+        names (list): Only these sources (default: all)
+
+    Returns:
+        list: dicts with name, type, url, cookies (Path or None) and quota
+
+    Raises:
+        ValueError: for unknown names or invalid source definitions
+    """
+    registry = settings.SCRAPE_SOURCES
+    names = list(names) if names else list(registry)
+    unknown = [name for name in names if name not in registry]
+    if unknown:
+        raise ValueError(f"Unknown scrape source(s): {', '.join(unknown)}")
+
+    sources = []
+    for name in names:
+        config = registry[name]
+        source_type = config.get('TYPE')
+        if source_type == 'home':
+            url = PINTEREST_URL
+        elif source_type == 'board' and config.get('URL'):
+            url = config['URL']
+        elif source_type == 'search' and config.get('QUERY'):
+            url = f"{PINTEREST_URL}/search/pins/?q={quote_plus(config['QUERY'])}"
+        else:
+            raise ValueError(f"Scrape source {name!r} needs TYPE in {SOURCE_TYPES} with URL (board) or QUERY (search)")
+        cookies = config.get('COOKIES')
+        sources.append({
+            'name': name,
+            'type': source_type,
+            'url': url,
+            'cookies': Path(cookies).resolve() if cookies else None,
+            'quota': config.get('QUOTA', 10),
+        })
+    return sources
+
+
+def uses_default_cookies(sources):
+    return any(source['cookies'] == DEFAULT_COOKIES_PATH for source in sources)
+
+
+def available_memory():
+    """Bytes of RAM available for new processes"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+
+def scrape_concurrency(source_count):
+    """
+    Number of browsers to run at once
+
+    Bounded by the sources to scrape, the CPU count, the RAM available for
+    MEMORY_PER_BROWSER_MB-sized browsers and SCRAPE_RUNNER['MAX_PROCESSES'].
+    """
+    config = settings.SCRAPE_RUNNER
+    by_memory = available_memory() // (config['MEMORY_PER_BROWSER_MB'] * 1024 ** 2)
+    limit = min(source_count, os.cpu_count() or 1, by_memory)
+    if config['MAX_PROCESSES']:
+        limit = min(limit, config['MAX_PROCESSES'])
+    return max(1, limit)
+
+
+def pinterest_client(backend=None):
+    """PinterestDL class from settings.PINTEREST_DL['BACKEND'] (or `backend`)"""
+    return import_string(backend or settings.PINTEREST_DL['BACKEND'])
+
+
+def _init_worker(pids):
+    """
+    Worker initializer: report the pid and turn terminate() into SystemExit
+
+    The pid lets stop_workers() find the pool's processes. The default
+    SIGTERM action kills the worker on the spot and leaves its geckodriver
+    and Firefox running; raising instead lets scrape_source's finally block
+    quit the browser first.
+    """
+    pids.put(os.getpid())
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+def _quit_browser(scraper):
+    # pinterest-dl's scrape() only closes the window, which leaves
+    # geckodriver and the Firefox process behind
+    driver = getattr(scraper, 'webdriver', None)
+    if driver is None:
+        return
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning(f"Could not quit browser: {e}")
+
+
+def scrape_source(url, cookies_path, quota, browser_timeout, backend, options=None):
+    """
+    Scrape one source with its own browser (runs in a worker process)
+
+    The client is passed in by dotted path rather than read from settings,
+    which a spawned worker may not share with its parent (e.g. in tests).
+    The browser is quit however the scrape ends, including when the runner
+    terminates the worker after SCRAPE_RUNNER['TIMEOUT_SECONDS'].
+
+    Returns:
+        list: plain image dicts (src, alt, origin, fallback_urls)
+    """
+    scraper = pinterest_client(backend).with_browser(
+        browser_type="firefox",
+        timeout=browser_timeout,
+        headless=True,
+        incognito=False,
+        verbose=False,
+        ensure_alt=False,
+        **(options or {})
+    )
+    try:
+        if cookies_path:
+            scraper = scraper.with_cookies_path(str(cookies_path))
+        images = scraper.scrape(url=url, num=quota)
+    finally:
+        _quit_browser(scraper)
+    return [
+        {'src': image.src, 'alt': image.alt, 'origin': image.origin, 'fallback_urls': image.fallback_urls}
+        for image in images
+    ]
+
+
+def _cookies_problem(source):
+    from .services import check_cookies_expired
+
+    if source['cookies'] is None:
+        return None
+    exists, expired, _ = check_cookies_expired(str(source['cookies']))
+    if not exists:
+        return f"Cookie file {source['cookies']} not found"
+    if expired:
+        return f"Cookies in {source['cookies']} have expired"
+    return None
+
+
+def stop_workers(executor, pids, grace):
+    """
+    Shut a process pool down and terminate its workers, killing those still
+    alive after `grace` seconds
+
+    Cancelling futures and shutting the pool down leaves running scrapes
+    (and their browsers) alive; terminating them is what frees their memory.
+    `pids` is the queue the workers reported to from _init_worker().
+    """
+    executor.shutdown(wait=False, cancel_futures=True)
+    worker_pids = set()
+    while not pids.empty():
+        worker_pids.add(pids.get())
+    processes = [process for process in multiprocessing.active_children() if process.pid in worker_pids]
+    for process in processes:
+        process.terminate()
+    deadline = time.monotonic() + grace
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logger.warning(f"Scrape worker {process.pid} ignored SIGTERM, killing it")
+            process.kill()
+            process.join()
+    return len(processes)
+
+
+def run_sources(names=None, count=None, executor=None):
+    """
+    Scrape sources in parallel and store the results with their provenance
+
+    Each source runs in its own process (one browser each); results are
+    inserted by this process as they arrive, tagged with ImageURL.source.
+
+    Args:
+        names (list): Sources to scrape (default: all in settings.SCRAPE_SOURCES)
+        count (int): Optional cap on each source's QUOTA
+        executor: Executor to use instead of a new process pool
+
+    Returns:
+        dict: per-source results plus scraped/inserted totals, processes
+              and images_per_second
+    """
+    from .ingest import ingest_images
+    from .profiling import memory_phase
+
+    config = settings.SCRAPE_RUNNER
+    client = settings.PINTEREST_DL
+    started = time.monotonic()
+    results = {}
+    runnable = []
+    for source in get_sources(names):
+        problem = _cookies_problem(source)
+        results[source['name']] = {
+            'name': source['name'], 'scraped': 0, 'inserted': 0, 'skipped': 0, 'error': problem
+        }
+        if problem:
+            logger.error(f"Skipping source {source['name']}: {problem}")
+        else:
+            runnable.append(source)
+
+    processes = scrape_concurrency(len(runnable)) if runnable else 0
+    own_executor = executor is None and runnable
+    if own_executor:
+        context = multiprocessing.get_context('spawn')
+        pids = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(pids,)
+        )
+
+    timed_out = False
+    try:
+        futures = {
+            executor.submit(
+                scrape_source,
+                source['url'],
+                source['cookies'],
+                min(source['quota'], count) if count else source['quota'],
+                config['BROWSER_TIMEOUT'],
+                client['BACKEND'],
+                client['OPTIONS']
+            ): source
+            for source in runnable
+        }
+        try:
+            for future in as_completed(futures, timeout=config['TIMEOUT_SECONDS']):
+                result = results[futures[future]['name']]
+                try:
+                    with memory_phase('scrape.collect'):
+                        rows = future.result()
+                except Exception as e:
+                    result['error'] = f'{type(e).__name__}: {e}'
+                    logger.error(f"Source {result['name']} failed: {e}")
+                    continue
+                ingested = ingest_images(rows, source=result['name'])
+                result.update(scraped=len(rows), inserted=ingested['inserted'], skipped=ingested['skipped'])
+                logger.info(f"Source {result['name']}: scraped {len(rows)} images, {ingested['inserted']} new")
+        except TimeoutError:
+            timed_out = True
+            for future, source in futures.items():
+                if not future.done():
+                    future.cancel()
+                    results[source['name']]['error'] = 'Timed out'
+    finally:
+        if own_executor and timed_out:
+            stopped = stop_workers(executor, pids, config['TERMINATE_GRACE_SECONDS'])
+            logger.error(f"Scrape timed out after {config['TIMEOUT_SECONDS']}s, stopped {stopped} workers")
+        elif own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.monotonic() - started
+    scraped = sum(result['scraped'] for result in results.values())
+    return {
+        'sources': list(results.values()),
+        'scraped': scraped,
+        'inserted': sum(result['inserted'] for result in results.values()),
+        'processes': processes,
+        'images_per_second': scraped / elapsed if elapsed > 0 else 0.0,
+    }
@@ -0,0 +1,208 @@
+"""
+Server-Sent Events fan-out of newly ingested images
+
+One pump task per process turns new rows into a single pre-encoded SSE
+message per batch and hands the same bytes to every subscriber. It is woken
+by notify() from the ingest path in this process, and polls the database
+for rows committed by other processes (web workers, the scheduler).
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = b': ping\n\n'
+
+
+def encode_event(last_id, images):
+    """One SSE message; the id lets clients resume with Last-Event-ID"""
+    data = json.dumps({'images': images}, separators=(',', ':'))
+    return f'id: {last_id}\nevent: images\ndata: {data}\n\n'.encode()
+
+
+def _fetch_images(after_id, upto_id=None, limit=None):
+    """
+    Serialized active images with id > after_id (and <= upto_id), oldest first
+
+    Returns:
+        list: (image_id, image dict) tuples
+    """
+    from .models import ImageURL
+    from .views import serialize_image  # views imports this module
+
+    images = ImageURL.objects.filter(is_active=True, id__gt=after_id).order_by('id')
+    if upto_id is not None:
+        images = images.filter(id__lte=upto_id)
+    return [(img.id, dict(serialize_image(img), id=img.id)) for img in images[:limit]]
+
+
+def _max_image_id():
+    from .models import ImageURL
+
+    return ImageURL.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+class Subscriber:
+    """Bounded per-connection buffer of encoded messages"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.queue = asyncio.Queue()
+        self.closed = False
+
+    def offer(self, item):
+        """Queue an (id, message) pair; a client too far behind is cut off"""
+        if self.closed:
+            return
+        if self.queue.qsize() >= self.limit:
+            # Drop the backlog and end the stream; the client reconnects with
+            # Last-Event-ID and catches up from history or the database
+            self.closed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return
+        self.queue.put_nowait(item)
+
+
+class ImageStream:
+    """
+    Pushes batches of new images to SSE subscribers in this process
+
+    Idle connections cost one Subscriber each: heartbeats are broadcast by
+    the pump instead of per-connection timers.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._history = deque()
+        self._last_id = None
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+        self._lock = threading.Lock()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def notify(self):
+        """Wake the pump after an ingest commit (safe to call from any thread)"""
+        with self._lock:
+            loop, wakeup = self._loop, self._wakeup
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # The loop shut down in between
+
+    async def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First subscriber, or a new event loop (tests, server restart)
+            with self._lock:
+                self._loop, self._wakeup = loop, asyncio.Event()
+            self._task = None
+        if self._task is None or self._task.done():
+            # Nobody was listening: start from the newest row with an empty
+            # history, since nothing covers the rows in between
+            self._history.clear()
+            self._last_id = await sync_to_async(_max_image_id)()
+            if self._task is None or self._task.done():
+                self._task = loop.create_task(self._pump())
+
+    async def _pump(self):
+        config = settings.IMAGE_STREAM
+        last_sent = time.monotonic()
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), config['POLL_SECONDS'])
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                published = await self.publish_new()
+            except Exception as e:
+                logger.error(f"Image stream: could not load new images: {e}")
+                published = False
+            now = time.monotonic()
+            if published:
+                last_sent = now
+            elif now - last_sent >= config['HEARTBEAT_SECONDS']:
+                for subscriber in list(self._subscribers):
+                    if subscriber.queue.empty():
+                        subscriber.offer((None, HEARTBEAT))
+                last_sent = now
+
+    async def publish_new(self):
+        """Encode images committed since the last message and fan them out"""
+        config = settings.IMAGE_STREAM
+        published = False
+        while True:
+            rows = await sync_to_async(_fetch_images)(self._last_id, limit=config['BATCH_MAX_IMAGES'])
+            if not rows:
+                return published
+            previous, self._last_id = self._last_id, rows[-1][0]
+            message = encode_event(self._last_id, [image for _, image in rows])
+            self._history.append((previous, self._last_id, message))
+            while len(self._history) > config['HISTORY_MESSAGES']:
+                self._history.popleft()
+            for subscriber in list(self._subscribers):
+                subscriber.offer((self._last_id, message))
+            published = True
+            if len(rows) < config['BATCH_MAX_IMAGES']:
+                return published
+
+    async def _replay(self, last_event_id, upto_id):
+        """Messages a resuming client missed, from history when it reaches back far enough"""
+        if self._history and self._history[0][0] <= last_event_id:
+            return [message for previous, last_id, message in self._history
+                    if last_event_id < last_id <= upto_id]
+
+        config = settings.IMAGE_STREAM
+        rows = await sync_to_async(_fetch_images)(last_event_id, upto_id, config['REPLAY_MAX_IMAGES'])
+        size = config['BATCH_MAX_IMAGES']
+        return [
+            encode_event(rows[i:i + size][-1][0], [image for _, image in rows[i:i + size]])
+            for i in range(0, len(rows), size)
+        ]
+
+    async def events(self, last_event_id=None):
+        """
+        Async iterator of encoded SSE messages for one client
+
+        Args:
+            last_event_id (int): Last image id the client saw; missed images
+                                 are replayed (up to REPLAY_MAX_IMAGES)
+        """
+        await self._start()
+        subscriber = Subscriber(settings.IMAGE_STREAM['SUBSCRIBER_QUEUE'])
+        self._subscribers.add(subscriber)
+        try:
+            yield f"retry: {settings.IMAGE_STREAM['RETRY_MS']}\n\n".encode()
+            upto_id = self._last_id
+            if last_event_id is not None and last_event_id < upto_id:
+                for message in await self._replay(last_event_id, upto_id):
+                    yield message
+            while True:
+                item = await subscriber.queue.get()
+                if item is None:
+                    return
+                last_id, message = item
+                if last_id is None or last_id > upto_id:
+                    yield message
+        finally:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                self._wakeup.set()  # Let the pump notice and exit
+
+
+image_stream = ImageStream()
@@ -1,6 +1,32 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
 from .models import ImageURL
 
+# Lets the fetcher read file:// fixtures
+LOCAL_FETCH = {'MAX_WORKERS': 2, 'TIMEOUT': 5, 'MAX_BYTES': 1024 * 1024, 'ALLOW_LOCAL_FILES': True}
+
+
+def temp_dir(test):
+    """Path of a temporary directory removed when `test` finishes"""
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    return directory.name
+
+
+class FeedTestCase(TestCase):
+    """TestCase whose feed requests don't leak buffered impressions into later tests"""
+
+    def setUp(self):
+        from .impressions import impression_buffer
+
+        super().setUp()
+        # Write served counts while the test database still exists
+        self.addCleanup(impression_buffer.flush)
+
 
 class ImageURLQueryTest(TestCase):
     """Simple test to query one ImageURL record from database"""
@@ -37,3 +63,1361 @@ class ImageURLQueryTest(TestCase):
         else:
             print("No images found in database")
             print("💡 This shouldn't happen as we created a test record")
+
+
+class BulkImagesEndpointTest(TestCase):
+    """NDJSON bulk export endpoint"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        for i in range(25):
+            ImageURL.objects.create(
+                src=f"https://example.com/bulk/{i}.jpg",
+                alt=f"Bulk image {i}",
+                origin="https://example.com",
+                is_active=(i != 3),
+            )
+        self.user = User.objects.create_user(username="exporter", password="secret")
+
+    def _fetch(self, **params):
+        response = self.client.get('/api/images/bulk/', params)
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_requires_authentication(self):
+        response = self.client.get('/api/images/bulk/')
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_streams_active_images(self):
+        self.client.force_login(self.user)
+        rows = self._fetch(chunk_size=4)
+        self.assertEqual(len(rows), 24)
+        self.assertEqual([r['id'] for r in rows], sorted(r['id'] for r in rows))
+        self.assertNotIn("https://example.com/bulk/3.jpg", [r['src'] for r in rows])
+
+    def test_shards_are_disjoint_and_complete(self):
+        self.client.force_login(self.user)
+        seen = []
+        for shard in range(3):
+            seen.extend(r['id'] for r in self._fetch(shard=shard, shards=3))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), 24)
+
+    def test_invalid_shard(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/images/bulk/', {'shard': 3, 'shards': 3})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportImportCommandTest(TestCase):
+    """export_images / import_images round trip"""
+
+    def test_round_trip_with_dedup_and_resume(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        for i in range(12):
+            ImageURL.objects.create(
+                src=f"https://example.com/export/{i}.jpg",
+                alt=f"Export {i}",
+                origin="https://example.com",
+                is_active=(i % 4 != 0),
+            )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'images.ndjson.gz')
+            call_command('export_images', path, chunk_size=5, stdout=StringIO())
+            ImageURL.objects.filter(src__endswith='/7.jpg').delete()
+            ImageURL.objects.filter(src__endswith='/9.jpg').delete()
+
+            # Pretend a previous run committed the first 8 lines
+            with open(f'{path}.checkpoint', 'w') as f:
+                f.write('8')
+            out = StringIO()
+            call_command('import_images', path, batch_size=3, stdout=out)
+
+            self.assertIn('Imported 1 new images, skipped 3', out.getvalue())
+            self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+            self.assertFalse(ImageURL.objects.filter(src__endswith='/7.jpg').exists())
+            restored = ImageURL.objects.get(src__endswith='/9.jpg')
+            self.assertEqual(restored.alt, 'Export 9')
+
+            call_command('import_images', path, restart=True, stdout=StringIO())
+            self.assertEqual(ImageURL.objects.count(), 12)
+            self.assertFalse(ImageURL.objects.get(src__endswith='/8.jpg').is_active)
+
+    def test_round_trip_keeps_created_at(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+
+        now = timezone.now()
+        ages = {i: timedelta(days=i * 10, microseconds=i) for i in range(4)}
+        for i, age in ages.items():
+            ImageURL.objects.create(src=f"https://example.com/aged/{i}.jpg", created_at=now - age)
+
+        path = os.path.join(temp_dir(self), 'images.ndjson')
+        call_command('export_images', path, stdout=StringIO())
+        ImageURL.objects.all().delete()
+        call_command('import_images', path, stdout=StringIO())
+
+        for i, age in ages.items():
+            self.assertEqual(ImageURL.objects.get(src__endswith=f'/aged/{i}.jpg').created_at, now - age)
+
+
+class AltTextSearchTest(TestCase):
+    """FTS5-backed /api/search/ endpoint"""
+
+    def setUp(self):
+        alts = [
+            "Blue hour over the Alps",
+            "Alpine lake at dawn",
+            "Blue ceramic mugs",
+            "Mountain cabin in winter",
+            "Ｂｌｕｅ  whale​ illustration",
+        ]
+        for i, alt in enumerate(alts):
+            ImageURL.objects.create(
+                src=f"https://example.com/search/{i}.jpg",
+                alt=alt,
+                origin="https://example.com",
+            )
+
+    def _search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_clean_alt_text(self):
+        from .utils import clean_alt_text
+        self.assertEqual(clean_alt_text("  Ｂｌｕｅ\t\twhale​  "), "Blue whale")
+        self.assertEqual(clean_alt_text(None), "")
+        self.assertEqual(len(clean_alt_text("a" * 400)), 255)
+
+    def test_ranked_search_and_prefix(self):
+        data = self._search(q='blue')
+        self.assertEqual(data['count'], 2)
+        self.assertTrue(all('Blue' in img['alt'] for img in data['images']))
+
+        data = self._search(q='alp')
+        self.assertEqual(
+            {img['alt'] for img in data['images']},
+            {"Blue hour over the Alps", "Alpine lake at dawn"},
+        )
+
+    def test_index_follows_updates_and_liveness(self):
+        image = ImageURL.objects.get(alt="Mountain cabin in winter")
+        image.alt = "Blue cabin"
+        image.save()
+        ImageURL.objects.filter(alt="Blue ceramic mugs").update(is_active=False)
+
+        alts = {img['alt'] for img in self._search(q='blue')['images']}
+        self.assertEqual(alts, {"Blue hour over the Alps", "Blue cabin"})
+        self.assertEqual(self._search(q='mountain')['count'], 0)
+
+    def test_pagination_random_and_operators(self):
+        data = self._search(q='blue', page_size=1)
+        self.assertTrue(data['has_next'])
+        self.assertEqual(self._search(q='blue', page_size=1, page=2)['has_next'], False)
+        self.assertEqual(self._search(q='blue', random=1)['count'], 2)
+        # FTS5 syntax in user input must not raise
+        self.assertEqual(self._search(q='"blue OR NEAR(')['count'], 0)
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+
+
+class WeightedSamplingTest(FeedTestCase):
+    """Alias-table weighted sampling"""
+
+    def test_alias_table_matches_weights(self):
+        import numpy as np
+        from .sampling import build_alias_table, draw
+
+        weights = np.array([1.0, 2.0, 0.5, 8.0, 0.0, 3.5, 1.0])
+        prob, alias = build_alias_table(weights)
+        samples = draw(prob, alias, 200_000, np.random.default_rng(42))
+
+        observed = np.bincount(samples, minlength=weights.size) / samples.size
+        expected = weights / weights.sum()
+        np.testing.assert_allclose(observed, expected, atol=0.005)
+        self.assertEqual(observed[4], 0.0)
+
+    def test_weights_favour_fresh_and_less_served_images(self):
+        import numpy as np
+        from .sampling import compute_weights
+
+        now = 1_000_000.0
+        ages = np.array([0.0, 72 * 3600.0, 720 * 3600.0])
+        weights = compute_weights(now - ages, now)
+        self.assertTrue(weights[0] > weights[1] > weights[2] > 0)
+        served = compute_weights(np.array([now, now]), now, np.array([0.0, 99.0]))
+        self.assertGreater(served[0], served[1])
+
+    def test_weighted_home_feed(self):
+        from .sampling import weighted_sampler
+
+        for i in range(20):
+            ImageURL.objects.create(
+                src=f"https://example.com/weighted/{i}.jpg",
+                alt=f"Weighted {i}",
+                origin="https://example.com",
+                is_active=(i != 0),
+            )
+        weighted_sampler.invalidate()
+
+        response = self.client.get('/api/home_feed/', {'count': 5, 'mode': 'weighted'})
+        self.assertEqual(response.status_code, 200)
+        srcs = [img['src'] for img in response.json()['images']]
+        self.assertEqual(len(srcs), 5)
+        self.assertEqual(len(set(srcs)), 5)
+        self.assertNotIn("https://example.com/weighted/0.jpg", srcs)
+
+        self.assertEqual(
+            self.client.get('/api/home_feed/', {'mode': 'bogus'}).status_code, 400
+        )
+
+
+class ImpressionCountingTest(TestCase):
+    """Buffered impression counters"""
+
+    def setUp(self):
+        from .impressions import impression_buffer
+
+        self.buffer = impression_buffer
+        self.buffer.flush()
+        self.images = [
+            ImageURL.objects.create(
+                src=f"https://example.com/served/{i}.jpg",
+                alt=f"Served {i}",
+                origin="https://example.com",
+            )
+            for i in range(3)
+        ]
+
+    def test_counts_are_buffered_then_upserted(self):
+        from .models import ImageImpression
+
+        a, b, c = self.images
+        with override_settings(IMPRESSIONS={'FLUSH_SECONDS': 3600, 'MAX_PENDING': 1000}):
+            self.buffer.record([a.id, b.id])
+            self.buffer.record([a.id])
+            self.assertFalse(ImageImpression.objects.exists())
+            self.assertEqual(self.buffer.pending(), {a.id: 2, b.id: 1})
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.buffer.record([a.id, c.id])
+        b.delete()
+        self.buffer.record([b.id])
+        self.buffer.flush()
+
+        counts = dict(ImageImpression.objects.values_list('image_id', 'served_count'))
+        self.assertEqual(counts, {a.id: 3, c.id: 1})
+        self.assertEqual(self.buffer.pending(), {})
+
+    def test_flushed_by_background_thread(self):
+        import threading
+        from unittest import mock
+        from .impressions import ImpressionBuffer
+
+        a, b, c = self.images
+        buffer = ImpressionBuffer()
+        flushed_by = []
+        flushed = threading.Event()
+
+        def flush():
+            flushed_by.append(threading.current_thread().name)
+            flushed.set()
+
+        with override_settings(IMPRESSIONS={'FLUSH_SECONDS': 3600, 'MAX_PENDING': 2}), \
+                mock.patch.object(buffer, 'flush', flush):
+            buffer.start()
+            buffer.record([a.id])
+            buffer.record([b.id])  # MAX_PENDING reached: wakes the flusher
+            self.assertTrue(flushed.wait(5))
+            buffer.stop()
+            buffer._thread.join(5)
+        self.assertEqual(set(flushed_by), {'impression-flusher'})
+
+    def test_popular_endpoint(self):
+        a, b, c = self.images
+        self.buffer.record([b.id, b.id, c.id])
+        self.buffer.flush()
+
+        data = self.client.get('/api/images/popular/', {'limit': 2}).json()
+        self.assertEqual(
+            [(img['src'], img['served_count']) for img in data['images']],
+            [(b.src, 2), (c.src, 1)],
+        )
+
+
+class ResponsePoolTest(FeedTestCase):
+    """Pre-encoded home_feed responses and their version stamp"""
+
+    def setUp(self):
+        from .pools import response_pools
+
+        super().setUp()
+        self.enterContext(self.settings(RESPONSE_POOLS=dict(
+            settings.RESPONSE_POOLS, COUNTS=(2,), MIN_SIZE=3, STAMP=os.path.join(temp_dir(self), 'stamp')
+        )))
+        self.pools = response_pools
+        self.addCleanup(self.pools.clear)
+        for i in range(6):
+            ImageURL.objects.create(src=f"https://example.com/pooled/{i}.jpg", alt=f"Pooled {i}")
+
+    def _feed(self, **params):
+        response = self.client.get('/api/home_feed/', {'count': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pooled_responses_match_inline_ones(self):
+        from .impressions import impression_buffer
+
+        inline = self._feed()
+        self.assertFalse(inline.has_header('X-Feed-Pool'))
+        self.assertEqual(self.pools.refill(), 3)
+
+        pooled = self._feed()
+        self.assertEqual(pooled['X-Feed-Pool'], 'hit')
+        self.assertEqual(pooled.json().keys(), inline.json().keys())
+        self.assertEqual(pooled.json()['images'][0].keys(), inline.json()['images'][0].keys())
+        self.assertEqual(pooled.json()['total_available'], 6)
+        served = {ImageURL.objects.get(src=img['src']).id for img in pooled.json()['images']}
+        self.assertLessEqual(served, set(impression_buffer.pending()))
+
+        # Other counts and filtered requests never use the pools
+        self.assertFalse(self._feed(count=3).has_header('X-Feed-Pool'))
+        self.assertFalse(self._feed(size=236).has_header('X-Feed-Pool'))
+
+    def test_responses_repeat_only_when_pool_runs_dry(self):
+
+        mode = settings.HOME_FEED_SAMPLING
+        self.assertIsNone(self.pools.pop(mode, 2))
+        self.pools.refill()
+        first = self.pools.pop(mode, 2)[1]
+        self.pools.refill()
+        # Unsent responses go out before any served one is repeated
+        later = [self.pools.pop(mode, 2)[1] for _ in range(3)]
+        self.assertFalse(any(body is first for body in later))
+        self.assertIs(self.pools.pop(mode, 2)[1], first)
+
+        with override_settings(RESPONSE_POOLS=dict(settings.RESPONSE_POOLS, MAX_USES=1)):
+            self.pools.clear()
+            self.pools.pop(mode, 2)
+            self.pools.refill()
+            for _ in range(3):
+                self.assertIsNotNone(self.pools.pop(mode, 2))
+            self.assertIsNone(self.pools.pop(mode, 2))
+
+    def test_ingest_retires_pools_and_demand_sizes_them(self):
+        from .ingest import ingest_images
+        from .sampling import weighted_sampler
+
+        self._feed()
+        self.pools.refill()
+        with self.captureOnCommitCallbacks(execute=True):
+            ingest_images(['https://example.com/pooled/new.jpg'])
+        response = self._feed()
+        self.assertFalse(response.has_header('X-Feed-Pool'))
+
+        # A popular pool is kept deeper than MIN_SIZE
+        weighted_sampler.invalidate()
+        for _ in range(10):
+            self._feed(mode='weighted')
+        self.pools.refill()
+        self.assertGreater(self.pools.snapshot()['pools']['weighted:2'], 3)
+        self.assertEqual(self._feed(mode='weighted').json()['total_available'], 7)
+
+
+def make_image_fixture(directory, name, seed, size=(320, 240), fmt='PNG'):
+    """Write a deterministic blob-pattern image and return its path"""
+    import numpy as np
+    from PIL import Image
+
+    noise = np.random.default_rng(seed).integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(noise, 'RGB').resize(size, Image.Resampling.BICUBIC)
+    path = os.path.join(directory, name)
+    image.save(path, fmt, quality=70) if fmt == 'JPEG' else image.save(path, fmt)
+    return path
+
+
+class NearDuplicateDetectionTest(TestCase):
+    """Perceptual hashing against local image fixtures"""
+
+    def setUp(self):
+        self.tmp = temp_dir(self)
+
+    def test_hamming_index(self):
+        from .dedup import HashIndex, to_signed
+
+        index = HashIndex([1, 2], [to_signed(0xFFFF_0000_0000_0000), to_signed(0x0F)])
+        self.assertEqual(index.nearest(0x0E, max_distance=3), (2, 1))
+        self.assertEqual(index.nearest(0xFFFF_0000_0000_0001, max_distance=3), (1, 1))
+        self.assertIsNone(index.nearest(0x00FF_00FF_0000_0000, max_distance=3))
+        for i in range(3000):
+            index.add(100 + i, i << 20)
+        self.assertEqual(len(index), 3002)
+        self.assertEqual(index.nearest(2999 << 20, max_distance=0), (3099, 0))
+
+    def test_rescaled_copy_is_deactivated(self):
+        from .dedup import detect_near_duplicates
+        from .fetch import file_url
+
+        original = make_image_fixture(self.tmp, 'original.png', seed=1)
+        # Smaller, recompressed copy of the same picture
+        copy = make_image_fixture(self.tmp, 'copy.jpg', seed=1, size=(240, 180), fmt='JPEG')
+        other = make_image_fixture(self.tmp, 'other.png', seed=2)
+
+        sources = [file_url(original), file_url(copy), file_url(other), file_url(self.tmp + '/missing.png')]
+        for src in sources:
+            ImageURL.objects.create(src=src, alt='', origin='https://example.com')
+
+        fetch_settings = dict(LOCAL_FETCH, MAX_WORKERS=4)
+        with override_settings(IMAGE_FETCH=fetch_settings):
+            stats = detect_near_duplicates(batch_size=2)
+
+        self.assertEqual((stats['hashed'], stats['duplicates'], stats['failed']), (3, 1, 1))
+        images = {img.src: img for img in ImageURL.objects.all()}
+        self.assertTrue(images[sources[0]].is_active)
+        self.assertFalse(images[sources[1]].is_active)
+        self.assertEqual(images[sources[1]].duplicate_of_id, images[sources[0]].id)
+        self.assertTrue(images[sources[2]].is_active)
+        self.assertIsNone(images[sources[3]].phash)
+
+    def test_deactivation_during_download_is_kept(self):
+        from unittest import mock
+        from .dedup import detect_near_duplicates
+        from .fetch import ImageFetcher, file_url
+
+        image = ImageURL.objects.create(
+            src=file_url(make_image_fixture(self.tmp, 'alone.png', seed=3)), origin='https://example.com'
+        )
+        fetch_map = ImageFetcher.map
+
+        def map_and_deactivate(fetcher, *args, **kwargs):
+            # deactivate_old_urls (or another process) runs meanwhile
+            ImageURL.objects.filter(id=image.id).update(is_active=False)
+            return fetch_map(fetcher, *args, **kwargs)
+
+        fetch_settings = dict(LOCAL_FETCH, MAX_WORKERS=1)
+        with override_settings(IMAGE_FETCH=fetch_settings), mock.patch.object(ImageFetcher, 'map', map_and_deactivate):
+            self.assertEqual(detect_near_duplicates()['hashed'], 1)
+        image.refresh_from_db()
+        self.assertIsNotNone(image.phash)
+        self.assertFalse(image.is_active)
+
+
+class ImageEnrichmentTest(FeedTestCase):
+    """Header-only dimension probing and size-aware feed filters"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = temp_dir(self)
+
+    def test_enrich_from_ranged_header_reads(self):
+        from .enrichment import enrich_images
+        from .fetch import file_url
+
+        portrait = make_image_fixture(self.tmp, 'portrait.jpg', seed=3, size=(300, 600), fmt='JPEG')
+        landscape = make_image_fixture(self.tmp, 'landscape.png', seed=4, size=(640, 320))
+        for path in (portrait, landscape, self.tmp + '/missing.png'):
+            ImageURL.objects.create(src=file_url(path), alt='', origin='https://example.com')
+
+        fetch_settings = LOCAL_FETCH
+        enrichment_settings = {'RUN_AFTER_SCRAPE': False, 'HEADER_BYTES': 2048, 'BATCH_SIZE': 10}
+        with override_settings(IMAGE_FETCH=fetch_settings, ENRICHMENT=enrichment_settings):
+            stats = enrich_images()
+        self.assertEqual((stats['enriched'], stats['failed']), (2, 1))
+
+        image = ImageURL.objects.get(src=file_url(portrait))
+        self.assertEqual((image.width, image.height, image.image_format), (300, 600, 'jpeg'))
+        self.assertEqual(image.byte_size, os.path.getsize(portrait))
+        self.assertAlmostEqual(image.aspect_ratio, 0.5)
+
+        data = self.client.get('/api/home_feed/', {'count': 10, 'aspect': 'portrait'}).json()
+        self.assertEqual([img['src'] for img in data['images']], [file_url(portrait)])
+        self.assertEqual(data['images'][0]['width'], 300)
+
+        max_bytes = os.path.getsize(landscape) - 1
+        data = self.client.get('/api/home_feed/', {'count': 10, 'max_bytes': max_bytes}).json()
+        self.assertNotIn(file_url(landscape), [img['src'] for img in data['images']])
+
+        data = self.client.get('/api/home_feed/', {'count': 10, 'aspect': '1.5-2.5'}).json()
+        self.assertEqual([img['src'] for img in data['images']], [file_url(landscape)])
+
+        response = self.client.get('/api/home_feed/', {'aspect': 'tall'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_range_ignored_by_server(self):
+        from .fetch import ImageFetcher, LocalFileAdapter, file_url
+
+        class IgnoreRange(LocalFileAdapter):
+            def send(self, request, **kwargs):
+                request.headers.pop('Range', None)
+                return super().send(request, **kwargs)
+
+        path = os.path.join(self.tmp, 'large.bin')
+        with open(path, 'wb') as f:
+            f.write(os.urandom(512 * 1024))
+
+        with override_settings(IMAGE_FETCH=dict(LOCAL_FETCH, MAX_BYTES=128 * 1024)), ImageFetcher() as fetcher:
+            fetcher.session.mount('file://', IgnoreRange())
+            result = fetcher.fetch(file_url(path), byte_range=(16, 2047))
+
+        self.assertTrue(result.ok, result.error)
+        self.assertEqual(result.status_code, 200)
+        with open(path, 'rb') as f:
+            self.assertEqual(result.content, f.read()[16:2048])
+        self.assertEqual(result.total_size(), 512 * 1024)
+
+
+@override_settings(IMAGE_FETCH=LOCAL_FETCH)
+class ImageMirrorTest(FeedTestCase):
+    """Content-addressed mirror, LRU eviction and X-Accel-Redirect serving"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = temp_dir(self)
+        self.mirror_root = self.tmp + '/mirror'
+        self.enterContext(self.settings(IMAGE_MIRROR=dict(settings.IMAGE_MIRROR, ENABLED=True, ROOT=self.mirror_root)))
+
+    def test_mirror_and_serve(self):
+        from .fetch import file_url
+        from .mirror import MirrorStore, get_mirror_stats, mirror_images
+
+        fixture = make_image_fixture(self.tmp, 'a.png', seed=5)
+        copy = self.tmp + '/same-bytes.png'
+        with open(fixture, 'rb') as src, open(copy, 'wb') as dst:
+            dst.write(src.read())
+        for path in (fixture, copy):
+            ImageURL.objects.create(src=file_url(path), alt='', origin='https://example.com')
+
+        stats = mirror_images()
+        self.assertEqual((stats['mirrored'], stats['failed']), (2, 0))
+        files, _ = MirrorStore(self.mirror_root).usage()
+        self.assertEqual(files, 1)  # identical bytes are stored once
+        self.assertEqual(get_mirror_stats()['files'], 1)
+
+        data = self.client.get('/api/home_feed/', {'count': 2}).json()
+        image = data['images'][0]
+        self.assertTrue(image['src'].startswith('http://testserver/media/'))
+        self.assertTrue(image['fallback_urls'][0].startswith('file://'))
+
+        response = self.client.get(image['src'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response['X-Accel-Redirect'].startswith('/_mirror/'))
+        self.assertEqual(response.content, b'')
+
+        self.assertEqual(self.client.get('/media/' + '0' * 64).status_code, 404)
+        self.assertEqual(self.client.get('/media/not-a-hash').status_code, 404)
+
+        # Evicted, then served again: the next run downloads it and clears the tombstone
+        from django.utils import timezone
+        from .models import ImageImpression, MirroredImage
+        MirroredImage.objects.update(evicted_at=timezone.now())
+        ImageImpression.objects.bulk_create([
+            ImageImpression(image=image, served_count=1, last_served_at=timezone.now())
+            for image in ImageURL.objects.all()
+        ])
+        self.assertEqual(mirror_images()['mirrored'], 2)
+        self.assertFalse(MirroredImage.objects.filter(evicted_at__isnull=False).exists())
+
+    def test_lru_eviction(self):
+        from django.utils import timezone
+        from .mirror import MirrorStore, evict_mirror, images_to_mirror, lookup_mirrored
+        from .models import ImageImpression, MirroredImage
+
+        store = MirrorStore(self.mirror_root)
+        hashes = []
+        images = []
+        for i in range(4):
+            content_hash = store.put(bytes([i]) * 1000)
+            os.utime(store.path(content_hash), (1000 + i, 1000 + i))
+            image = ImageURL.objects.create(src=f"https://example.com/lru/{i}.jpg", origin="https://example.com")
+            MirroredImage.objects.create(image=image, content_hash=content_hash,
+                                         content_type='image/jpeg', byte_size=1000)
+            hashes.append(content_hash)
+            images.append(image)
+        # The oldest file was just served, so it survives
+        os.utime(store.path(hashes[0]))
+
+        budget = dict(settings.IMAGE_MIRROR, ROOT=self.mirror_root, MAX_BYTES=3000, LOW_WATERMARK=0.75)
+        with override_settings(IMAGE_MIRROR=budget):
+            self.assertEqual(evict_mirror(store), 2)
+
+        remaining = set(MirroredImage.objects.filter(evicted_at__isnull=True).values_list('content_hash', flat=True))
+        self.assertEqual(remaining, {hashes[0], hashes[3]})
+        self.assertFalse(store.path(hashes[1]).exists())
+
+        # Evicted images keep a tombstone and are not downloaded again...
+        self.assertEqual(MirroredImage.objects.count(), 4)
+        self.assertFalse(images_to_mirror().exists())
+        self.assertEqual(lookup_mirrored([images[1].id]), {})
+        # ...until they are served after their eviction
+        ImageImpression.objects.create(image=images[1], served_count=1, last_served_at=timezone.now())
+        self.assertEqual(list(images_to_mirror()), [images[1]])
+
+    def test_eviction_keeps_files_restored_meanwhile(self):
+        from unittest import mock
+        from .mirror import MirrorStore, evict_mirror, get_mirror_stats
+        from .models import MirroredImage
+
+        store = MirrorStore(self.mirror_root)
+        hashes = []
+        for i in range(3):
+            content_hash = store.put(bytes([i]) * 1000)
+            os.utime(store.path(content_hash), (1000 + i, 1000 + i))
+            image = ImageURL.objects.create(src=f"https://example.com/race/{i}.jpg", origin="https://example.com")
+            MirroredImage.objects.create(image=image, content_hash=content_hash,
+                                         content_type='image/jpeg', byte_size=1000)
+            hashes.append(content_hash)
+
+        remove = MirrorStore.remove
+
+        def restore_then_remove(selected):
+            # A concurrent mirror run stores the oldest file again and clears its tombstone
+            store.put(bytes([0]) * 1000)
+            MirroredImage.objects.filter(content_hash=hashes[0]).update(evicted_at=None)
+            return remove(selected)
+
+        budget = dict(settings.IMAGE_MIRROR, ROOT=self.mirror_root, MAX_BYTES=2000, LOW_WATERMARK=0.5)
+        with override_settings(IMAGE_MIRROR=budget), \
+                mock.patch.object(MirrorStore, 'remove', side_effect=restore_then_remove):
+            self.assertEqual(evict_mirror(store), 1)
+
+        self.assertTrue(store.path(hashes[0]).exists())
+        self.assertFalse(store.path(hashes[1]).exists())
+        live = set(MirroredImage.objects.filter(evicted_at__isnull=True).values_list('content_hash', flat=True))
+        self.assertEqual(live, {hashes[0], hashes[2]})
+
+        stats = get_mirror_stats()
+        self.assertEqual((stats['files'], stats['bytes'], stats['evicted_images']), (2, 2000, 1))
+
+
+class ThumbnailTest(FeedTestCase):
+    """Size-aware feed responses and lazily rendered thumbnails"""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = temp_dir(self)
+        self.mirror_root = self.tmp + '/mirror'
+        self.enterContext(self.settings(
+            IMAGE_MIRROR=dict(settings.IMAGE_MIRROR, ENABLED=True, ROOT=self.mirror_root,
+                              USE_X_ACCEL_REDIRECT=False),
+            THUMBNAILS=dict(settings.THUMBNAILS, ROOT=self.tmp + '/thumbs', MAX_WORKERS=2),
+        ))
+
+    def mirror_fixture(self, name, seed, size=(800, 600)):
+        from .mirror import MirrorStore
+        from .models import MirroredImage
+
+        with open(make_image_fixture(self.tmp, name, seed, size), 'rb') as f:
+            data = f.read()
+        content_hash = MirrorStore().put(data)
+        image = ImageURL.objects.create(
+            src=f'https://example.com/{name}', origin='https://example.com',
+            width=size[0], height=size[1], byte_size=len(data), aspect_ratio=size[0] / size[1]
+        )
+        MirroredImage.objects.create(image=image, content_hash=content_hash,
+                                     content_type='image/png', byte_size=len(data))
+        return content_hash
+
+    def test_feed_size_renders_thumbnail_lazily(self):
+        from PIL import Image
+        from .thumbnails import thumbnail_generator
+
+        content_hash = self.mirror_fixture('big.png', seed=1)
+        image = self.client.get('/api/home_feed/', {'size': 200}).json()['images'][0]
+        self.assertEqual(image['src'], f'http://testserver/media/{content_hash}/236')
+        self.assertEqual((image['width'], image['height']), (236, 177))
+        self.assertEqual(image['fallback_urls'][0], f'http://testserver/media/{content_hash}')
+        self.assertFalse(thumbnail_generator.path(content_hash, 236).exists())
+
+        response = self.client.get(image['src'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        with Image.open(thumbnail_generator.path(content_hash, 236)) as thumb:
+            self.assertEqual(thumb.size, (236, 177))
+        response.close()
+
+        self.assertEqual(self.client.get(f'/media/{content_hash}/300').status_code, 404)
+        self.assertEqual(self.client.get('/api/home_feed/', {'size': 'wide'}).status_code, 400)
+
+    def test_concurrent_requests_share_one_render(self):
+        from .thumbnails import thumbnail_generator
+
+        content_hash = self.mirror_fixture('shared.png', seed=2)
+        first = thumbnail_generator.submit(content_hash, 474)
+        second = thumbnail_generator.submit(content_hash, 474)
+        self.assertIs(first, second)
+        self.assertEqual(first.result(timeout=30), (474, 356))
+
+    def test_lazy_renders_enforce_budget(self):
+        import time
+        from .thumbnails import thumbnail_generator
+
+        content_hash = self.mirror_fixture('budget.png', seed=3)
+        large = thumbnail_generator.get_or_create(content_hash, 736)
+        os.utime(large, (1000, 1000))
+        # Room for the large rendition only: the next render pushes it out
+        budget = dict(settings.THUMBNAILS, MAX_BYTES=large.stat().st_size + 1, EVICT_EVERY_RENDERS=1)
+        with override_settings(THUMBNAILS=budget):
+            response = self.client.get(f'/media/{content_hash}/236')
+            self.assertEqual(response.status_code, 200)
+            response.close()
+            deadline = time.monotonic() + 5
+            while large.exists():
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        self.assertTrue(thumbnail_generator.path(content_hash, 236).exists())
+
+    def test_pinimg_rendition_rewrite(self):
+        from .utils import generate_fallback_urls, pinimg_rendition_url
+
+        url = 'https://i.pinimg.com/originals/ab/cd/ef.jpg'
+        self.assertEqual(pinimg_rendition_url(url, 300), 'https://i.pinimg.com/474x/ab/cd/ef.jpg')
+        self.assertEqual(pinimg_rendition_url(url, 2000), url)
+        self.assertIsNone(pinimg_rendition_url('https://example.com/474x/a.jpg', 300))
+        self.assertEqual(generate_fallback_urls('https://i.pinimg.com/736x/ab/cd/ef.jpg')[0],
+                         'https://i.pinimg.com/564x/ab/cd/ef.jpg')
+
+
+@override_settings(IMAGE_FETCH=LOCAL_FETCH)
+class ColorExtractionTest(FeedTestCase):
+    """Dominant colors from local fixtures and the home_feed color filter"""
+
+    def setUp(self):
+        from .colors import color_index
+
+        super().setUp()
+        self.tmp = temp_dir(self)
+        self.addCleanup(color_index.invalidate)
+
+    def make_image(self, name, colors):
+        """Vertical stripes of the given (rgb, width) pairs"""
+        from PIL import Image
+        from .fetch import file_url
+
+        image = Image.new('RGB', (sum(width for _, width in colors), 100))
+        left = 0
+        for rgb, width in colors:
+            image.paste(rgb, (left, 0, left + width, 100))
+            left += width
+        path = f'{self.tmp}/{name}.png'
+        image.save(path)
+        return ImageURL.objects.create(src=file_url(path), alt=name, origin='https://example.com')
+
+    def test_extract_and_filter(self):
+        from .colors import extract_colors
+        from .models import ImageColor
+
+        red = self.make_image('red', [((220, 20, 30), 70), ((245, 245, 245), 30)])
+        blue = self.make_image('blue', [((20, 60, 200), 100)])
+        broken = ImageURL.objects.create(src='file:///nonexistent/x.png', origin='https://example.com')
+
+        stats = extract_colors()
+        self.assertEqual((stats['extracted'], stats['failed']), (2, 1))
+
+        red.refresh_from_db()
+        self.assertEqual(red.palette[0], '#dc141e')
+        shares = dict(red.colors.values_list('color', 'share'))
+        self.assertEqual(set(shares), {ImageColor.Color.RED, ImageColor.Color.WHITE})
+        self.assertAlmostEqual(shares[ImageColor.Color.RED], 0.7, delta=0.05)  # downsampling blurs the edge
+        broken.refresh_from_db()
+        self.assertIsNotNone(broken.colors_extracted_at)
+
+        for color, expected in (('red', 'red'), ('white', 'red'), ('#0033cc', 'blue')):
+            data = self.client.get('/api/home_feed/', {'color': color, 'count': 5}).json()
+            self.assertEqual([image['alt'] for image in data['images']], [expected])
+        # Combined with other filters the ORM path is used
+        self.assertEqual(self.client.get('/api/home_feed/', {'color': 'blue', 'aspect': 'square'}).json()['count'], 0)
+        self.assertEqual(self.client.get('/api/home_feed/', {'color': 'mauve'}).status_code, 400)
+
+    def test_batched_kmeans_separates_clusters(self):
+        import numpy as np
+        from .colors import kmeans
+
+        pixels = np.zeros((2, 400, 3), dtype=np.float32)
+        pixels[0, :100] = [255, 0, 0]
+        pixels[1, :300] = [0, 0, 255]
+        centroids, shares = kmeans(pixels, 2, 10)
+        for image, dominant in ((0, [0, 0, 0]), (1, [0, 0, 255])):
+            best = int(np.argmax(shares[image]))
+            self.assertEqual(centroids[image, best].tolist(), dominant)
+        self.assertEqual(sorted(shares[0].tolist()), [0.25, 0.75])
+
+
+# Jobs referenced by the scheduler tests through settings.SCHEDULER['JOBS']
+SCHEDULER_TEST_CALLS = []
+
+
+def gated_job(gate=None, **kwargs):
+    SCHEDULER_TEST_CALLS.append(kwargs)
+    if gate is not None:
+        gate.wait(5)
+    return {'success': True, 'message': 'done'}
+
+
+def failing_job():
+    raise RuntimeError('boom')
+
+
+def scheduler_settings(**jobs):
+    return {
+        'ENABLED': False,
+        'POLL_SECONDS': 1,
+        'LEASE_SECONDS': 30,
+        'JOIN_TIMEOUT_SECONDS': 5,
+        'JOIN_POLL_SECONDS': 0.05,
+        'JOBS': {
+            name: dict({'CRON': '0 6 * * *', 'JITTER_SECONDS': 0, 'BACKOFF_BASE_SECONDS': 60,
+                        'BACKOFF_MAX_SECONDS': 3600}, CALLABLE=f'home_feed.tests.{func}')
+            for name, func in jobs.items()
+        },
+    }
+
+
+@override_settings(SCHEDULER=scheduler_settings(gated='gated_job', failing='failing_job'))
+class SchedulerTest(TestCase):
+    """Cron parsing, backoff and the cross-process lease"""
+
+    def setUp(self):
+        SCHEDULER_TEST_CALLS.clear()
+
+    def test_cron_next_after(self):
+        from datetime import datetime, timezone
+        from .scheduler import CronSchedule
+
+        monday = datetime(2026, 10, 19, 7, 3, tzinfo=timezone.utc)
+        cases = {
+            '0 6 * * *': datetime(2026, 10, 20, 6, 0),
+            '*/15 8-9 * * *': datetime(2026, 10, 19, 8, 0),
+            '@weekly': datetime(2026, 10, 25, 0, 0),
+            '0 9 1 * 1': datetime(2026, 10, 19, 9, 0),  # day of month OR day of week
+            '30 2 29 2 *': datetime(2028, 2, 29, 2, 30),
+        }
+        for expression, expected in cases.items():
+            self.assertEqual(CronSchedule(expression).next_after(monday), expected.replace(tzinfo=timezone.utc))
+        for invalid in ('* * *', '61 * * * *', '0 0 30 2 *'):
+            with self.assertRaises(ValueError):
+                CronSchedule(invalid).next_after(monday)
+
+    def test_lease_and_backoff(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ScheduledJob
+        from .scheduler import JobRunner
+
+        runner = JobRunner()
+        runner._ensure_row('gated')
+        self.assertTrue(runner.acquire('gated', 'worker-a'))
+        self.assertFalse(runner.acquire('gated', 'worker-b'))
+        ScheduledJob.objects.filter(name='gated').update(lease_expires_at=timezone.now())
+        self.assertTrue(runner.acquire('gated', 'worker-b'))  # expired leases are taken over
+
+        # Not due yet: the scheduler leaves it alone
+        ScheduledJob.objects.filter(name='gated').update(lease_expires_at=None)
+        self.assertIsNone(runner.run('gated', due_only=True))
+        self.assertEqual(SCHEDULER_TEST_CALLS, [])
+
+        result = runner.run('failing')
+        self.assertFalse(result['success'])
+        self.assertIn('boom', result['message'])
+        job = ScheduledJob.objects.get(name='failing')
+        self.assertEqual((job.failures, job.owner, job.run_count), (1, '', 1))
+        self.assertIsNone(job.lease_expires_at)
+        delay = job.next_run_at - job.last_finished_at
+        self.assertTrue(timedelta(seconds=59) < delay < timedelta(seconds=61))
+
+        runner.run('failing')
+        job.refresh_from_db()
+        self.assertEqual(job.failures, 2)
+        self.assertTrue(timedelta(seconds=119) < job.next_run_at - job.last_finished_at < timedelta(seconds=121))
+
+
+@override_settings(SCHEDULER=scheduler_settings(gated='gated_job'))
+class SchedulerJoinTest(TransactionTestCase):
+    """Overlapping triggers join the running job instead of starting another"""
+
+    def setUp(self):
+        SCHEDULER_TEST_CALLS.clear()
+
+    def test_concurrent_runs_join(self):
+        import threading
+        from django.db import connection
+        from .models import ScheduledJob
+        from .scheduler import JobRunner
+
+        runner = JobRunner()
+        gate = threading.Event()
+        results = []
+
+        def trigger():
+            try:
+                results.append(runner.run('gated', gate=gate))
+            finally:
+                connection.close()
+
+        first = threading.Thread(target=trigger)
+        first.start()
+        while not SCHEDULER_TEST_CALLS:
+            threading.Event().wait(0.01)
+        second = threading.Thread(target=trigger)
+        second.start()
+        threading.Event().wait(0.1)
+        gate.set()
+        first.join(5)
+        second.join(5)
+
+        self.assertEqual(len(SCHEDULER_TEST_CALLS), 1)
+        self.assertEqual(sorted(result.get('joined', False) for result in results), [False, True])
+        self.assertTrue(all(result['success'] for result in results))
+
+        # Another process holding the lease: this one waits for its result
+        ScheduledJob.objects.filter(name='gated').update(owner='elsewhere', lease_expires_at=None)
+        runner.acquire('gated', 'elsewhere')
+
+        def finish_elsewhere():
+            threading.Event().wait(0.2)
+            ScheduledJob.objects.filter(name='gated').update(
+                owner='', lease_expires_at=None, last_result={'success': True, 'message': 'remote'},
+                run_count=5
+            )
+            connection.close()
+
+        threading.Thread(target=finish_elsewhere).start()
+        result = runner.run('gated')
+        self.assertEqual(result, {'success': True, 'message': 'remote', 'joined': True})
+        self.assertEqual(len(SCHEDULER_TEST_CALLS), 1)
+
+
+@override_settings(SCRAPE_SOURCES={
+    'lakes': {'TYPE': 'search', 'QUERY': 'blue lake', 'QUOTA': 3},
+    'travel': {'TYPE': 'board', 'URL': 'https://www.pinterest.com/someone/travel/', 'QUOTA': 2},
+    'other-account': {'TYPE': 'home', 'COOKIES': '/nonexistent/cookies.json', 'QUOTA': 5},
+})
+class MultiSourceScrapeTest(FeedTestCase):
+    """Source registry, concurrency cap and per-source provenance"""
+
+    def test_registry_and_concurrency(self):
+        from .sources import get_sources, scrape_concurrency
+
+        lakes, travel = get_sources(['lakes', 'travel'])
+        self.assertEqual(lakes['url'], 'https://www.pinterest.com/search/pins/?q=blue+lake')
+        self.assertIsNone(lakes['cookies'])
+        self.assertEqual((travel['type'], travel['quota']), ('board', 2))
+        with self.assertRaises(ValueError):
+            get_sources(['nope'])
+
+        with override_settings(SCRAPE_RUNNER=dict(settings.SCRAPE_RUNNER, MAX_PROCESSES=2)):
+            self.assertEqual(scrape_concurrency(10), min(2, os.cpu_count()))
+        with override_settings(SCRAPE_RUNNER=dict(settings.SCRAPE_RUNNER, MEMORY_PER_BROWSER_MB=10 ** 9)):
+            self.assertEqual(scrape_concurrency(10), 1)  # never below one process
+
+    def test_run_sources_records_provenance(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+        from .sources import run_sources
+
+        def fake_scrape(url, cookies_path, quota, browser_timeout, backend, options):
+            slug = 'lake' if 'search' in url else 'travel'
+            return [
+                {'src': f'https://i.pinimg.com/736x/{slug}/{i}.jpg', 'alt': f'{slug} {i}',
+                 'origin': url, 'fallback_urls': []}
+                for i in range(quota)
+            ]
+
+        ImageURL.objects.create(src='https://i.pinimg.com/736x/lake/0.jpg', origin='https://example.com')
+        with mock.patch('home_feed.sources.scrape_source', fake_scrape), ThreadPoolExecutor(2) as executor:
+            stats = run_sources(count=10, executor=executor)
+
+        results = {result['name']: result for result in stats['sources']}
+        self.assertEqual((results['lakes']['scraped'], results['lakes']['inserted']), (3, 2))
+        self.assertEqual((results['travel']['scraped'], results['travel']['inserted']), (2, 2))
+        self.assertIn('not found', results['other-account']['error'])
+        self.assertEqual((stats['scraped'], stats['inserted']), (5, 4))
+
+        data = self.client.get('/api/home_feed/', {'source': 'travel', 'count': 10}).json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual({image['source'] for image in data['images']}, {'travel'})
+
+
+class IngestPipelineTest(TestCase):
+    """Validation, de-duplication and insert accounting of ingest_images"""
+
+    def test_validate_image_url(self):
+        from .utils import validate_image_url
+
+        for url in ('https://i.pinimg.com/736x/ab/cd.jpg', 'HTTP://example.com', 'http://[::1]:8080/a.png?x=1'):
+            self.assertTrue(validate_image_url(url), url)
+        for url in ('', None, 'ftp://example.com/a.jpg', '/relative/a.jpg', 'https://', 'https://exa mple.com/a.jpg',
+                    'https://example.com:99999/a.jpg', 'https://example.com/' + 'a' * 500):
+            self.assertFalse(validate_image_url(url), url)
+
+    def test_exact_counts(self):
+        from .ingest import ingest_images
+
+        ImageURL.objects.create(src='https://example.com/ingest/0.jpg', origin='https://example.com')
+        rows = [{'src': f'https://example.com/ingest/{i}.jpg', 'alt': f'Ingested fern {i}'} for i in range(5)]
+        rows += [rows[1], {'src': 'not a url'}, 'https://example.com/ingest/bare.jpg']
+        stats = ingest_images(rows, source='tests', chunk_size=2)
+
+        self.assertEqual(
+            {key: stats[key] for key in ('rows', 'inserted', 'invalid', 'duplicates', 'existing', 'skipped')},
+            {'rows': 8, 'inserted': 5, 'invalid': 1, 'duplicates': 1, 'existing': 1, 'skipped': 3}
+        )
+        self.assertEqual(ImageURL.objects.filter(source='tests').count(), 5)
+        self.assertEqual(ingest_images(rows[:3])['inserted'], 0)
+
+        # The full-text index picks up rows from the bulk path, and the
+        # per-row trigger is back afterwards
+        data = self.client.get('/api/search/', {'q': 'fern'}).json()
+        self.assertEqual(data['count'], 4)
+        ImageURL.objects.create(src='https://example.com/ingest/single.jpg', alt='Single fern')
+        self.assertEqual(self.client.get('/api/search/', {'q': 'fern'}).json()['count'], 5)
+
+
+class PinterestSimulatorTest(TestCase):
+    """The scrape pipeline end to end against the offline Pinterest stand-in"""
+
+    def setUp(self):
+        from .simulator import FakePinterestDL, FakePinterestServer
+
+        self.server = FakePinterestServer(seed=7).start()
+        self.addCleanup(self.server.stop)
+        options = {'seed': 7, 'server_url': self.server.url}
+
+        # Cookies come from the fake login, so the cookie check passes
+        self.cookies = os.path.join(temp_dir(self), 'cookies.json')
+        with open(self.cookies, 'w') as f:
+            json.dump(FakePinterestDL.with_browser(**options).login('me@example.com', 'pw').get_cookies(), f)
+
+        self.enterContext(self.settings(
+            PINTEREST_DL={'BACKEND': 'home_feed.simulator.FakePinterestDL', 'OPTIONS': options},
+            SCRAPE_SOURCES={
+                'home': {'TYPE': 'home', 'COOKIES': self.cookies, 'QUOTA': 60},
+                'lakes': {'TYPE': 'search', 'QUERY': 'blue lake', 'QUOTA': 30},
+            }
+        ))
+
+    def test_generated_pins_are_deterministic(self):
+        from .simulator import FakePinterestDL, generate_pins
+
+        pins = generate_pins('https://www.pinterest.com', 60, seed=7)
+        self.assertEqual(pins, generate_pins('https://www.pinterest.com', 60, seed=7))
+        self.assertEqual(pins[25:], generate_pins('https://www.pinterest.com', 35, seed=7, start=25))
+        self.assertEqual(len({pin['src'] for pin in pins}), 60)
+        self.assertNotEqual(pins[0], generate_pins('https://www.pinterest.com', 1, seed=8)[0])
+
+        scraped = FakePinterestDL.with_browser(seed=7, server_url=self.server.url).scrape('https://www.pinterest.com', 60)
+        self.assertEqual([pin.src for pin in scraped], [pin['src'] for pin in pins])
+
+        with self.assertRaises(RuntimeError):
+            FakePinterestDL.with_browser(error_rate=1.0).scrape('https://www.pinterest.com', 10)
+
+    def test_timeout_stops_workers(self):
+        import multiprocessing
+        import time
+        from .sources import run_sources
+
+        before = set(multiprocessing.active_children())
+        started = time.monotonic()
+        with override_settings(
+            PINTEREST_DL={'BACKEND': 'home_feed.simulator.FakePinterestDL', 'OPTIONS': {'latency_ms': 60000}},
+            SCRAPE_RUNNER=dict(settings.SCRAPE_RUNNER, TIMEOUT_SECONDS=1, TERMINATE_GRACE_SECONDS=10)
+        ):
+            stats = run_sources(['lakes'])
+        self.assertEqual(stats['sources'][0]['error'], 'Timed out')
+        # Terminated workers exit promptly instead of sleeping out the scrape
+        self.assertEqual(set(multiprocessing.active_children()) - before, set())
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_timeout_kills_workers_stuck_quitting(self):
+        import multiprocessing
+        import time
+        from .sources import run_sources
+
+        before = set(multiprocessing.active_children())
+        started = time.monotonic()
+        options = {'latency_ms': 60000, 'quit_delay_ms': 60000}
+        with override_settings(
+            PINTEREST_DL={'BACKEND': 'home_feed.simulator.FakePinterestDL', 'OPTIONS': options},
+            SCRAPE_RUNNER=dict(settings.SCRAPE_RUNNER, TIMEOUT_SECONDS=1, TERMINATE_GRACE_SECONDS=0.5)
+        ), self.assertLogs('home_feed.sources', 'WARNING') as logs:
+            stats = run_sources(['lakes'])
+        self.assertEqual(stats['sources'][0]['error'], 'Timed out')
+        self.assertIn('ignored SIGTERM, killing it', logs.output[0])
+        self.assertEqual(set(multiprocessing.active_children()) - before, set())
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_download_home_feed_offline(self):
+        import contextlib
+        import io
+        from .services import download_home_feed
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = download_home_feed()
+            rerun = download_home_feed(['home'])
+        results = {result['name']: result for result in stats['sources']}
+        self.assertEqual((results['home']['scraped'], results['home']['inserted']), (60, 60))
+        self.assertEqual((results['lakes']['scraped'], results['lakes']['inserted']), (30, 30))
+        self.assertEqual(ImageURL.objects.filter(source='home').count(), 60)
+        self.assertGreater(self.server.requests, 0)
+
+        # A second run finds only known pins
+        self.assertEqual(rerun['inserted'], 0)
+
+
+class ImageStreamTest(TestCase):
+    """Server-Sent Events push of new images"""
+
+    async def test_push_and_resume(self):
+        import asyncio
+        from .stream import ImageStream
+
+        stream = ImageStream()
+        first = await ImageURL.objects.acreate(src='https://i.pinimg.com/736x/stream/1.jpg', alt='first')
+        events = stream.events()
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+
+        second = await ImageURL.objects.acreate(src='https://i.pinimg.com/736x/stream/2.jpg', alt='second')
+        stream.notify()
+        message = await asyncio.wait_for(anext(events), 5)
+        self.assertTrue(message.startswith(f'id: {second.id}\nevent: images\n'.encode()))
+        payload = json.loads(message.split(b'data: ', 1)[1])
+        self.assertEqual([image['id'] for image in payload['images']], [second.id])
+        self.assertEqual(payload['images'][0]['alt'], 'second')
+
+        # Resuming from the last seen id gets the very same bytes from history
+        resumed = stream.events(last_event_id=first.id)
+        await anext(resumed)
+        self.assertIs(await anext(resumed), message)
+
+        # Older ids are replayed from the database
+        replayed = stream.events(last_event_id=0)
+        await anext(replayed)
+        payload = json.loads((await anext(replayed)).split(b'data: ', 1)[1])
+        self.assertEqual([image['id'] for image in payload['images']], [first.id, second.id])
+
+        for generator in (events, resumed, replayed):
+            await generator.aclose()
+        await asyncio.wait_for(stream._task, 5)
+        self.assertEqual(stream.subscriber_count, 0)
+
+    def test_slow_subscriber_is_cut_off(self):
+        from .stream import Subscriber
+
+        subscriber = Subscriber(limit=2)
+        for i in range(3):
+            subscriber.offer((i, b'message'))
+        self.assertTrue(subscriber.closed)
+        self.assertIsNone(subscriber.queue.get_nowait())
+        self.assertTrue(subscriber.queue.empty())
+
+    async def test_endpoint_headers(self):
+        response = await self.async_client.get('/api/stream/images/', headers={'Last-Event-ID': 'nonsense'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        content = aiter(response.streaming_content)
+        self.assertEqual(await anext(content), b'retry: 3000\n\n')
+        await content.aclose()
+
+
+class ImportBudgetTest(SimpleTestCase):
+    """Web workers must not load the scraping stack"""
+
+    # Scraping-only modules; requests itself is excluded because DRF's compat
+    # module imports it whenever it is installed
+    FORBIDDEN = ('pinterest_dl', 'selenium', 'dotenv', 'home_feed.services', 'home_feed.fetch')
+    # Cumulative import time of home_feed.views after django.setup(), generous
+    # enough for slow CI machines (about 0.35s on a laptop)
+    BUDGET_US = 1500000
+
+    def test_views_import_budget(self):
+        import subprocess
+        import sys
+
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import django; django.setup(); import home_feed.views'],
+            cwd=settings.BASE_DIR,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='pinterest_feed.settings'),
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        # "import time: <self us> | <cumulative us> | <indented module name>"
+        timings = {}
+        for line in result.stderr.splitlines():
+            if line.startswith('import time:') and 'cumulative' not in line:
+                _, cumulative, module = line.split('|')
+                timings[module.strip()] = int(cumulative)
+
+        loaded = [
+            module for module in timings
+            if any(module == name or module.startswith(name + '.') for name in self.FORBIDDEN)
+        ]
+        self.assertEqual(loaded, [])
+        self.assertLess(timings['home_feed.views'], self.BUDGET_US)
+
+
+class RateLimitTest(TransactionTestCase):
+    """Token buckets and scrape admission shared through the SQLite store"""
+
+    def setUp(self):
+        from .ratelimit import rate_limit_store
+
+        self.limits = {
+            'ENABLED': True,
+            'STORE': os.path.join(temp_dir(self), 'ratelimit.sqlite3'),
+            'SCOPES': {
+                'feed': {'RATE': 0.01, 'BURST': 2, 'GLOBAL_RATE': 0.01, 'GLOBAL_BURST': 3},
+                'scrape': {'RATE': 0.01, 'BURST': 5},
+            },
+            'SCRAPE_MAX_QUEUED': 1,
+            'SCRAPE_WAIT_SECONDS': 0.2,
+            'SCRAPE_RETRY_AFTER': 30,
+        }
+        self.enterContext(self.settings(
+            RATE_LIMIT=self.limits,
+            SCHEDULER=dict(settings.SCHEDULER, ENABLED=False, JOIN_POLL_SECONDS=0.05)
+        ))
+        self.addCleanup(rate_limit_store.clear)
+
+    def test_token_buckets(self):
+        from .ratelimit import RateLimitStore
+
+        # Separate stores stand in for separate workers sharing the file
+        first, second = RateLimitStore(), RateLimitStore()
+        self.assertEqual(first.take('k', rate=1, capacity=2), (True, 0.0))
+        self.assertTrue(second.take('k', rate=1, capacity=2)[0])
+        allowed, retry_after = first.take('k', rate=1, capacity=2)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0.9)
+        self.assertLessEqual(retry_after, 1.0)
+
+    def test_feed_throttled_per_client_and_globally(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/home_feed/').status_code, 200)
+        response = self.client.get('/api/home_feed/')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 99)
+
+        # Another client has its own bucket until the global one runs dry
+        self.assertEqual(self.client.get('/api/home_feed/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get('/api/home_feed/', REMOTE_ADDR='10.0.0.3').status_code, 429)
+
+        # The global refusal did not cost that client a token
+        from .ratelimit import rate_limit_store
+        rate_limit_store.refund('feed:*', capacity=3, cost=3)
+        for _ in range(2):
+            self.assertEqual(self.client.get('/api/home_feed/', REMOTE_ADDR='10.0.0.3').status_code, 200)
+
+    def test_scrape_admission(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import ScheduledJob
+        from .ratelimit import rate_limit_store
+
+        # Queue full: fail fast without touching the job
+        slot = rate_limit_store.acquire_slot('scrape', 1, 60)
+        response = self.client.post('/api/trigger_scraping/', {'count': 5}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        rate_limit_store.release_slot(slot)
+
+        # A scrape running in another process outlasts SCRAPE_WAIT_SECONDS
+        ScheduledJob.objects.create(
+            name='scrape_home_feed', owner='elsewhere', lease_expires_at=timezone.now() + timedelta(minutes=1)
+        )
+        response = self.client.post('/api/trigger_scraping/', {'count': 5}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        # The slot was given back
+        self.assertIsNotNone(rate_limit_store.acquire_slot('scrape', 1, 60))
+
+    def test_long_scrape_runs_in_background(self):
+        import threading
+        import time
+        from .models import ScheduledJob
+        from .ratelimit import rate_limit_store
+
+        SCHEDULER_TEST_CALLS.clear()
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        scheduler = scheduler_settings(scrape_home_feed='gated_job')
+        scheduler['JOBS']['scrape_home_feed']['KWARGS'] = {'gate': gate}
+        with override_settings(SCHEDULER=scheduler):
+            response = self.client.post('/api/trigger_scraping/', {'count': 5}, content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response['Retry-After'], '30')
+            # The request is done with its slot while the scrape keeps going
+            slot = rate_limit_store.acquire_slot('scrape', 1, 60)
+            self.assertIsNotNone(slot)
+            rate_limit_store.release_slot(slot)
+
+            gate.set()
+            deadline = time.monotonic() + 5
+            while not ScheduledJob.objects.filter(name='scrape_home_feed', run_count=1).exists():
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        self.assertEqual(SCHEDULER_TEST_CALLS, [{'count': 5, 'sources': None}])
+
+
+class ProfilingTest(TestCase):
+    """Opt-in request sampling and per-phase memory accounting"""
+
+    def setUp(self):
+        from .profiling import memory_phases
+
+        self.output_dir = temp_dir(self)
+        memory_phases.reset()
+        self.addCleanup(memory_phases.reset)
+
+    def test_middleware_samples_flagged_requests(self):
+        from django.test import Client
+
+        # Disabled by default: the middleware is dropped from the chain
+        self.assertNotIn('X-Profile-File', self.client.get('/api/home_feed/', HTTP_X_PROFILE='1'))
+
+        from django.contrib.auth.models import User
+
+        profiling = dict(settings.PROFILING, ENABLED=True, OUTPUT_DIR=self.output_dir, SECRET='s3cret', MAX_FILES=1)
+        with override_settings(PROFILING=profiling):
+            client = Client()
+            self.assertNotIn('X-Profile-File', client.get('/api/home_feed/'))
+            # Anonymous clients need the secret
+            self.assertNotIn('X-Profile-File', client.get('/api/home_feed/', HTTP_X_PROFILE='1'))
+            first = client.get('/api/home_feed/', HTTP_X_PROFILE='s3cret')
+            self.assertEqual(first.status_code, 200)
+            self.assertTrue(os.path.exists(os.path.join(self.output_dir, first['X-Profile-File'])))
+
+            # Staff sessions don't; only the newest MAX_FILES profiles are kept
+            client.force_login(User.objects.create(username='staff', is_staff=True))
+            second = client.get('/api/home_feed/', HTTP_X_PROFILE='1')
+        self.assertEqual(os.listdir(self.output_dir), [second['X-Profile-File']])
+
+    def test_memory_phases(self):
+        import tracemalloc
+        from .profiling import memory_phase, memory_phases
+
+        # Not tracing: nothing is recorded
+        with memory_phase('idle'):
+            pass
+        self.assertEqual(memory_phases.snapshot(), {})
+
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        with memory_phase('outer'):
+            with memory_phase('inner'):
+                blob = bytearray(1024 * 1024)
+            del blob
+        records = memory_phases.snapshot()
+        self.assertEqual(records['inner']['calls'], 1)
+        self.assertGreaterEqual(records['inner']['peak_bytes'], 1024 * 1024)
+        # The parent's peak includes its children even though the memory was freed
+        self.assertGreaterEqual(records['outer']['peak_bytes'], 1024 * 1024)
+        self.assertLess(records['outer']['net_bytes'], 1024 * 1024)
+        self.assertTrue(records['inner']['top'])
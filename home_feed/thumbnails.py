@@ -0,0 +1,235 @@
+"""
+Thumbnail renditions of mirrored images
+
+Render processes are spawned (not forked from a threaded web worker) and
+only import this module, so it must not import models at module level.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+_SAVE_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+
+def choose_rendition_width(size):
+    """Smallest configured width that covers `size`, else the largest one"""
+    widths = sorted(settings.THUMBNAILS['WIDTHS'])
+    for width in widths:
+        if width >= size:
+            return width
+    return widths[-1]
+
+
+def thumbnail_content_type():
+    return _CONTENT_TYPES[settings.THUMBNAILS['FORMAT']]
+
+
+def render_thumbnail(source_path, target_path, width, fmt, quality):
+    """
+    Write a `width`-pixel wide rendition of source_path to target_path
+
+    Runs in a worker process. Images narrower than `width` are re-encoded
+    without upscaling. The file is written under a temporary name and
+    renamed, so a concurrent reader never sees a partial thumbnail.
+
+    Returns:
+        tuple: (width, height) of the rendition
+    """
+    from PIL import Image  # Only the render processes need Pillow
+
+    with Image.open(source_path) as img:
+        # JPEG can decode straight at a reduced scale
+        img.draft('RGB', (width, width * 4))
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        if fmt == 'jpeg' and img.mode == 'RGBA':
+            img = img.convert('RGB')
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        # Dot-prefixed so eviction scans skip files still being written
+        directory, name = os.path.split(target_path)
+        tmp_path = os.path.join(directory, f'.{name}.{uuid.uuid4().hex}.tmp')
+        img.save(tmp_path, _SAVE_FORMATS[fmt], quality=quality)
+        os.replace(tmp_path, target_path)
+        return img.size
+
+
+class ThumbnailGenerator:
+    """
+    Lazily renders thumbnails in a small process pool per web worker
+
+    Concurrent requests for the same (content hash, width) in this process
+    share one job. Workers in other processes may render the same file in
+    parallel, which is harmless thanks to the atomic rename. Every
+    EVICT_EVERY_RENDERS lazy renders the MAX_BYTES budget is enforced in a
+    background thread, so the store stays bounded without the command.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._executor = None
+        self._pid = None
+        self._renders = 0
+        self._evicting = False
+
+    @property
+    def store(self):
+        from .mirror import MirrorStore
+        return MirrorStore(settings.THUMBNAILS['ROOT'])
+
+    def source_path(self, content_hash):
+        """Path of the mirrored original"""
+        from .mirror import MirrorStore
+        return MirrorStore().path(content_hash)
+
+    def relative_path(self, content_hash, width):
+        name = f"{content_hash}_{width}.{settings.THUMBNAILS['FORMAT']}"
+        return f'{content_hash[:2]}/{content_hash[2:4]}/{name}'
+
+    def path(self, content_hash, width):
+        return self.store.root / self.relative_path(content_hash, width)
+
+    def _pool(self):
+        # A forked gunicorn worker must not reuse its parent's pool
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAILS['MAX_WORKERS'],
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, content_hash, width):
+        """
+        Start (or join) rendering of one thumbnail
+
+        Returns:
+            Future: resolves to the rendition's (width, height)
+        """
+        key = (content_hash, width)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            config = settings.THUMBNAILS
+            future = self._pool().submit(
+                render_thumbnail,
+                str(self.source_path(content_hash)),
+                str(self.path(content_hash, width)),
+                width,
+                config['FORMAT'],
+                config['QUALITY']
+            )
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def get_or_create(self, content_hash, width):
+        """
+        Path of the thumbnail, rendering it first if needed
+
+        Returns:
+            Path, or None if the original is not mirrored or rendering failed
+        """
+        path = self.path(content_hash, width)
+        if path.exists():
+            return path
+        if not self.source_path(content_hash).exists():
+            return None
+        try:
+            self.submit(content_hash, width).result(timeout=settings.THUMBNAILS['RENDER_TIMEOUT'])
+        except Exception as e:
+            logger.error(f"Thumbnail {content_hash}@{width} failed: {e}")
+            return None
+        self._rendered()
+        return path
+
+    def _rendered(self):
+        """Count a lazy render and start an eviction pass every EVICT_EVERY_RENDERS"""
+        with self._lock:
+            self._renders += 1
+            if self._evicting or self._renders < settings.THUMBNAILS['EVICT_EVERY_RENDERS']:
+                return
+            self._renders = 0
+            self._evicting = True
+        threading.Thread(target=self._evict_in_background, name='thumbnail-evict', daemon=True).start()
+
+    def _evict_in_background(self):
+        try:
+            evicted = self.evict()
+            if evicted:
+                logger.info(f"Thumbnails: evicted {evicted} least recently used files")
+        except Exception as e:
+            logger.error(f"Thumbnail eviction failed: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._evicting = False
+
+    def generate_all(self, widths=None, batch_size=500):
+        """
+        Pre-render every configured width for all mirrored images
+
+        Returns:
+            dict: rendered/failed counts and thumbnails_per_second
+        """
+        from .models import MirroredImage
+
+        widths = widths or settings.THUMBNAILS['WIDTHS']
+        started = time.monotonic()
+        stats = {'rendered': 0, 'failed': 0}
+        hashes = (
+            MirroredImage.objects.filter(evicted_at__isnull=True)
+            .order_by().values_list('content_hash', flat=True).distinct()
+        )
+
+        batch = []
+        for content_hash in hashes.iterator(chunk_size=batch_size):
+            batch.extend(
+                self.submit(content_hash, width)
+                for width in widths
+                if not self.path(content_hash, width).exists()
+            )
+            if len(batch) >= batch_size:
+                self._wait(batch, stats)
+                batch = []
+        self._wait(batch, stats)
+
+        elapsed = time.monotonic() - started
+        total = stats['rendered'] + stats['failed']
+        stats['thumbnails_per_second'] = total / elapsed if elapsed > 0 else 0.0
+        return stats
+
+    @staticmethod
+    def _wait(futures, stats):
+        for future in futures:
+            try:
+                future.result()
+                stats['rendered'] += 1
+            except Exception as e:
+                logger.debug(f"Thumbnail rendering failed: {e}")
+                stats['failed'] += 1
+
+    def evict(self):
+        """Apply the THUMBNAILS['MAX_BYTES'] budget (LRU); returns files removed"""
+        evicted, _ = self.store.evict(settings.THUMBNAILS['MAX_BYTES'])
+        return len(evicted)
+
+
+thumbnail_generator = ThumbnailGenerator()
@@ -4,4 +4,11 @@ from . import views
 urlpatterns = [
     path('api/home_feed/', views.home_feed, name='home_feed'),
     path('api/trigger_scraping/', views.trigger_scraping, name='trigger_scraping'),
+    path('api/search/', views.search_images, name='search_images'),
+    path('api/images/popular/', views.popular_images, name='popular_images'),
+    path('api/images/bulk/', views.bulk_images, name='bulk_images'),
+    path('api/mirror/stats/', views.mirror_status, name='mirror_status'),
+    path('api/stream/images/', views.stream_images, name='stream_images'),
+    path('media/<str:content_hash>', views.mirrored_image, name='mirrored_image'),
+    path('media/<str:content_hash>/<int:width>', views.thumbnail_image, name='thumbnail_image'),
 ] 
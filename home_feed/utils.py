@@ -1,24 +1,111 @@
+import gzip
+import json
 import re
+import unicodedata
 from urllib.parse import urlparse
 from typing import List, Dict, Optional
 
+# Matches ImageURL.alt max_length
+ALT_TEXT_MAX_LENGTH = 255
+
+# Renditions the Pinterest image CDN serves: https://i.pinimg.com/<size>/...
+PINIMG_WIDTHS = (236, 474, 564, 736)
+PINIMG_RENDITION_RE = re.compile(r'^(https?://i\.pinimg\.com/)(\d+x|originals)(/.+)$')
+
+# Matches ImageURL.src max_length
+IMAGE_URL_MAX_LENGTH = 500
+# Absolute http(s) URL: optional userinfo, a host, optional port, then a
+# path/query/fragment; no whitespace or control characters anywhere
+_IMAGE_URL_RE = re.compile(
+    r'(?i:https?)://'
+    r'(?:[^/?#@\s\x00-\x1f\x7f]+@)?'
+    r'(?:[^/?#@:\[\]\s\x00-\x1f\x7f]+|\[[0-9A-Fa-f:.]+\])'
+    r'(?::(\d{1,5}))?'
+    r'(?:[/?#][^\s\x00-\x1f\x7f]*)?'
+)
+
 def validate_image_url(url: str) -> bool:
-    """Validate if a URL is properly formatted and potentially an image URL"""
-    # TODO: Implement URL validation logic
-    return True
+    """
+    Validate if a URL is properly formatted and potentially an image URL
+
+    Accepts absolute http(s) URLs with a host that fit in ImageURL.src. The
+    file type is not checked because CDN URLs often have no extension. A
+    single regex match, so it is cheap enough for every ingested row.
+    """
+    if not isinstance(url, str) or len(url) > IMAGE_URL_MAX_LENGTH:
+        return False
+    match = _IMAGE_URL_RE.fullmatch(url)
+    return match is not None and (match.group(1) is None or int(match.group(1)) <= 65535)
 
 def clean_alt_text(alt_text: str) -> str:
     """Clean and normalize alt text for images"""
-    # TODO: Implement alt text cleaning
-    return ""
+    if not alt_text:
+        return ""
+    text = str(alt_text)
+    # Fold compatibility characters (full-width letters, ligatures, ...);
+    # ASCII is already in NFKC form
+    if not text.isascii():
+        text = unicodedata.normalize('NFKC', text)
+    # Drop control and format characters, then collapse whitespace runs.
+    # Printable text has none, so the per-character pass is skipped.
+    if not text.isprintable():
+        text = ''.join(ch for ch in text if unicodedata.category(ch)[0] != 'C' or ch in '\t\n')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text[:ALT_TEXT_MAX_LENGTH]
+
+def build_fts_query(query: str) -> str:
+    """
+    Turn free-form user input into a safe FTS5 MATCH expression
+
+    Every word is quoted so FTS5 operators in user input are matched
+    literally; all words must match and the last one is a prefix match
+    (search-as-you-type). Returns an empty string if there are no words.
+    """
+    words = re.findall(r'\w+', clean_alt_text(query))
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
 
 def extract_domain(url: str) -> Optional[str]:
     """Extract domain from URL"""
     # TODO: Implement domain extraction
     return ""
 
+def pinimg_rendition_url(url: str, width: int) -> Optional[str]:
+    """
+    Same Pinterest CDN image at another width
+
+    i.pinimg.com encodes the rendition in the first path segment
+    (e.g. /736x/ab/cd/<name>.jpg). Returns None for other URLs.
+    """
+    match = PINIMG_RENDITION_RE.match(url or '')
+    if not match:
+        return None
+    sizes = sorted(PINIMG_WIDTHS)
+    segment = next((f'{size}x' for size in sizes if size >= width), 'originals')
+    return f'{match.group(1)}{segment}{match.group(3)}'
+
 def generate_fallback_urls(original_url: str) -> List[str]:
     """Generate potential fallback URLs for an image"""
-    # TODO: Implement fallback URL generation for different image sizes
-    return []
+    match = PINIMG_RENDITION_RE.match(original_url or '')
+    if not match:
+        return []
+    segments = [f'{size}x' for size in sorted(PINIMG_WIDTHS, reverse=True)] + ['originals']
+    return [
+        f'{match.group(1)}{segment}{match.group(3)}'
+        for segment in segments
+        if segment != match.group(2)
+    ]
+
+def ndjson_line(row: Dict) -> str:
+    """Compact JSON for one exported row; datetimes become ISO 8601 strings"""
+    return json.dumps(row, separators=(',', ':'), default=lambda value: value.isoformat())
+
 
+def open_ndjson(path: str, mode: str = 'rt'):
+    """Open an NDJSON file, transparently (de)compressing `.gz` paths"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8', compresslevel=6)
+    return open(path, mode.replace('t', ''), encoding='utf-8')
@@ -1,24 +1,132 @@
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+import math
 import random
-from .models import ImageURL
-from .services import ImageScrapingService, ImageURLManager
+from .models import ImageURL, MirroredImage
+from .impressions import impression_buffer
+from .mirror import CONTENT_HASH_RE, MirrorStore, get_mirror_stats, lookup_mirrored, mirror_stats
+from .thumbnails import choose_rendition_width, thumbnail_content_type, thumbnail_generator
+from .utils import ndjson_line, pinimg_rendition_url
+from .scheduler import job_runner
+from .managers import ImageURLManager
+from .sources import get_sources
+from .ratelimit import FeedThrottle, ScrapeThrottle, rate_limit_store
+from .pools import response_pools
+from .stream import image_stream
+
+def serialize_image(img):
+    """Public JSON representation of an ImageURL"""
+    return {
+        'src': img.src,
+        'alt': img.alt,
+        'origin': img.origin,
+        'fallback_urls': img.fallback_urls,
+        'width': img.width,
+        'height': img.height,
+        'format': img.image_format or None,
+        'bytes': img.byte_size,
+        'palette': img.palette,
+        'source': img.source or None
+    }
+
+def use_mirrored_sources(request, images, images_data):
+    """
+    Point `src` at the local mirror for images that have a copy
+
+    The original URL moves to the front of fallback_urls so clients can
+    still reach the CDN if the mirror misses.
+    """
+    hashes = lookup_mirrored([img.id for img in images])
+    for img, data in zip(images, images_data):
+        content_hash = hashes.get(img.id)
+        if content_hash:
+            data['fallback_urls'] = [data['src']] + list(data['fallback_urls'])
+            data['src'] = request.build_absolute_uri(reverse('mirrored_image', args=[content_hash]))
+    return hashes
+
+def use_renditions(request, images, images_data, size, mirror_hashes):
+    """
+    Point `src` at the rendition closest to the requested display width
+
+    Mirrored images get a lazily rendered local thumbnail; Pinterest CDN
+    images are switched to the matching CDN size. The full-size src is kept
+    as the first fallback either way.
+    """
+    width = choose_rendition_width(size)
+    for img, data in zip(images, images_data):
+        content_hash = mirror_hashes.get(img.id)
+        if content_hash:
+            rendition = request.build_absolute_uri(reverse('thumbnail_image', args=[content_hash, width]))
+        else:
+            rendition = pinimg_rendition_url(img.src, width)
+        if not rendition:
+            continue
+        data['fallback_urls'] = [data['src']] + [url for url in data['fallback_urls'] if url != data['src']]
+        data['src'] = rendition
+        if img.width and img.height and img.width > width:
+            data['width'], data['height'] = width, max(1, round(img.height * width / img.width))
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([FeedThrottle])
 def home_feed(request):
     """
     Return random image URLs for the home feed
     Query params:
     - count: number of images to return (default: 1, max: 10)
+    - mode: 'uniform' or 'weighted' (freshness-weighted) sampling
+      (default: settings.HOME_FEED_SAMPLING)
+    - max_bytes: only images of at most this many bytes
+    - aspect: 'portrait', 'square', 'landscape' or a width/height range like '0.5-0.8'
+    - color: dominant color, a name ('blue', 'pink', ...) or '#rrggbb'
+    - source: only images from this scrape source (settings.SCRAPE_SOURCES)
+    - size: display width in pixels; src becomes the nearest available rendition
+    Filtered requests only match images whose dimensions / colors are known.
     """
     try:
         # Get count parameter
         count = int(request.GET.get('count', 1))
         count = min(count, 10)  # Limit to 10 images max
-        
+
+        size = request.GET.get('size')
+        size = int(size) if size else None
+        if size is not None and size < 1:
+            raise ValueError('size must be positive')
+
+        mode = request.GET.get('mode', settings.HOME_FEED_SAMPLING)
+        if mode not in ('uniform', 'weighted'):
+            return Response({
+                'error': "Invalid mode parameter. Must be 'uniform' or 'weighted'."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            filters = ImageURLManager.build_feed_filters(
+                request.GET.get('max_bytes'),
+                request.GET.get('aspect'),
+                request.GET.get('color'),
+                request.GET.get('source')
+            )
+        except ValueError:
+            return Response({
+                'error': "Invalid max_bytes, aspect or color parameter. Use max_bytes=<number>, "
+                         "aspect=portrait|square|landscape|<min>-<max> and color=<name>|#rrggbb."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Plain feed requests are answered from this worker's pre-encoded pool
+        if not filters and not size and not settings.IMAGE_MIRROR['ENABLED']:
+            pooled = response_pools.pop(mode, count)
+            if pooled:
+                ids, body = pooled
+                impression_buffer.record(ids)
+                return HttpResponse(body, content_type='application/json', headers={'X-Feed-Pool': 'hit'})
+
         # Get total count of available images
         total_available = ImageURLManager.get_active_count()
         
@@ -29,17 +137,15 @@ def home_feed(request):
             }, status=status.HTTP_200_OK)
         
         # Get random selection using service layer
-        selected_images = ImageURLManager.get_random_urls(count)
+        selected_images = ImageURLManager.get_random_urls(count, mode, filters)
         
-        selected_images_data = [
-            {
-                'src': img.src,
-                'alt': img.alt,
-                'origin': img.origin,
-                'fallback_urls': img.fallback_urls
-            }
-            for img in selected_images
-        ]
+        selected_images_data = [serialize_image(img) for img in selected_images]
+        mirror_hashes = {}
+        if settings.IMAGE_MIRROR['ENABLED']:
+            mirror_hashes = use_mirrored_sources(request, selected_images, selected_images_data)
+        if size:
+            use_renditions(request, selected_images, selected_images_data, size, mirror_hashes)
+        impression_buffer.record([img.id for img in selected_images])
         
         return Response({
             'message': 'Images retrieved successfully',
@@ -50,31 +156,161 @@ def home_feed(request):
         
     except ValueError:
         return Response({
-            'error': 'Invalid count parameter. Must be a number.'
+            'error': 'Invalid count or size parameter. Must be a positive number.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': f'Internal server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([FeedThrottle])
+def search_images(request):
+    """
+    Full-text search over image alt text
+    Query params:
+    - q: search text (required); every word must match, the last one as a prefix
+    - page: 1-based page number (default: 1)
+    - page_size: results per page (default: 10, max: 50)
+    - random: if "1"/"true", return a random sample of page_size matches
+      instead of the ranked page
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({
+            'error': 'Missing search query. Use ?q=...'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+        page_size = int(request.GET.get('page_size', 10))
+        page_size = max(1, min(page_size, 50))  # Limit to 50 results per page
+        random_order = request.GET.get('random', '').lower() in ('1', 'true', 'yes')
+
+        images, has_next = ImageURLManager.search(query, page, page_size, random_order)
+        images_data = [serialize_image(img) for img in images]
+
+        return Response({
+            'message': 'Search completed successfully',
+            'query': query,
+            'page': page,
+            'page_size': page_size,
+            'has_next': has_next,
+            'count': len(images_data),
+            'images': images_data
+        }, status=status.HTTP_200_OK)
+
+    except ValueError:
+        return Response({
+            'error': 'Invalid page or page_size parameter. Must be a number.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': f'Internal server error: {str(e)}'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@throttle_classes([FeedThrottle])
+def popular_images(request):
+    """
+    Return the most served images
+    Query params:
+    - limit: number of images to return (default: 10, max: 100)
+    """
+    try:
+        limit = int(request.GET.get('limit', 10))
+        limit = max(1, min(limit, 100))  # Limit to 100 images max
+
+        images_data = [
+            dict(serialize_image(img), served_count=served_count)
+            for img, served_count in ImageURLManager.get_most_served(limit)
+        ]
+
+        return Response({
+            'message': 'Popular images retrieved successfully',
+            'count': len(images_data),
+            'images': images_data
+        }, status=status.HTTP_200_OK)
+
+    except ValueError:
+        return Response({
+            'error': 'Invalid limit parameter. Must be a number.'
         }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': f'Internal server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def service_unavailable(message, retry_after):
+    """503 telling the client when to come back instead of queueing"""
+    response = Response({'error': message}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([ScrapeThrottle])
 def trigger_scraping(request):
-    """Manual trigger for scraping (for testing)"""
+    """
+    Manual trigger for scraping (for testing)
+
+    The scrape runs in a background thread of this worker and the request
+    waits at most SCRAPE_WAIT_SECONDS for it. A scrape that takes longer
+    keeps running and the request answers 202 with Retry-After. If a scrape
+    is already running (scheduled or triggered, in any worker) the request
+    waits for it and returns its result with `joined: true` instead of
+    starting a second browser, or 503 with Retry-After when that wait runs
+    out. At most SCRAPE_MAX_QUEUED requests wait at once across all
+    workers; more get 503 as well.
+    """
     try:
         # Get count parameter (optional)
         count = int(request.data.get('count', 20))
-        count = min(count, 50)  # Limit to 50 images max for scraping
+        count = min(count, 50)  # Limit to 50 images max per source
+        sources = request.data.get('sources') or None
+        if sources is not None:
+            get_sources(sources)  # ValueError for unknown names
         
-        # Use the service to scrape images
-        scraping_service = ImageScrapingService()
-        result = scraping_service.scrape_home_images(count)
+        limits = settings.RATE_LIMIT
+        wait = limits['SCRAPE_WAIT_SECONDS']
+        # Joining another process's scrape overshoots the wait by up to one
+        # poll; give it two so it answers before the request stops listening
+        hold = wait + 2 * settings.SCHEDULER['JOIN_POLL_SECONDS']
+        slot = None
+        if limits['ENABLED']:
+            # A slot is held for one wait at most; expiring it then means a
+            # killed worker can't block triggers for longer than that
+            slot = rate_limit_store.acquire_slot('scrape', limits['SCRAPE_MAX_QUEUED'], hold)
+            if slot is None:
+                return service_unavailable('Too many scrape requests queued, try again later',
+                                           limits['SCRAPE_RETRY_AFTER'])
+        try:
+            future = job_runner.submit('scrape_home_feed', join_timeout=wait, count=count, sources=sources)
+            try:
+                result = future.result(timeout=hold)
+            except FutureTimeoutError:
+                response = Response({
+                    'message': 'Scraping started and is still running, check back later',
+                    'running': True
+                }, status=status.HTTP_202_ACCEPTED)
+                response['Retry-After'] = str(max(1, math.ceil(limits['SCRAPE_RETRY_AFTER'])))
+                return response
+        finally:
+            if slot is not None:
+                rate_limit_store.release_slot(slot)
+
+        if result.get('running'):
+            return service_unavailable(result['message'], limits['SCRAPE_RETRY_AFTER'])
         
         if result['success']:
             return Response({
                 'message': result['message'],
                 'new_images_count': result['new_images_count'],
-                'total_images': result['total_images']
+                'total_images': result['total_images'],
+                'sources': result.get('sources', []),
+                'joined': result.get('joined', False)
             }, status=status.HTTP_200_OK)
         else:
             return Response({
@@ -83,9 +319,153 @@ def trigger_scraping(request):
             
     except ValueError:
         return Response({
-            'error': 'Invalid count parameter. Must be a number.'
+            'error': 'Invalid count or sources parameter. Use a number and a list of configured source names.'
         }, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         return Response({
             'error': f'Internal server error: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def bulk_images(request):
+    """
+    Stream all active images as NDJSON (one JSON object per line)
+    Query params:
+    - start_id / end_id: optional half-open id range to export
+    - shard / shards: optional shard index and shard count; splits the id
+      space into disjoint contiguous ranges so consumers can pull in parallel
+    - chunk_size: rows fetched from the database at a time
+    """
+    try:
+        chunk_size = int(request.GET.get('chunk_size', settings.BULK_EXPORT_CHUNK_SIZE))
+        chunk_size = max(1, min(chunk_size, settings.BULK_EXPORT_MAX_CHUNK_SIZE))
+
+        start_id = request.GET.get('start_id')
+        end_id = request.GET.get('end_id')
+        start_id = int(start_id) if start_id is not None else None
+        end_id = int(end_id) if end_id is not None else None
+
+        if 'shard' in request.GET or 'shards' in request.GET:
+            shard = int(request.GET.get('shard', 0))
+            shards = int(request.GET.get('shards', 1))
+            if shards < 1 or not 0 <= shard < shards:
+                raise ValueError('shard out of range')
+            start_id, end_id = ImageURLManager.get_shard_bounds(shard, shards)
+            if start_id is None:
+                # Nothing to export, stream an empty body
+                start_id, end_id = 0, 0
+
+    except ValueError:
+        return Response({
+            'error': 'Invalid parameters. start_id, end_id, shard, shards and chunk_size must be numbers.'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = ImageURLManager.iter_active_images(start_id, end_id, chunk_size)
+
+    def stream():
+        # Emit one write per database chunk instead of one per row
+        lines = []
+        for row in rows:
+            lines.append(ndjson_line(row))
+            if len(lines) >= chunk_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+@require_GET
+async def stream_images(request):
+    """
+    Server-Sent Events stream of images as they are ingested
+
+    Each `images` event carries a batch of new images and the id of the
+    newest one. Reconnecting clients send it back as Last-Event-ID (or
+    ?last_event_id=) to receive what they missed. Served from the ASGI app;
+    under WSGI every connection would hold a worker thread.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    response = StreamingHttpResponse(image_stream.events(last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass events through immediately
+    return response
+
+@require_GET
+def mirrored_image(request, content_hash):
+    """
+    Serve a mirrored image by content hash
+
+    Django only resolves the file; nginx sends the bytes through an
+    internal X-Accel-Redirect location. Without nginx (development) set
+    IMAGE_MIRROR['USE_X_ACCEL_REDIRECT'] = False to stream from Django.
+    """
+    config = settings.IMAGE_MIRROR
+    if not config['ENABLED'] or not CONTENT_HASH_RE.match(content_hash):
+        raise Http404('Image not mirrored')
+
+    store = MirrorStore()
+    path = store.path(content_hash)
+    content_type = (
+        MirroredImage.objects.filter(content_hash=content_hash, evicted_at__isnull=True)
+        .values_list('content_type', flat=True)
+        .first()
+    )
+    if content_type is None or not path.exists():
+        raise Http404('Image not mirrored')
+
+    store.touch(content_hash)
+    mirror_stats.record_serve()
+
+    if config['USE_X_ACCEL_REDIRECT']:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = config['ACCEL_REDIRECT_PREFIX'] + store.relative_path(content_hash)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    # Content-addressed: the bytes behind this URL never change
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@require_GET
+def thumbnail_image(request, content_hash, width):
+    """
+    Serve a fixed-width rendition of a mirrored image
+
+    The first request renders it in the thumbnail process pool (concurrent
+    requests for the same rendition wait on the same job); afterwards it is
+    served like any mirrored file.
+    """
+    config = settings.IMAGE_MIRROR
+    if (not config['ENABLED'] or not CONTENT_HASH_RE.match(content_hash)
+            or width not in settings.THUMBNAILS['WIDTHS']):
+        raise Http404('Rendition not available')
+
+    path = thumbnail_generator.get_or_create(content_hash, width)
+    if path is None:
+        raise Http404('Rendition not available')
+
+    thumbnail_generator.store.touch_path(path)
+    mirror_stats.record_serve()
+
+    if config['USE_X_ACCEL_REDIRECT']:
+        response = HttpResponse(content_type=thumbnail_content_type())
+        response['X-Accel-Redirect'] = (
+            settings.THUMBNAILS['ACCEL_REDIRECT_PREFIX']
+            + thumbnail_generator.relative_path(content_hash, width)
+        )
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=thumbnail_content_type())
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def mirror_status(request):
+    """Mirror disk usage and this worker's hit rate"""
+    return Response(get_mirror_stats(), status=status.HTTP_200_OK)
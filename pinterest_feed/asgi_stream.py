@@ -0,0 +1,17 @@
+"""
+ASGI config for the Server-Sent Events service (``stream`` in
+docker-compose.prod.yml).
+
+Serves the same application as ``pinterest_feed.asgi`` but starts no
+background work: the scheduler and the response pools belong to the web
+service, which has the Pinterest credentials, the mirror volumes and the
+feed traffic.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pinterest_feed.settings')
+
+application = get_asgi_application()
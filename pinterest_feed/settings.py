@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,7 +38,6 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',      # Add this
-    'django_crontab',      # Add this
     'home_feed',           # Add this
 ]
 
@@ -47,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'home_feed.profiling.ProfilingMiddleware',  # Removes itself unless PROFILING['ENABLED']; needs request.user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -131,10 +132,206 @@ REST_FRAMEWORK = {
     ],
 }
 
-# Add Cron jobs configuration
-CRONJOBS = [
-    ('0 6 * * *', 'home_feed.management.commands.scrape_images.Command.handle'),
-]
+# Bulk NDJSON export (api/images/bulk/)
+BULK_EXPORT_CHUNK_SIZE = 2000
+BULK_EXPORT_MAX_CHUNK_SIZE = 10000
+
+# Home feed sampling: 'uniform' or 'weighted' (overridable per request with ?mode=)
+HOME_FEED_SAMPLING = 'uniform'
+
+# Weighted sampling (home_feed.sampling)
+WEIGHTED_SAMPLING = {
+    'HALF_LIFE_HOURS': 72,        # Recency boost halves every 3 days
+    'MIN_WEIGHT': 0.05,           # Floor so old images still show up
+    'SERVED_EXPONENT': -0.5,      # < 0 favours images that were served less
+    'REFRESH_SECONDS': 300,       # Append new rows at least this often
+    'FULL_REBUILD_SECONDS': 3600, # Full reload to drop deactivated images
+}
+
+# Impression counting (home_feed.impressions): each worker buffers counts in
+# memory and a background thread writes them as one batched upsert, so a
+# crash loses at most FLUSH_SECONDS worth of counts
+IMPRESSIONS = {
+    'FLUSH_SECONDS': 10,
+    'MAX_PENDING': 50000,  # Flush early once this many distinct images are buffered
+}
+
+# Pre-encoded home_feed responses per worker (home_feed.pools). Plain feed
+# requests for COUNTS are answered from a buffer refilled by a background
+# thread; ingest and deactivations replace STAMP, which retires every pool
+# on the host
+RESPONSE_POOLS = {
+    'ENABLED': True,
+    'COUNTS': (1, 5, 10),       # count values served from pools
+    'REFILL_SECONDS': 0.5,
+    'HEADROOM_TICKS': 4,        # Keep this many refill intervals of recent demand buffered
+    'MIN_SIZE': 4,              # Responses per pool...
+    'MAX_SIZE': 256,            # ...bounded either way
+    'MAX_AGE_SECONDS': 60,      # Never serve a buffered response older than this
+    'MAX_USES': 2,              # Times one response may be sent when a burst empties its pool
+    'IDLE_SECONDS': 600,        # Pools nobody requested for this long stop being refilled
+    'STAMP': Path(tempfile.gettempdir()) / 'pinterest_feed_pool_version',
+}
+
+# Batched ingest of scraped and imported pins (home_feed.ingest)
+INGEST = {
+    'CHUNK_SIZE': 5000,     # Rows per INSERT transaction; keeps write locks short for readers
+}
+
+# Opt-in profiling (home_feed.profiling); nothing here costs anything while off.
+# With ENABLED, requests sending HEADER from a staff session (or with SECRET
+# as its value) are stack-sampled and written as collapsed stacks for
+# flamegraphs; with TRACEMALLOC, scrape and ingest phases record their
+# allocations (see manage.py profile_cycle)
+PROFILING = {
+    'ENABLED': False,
+    'HEADER': 'X-Profile',
+    'SECRET': '',                   # HEADER value that allows sampling without a staff session; '' = staff only
+    'ALL_REQUESTS': False,          # Sample every request, header or not
+    'SAMPLE_INTERVAL_MS': 1,
+    'OUTPUT_DIR': BASE_DIR / 'profiles',
+    'MAX_FILES': 100,               # Oldest request profiles are deleted beyond this
+    'TRACEMALLOC': False,           # Start tracing at app load
+    'TRACEMALLOC_FRAMES': 1,
+    'PHASE_TOP_ALLOCATIONS': 5,     # Top allocating lines per phase (two snapshots per phase; 0 to skip)
+}
+
+# Pooled concurrent image downloads (home_feed.fetch)
+IMAGE_FETCH = {
+    'MAX_WORKERS': 16,
+    'TIMEOUT': 10,
+    'MAX_BYTES': 20 * 1024 * 1024,
+    'ALLOW_LOCAL_FILES': False,  # Serve file:// URLs (local fixtures / offline runs)
+}
+
+# Perceptual-hash near-duplicate detection (home_feed.dedup)
+NEAR_DUPLICATES = {
+    'RUN_AFTER_SCRAPE': True,
+    'MAX_DISTANCE': 6,  # Hamming distance (out of 64 bits) treated as the same picture
+    'BATCH_SIZE': 200,
+}
+
+# Dimension / byte-size enrichment from ranged header reads (home_feed.enrichment)
+ENRICHMENT = {
+    'RUN_AFTER_SCRAPE': True,
+    'HEADER_BYTES': 32 * 1024,  # Enough for the header of nearly every JPEG/PNG/WebP
+    'BATCH_SIZE': 200,
+}
+
+# Dominant-color extraction (home_feed.colors) behind home_feed ?color=
+COLOR_EXTRACTION = {
+    'RUN_AFTER_SCRAPE': True,
+    'BATCH_SIZE': 500,          # Images clustered together in one k-means run
+    'SAMPLE_SIZE': 32,          # Images are downsampled to SAMPLE_SIZE x SAMPLE_SIZE pixels
+    'CLUSTERS': 5,
+    'ITERATIONS': 12,
+    'MIN_SHARE': 0.1,           # Colors covering less of the image are not indexed
+    'INDEX_TTL_SECONDS': 300,   # How long a worker keeps its per-color id arrays
+}
+
+# Optional local mirror of image bytes (home_feed.mirror), served by nginx
+# from an internal location via X-Accel-Redirect
+IMAGE_MIRROR = {
+    'ENABLED': False,
+    'ROOT': BASE_DIR / 'mirror',
+    'MAX_BYTES': 5 * 1024 ** 3,         # LRU eviction above this budget
+    'LOW_WATERMARK': 0.9,               # Evict down to 90% of the budget
+    'BATCH_SIZE': 100,
+    'USE_X_ACCEL_REDIRECT': True,       # False: stream files through Django
+    'ACCEL_REDIRECT_PREFIX': '/_mirror/',
+    'TOUCH_INTERVAL_SECONDS': 3600,     # Granularity of LRU access times
+}
+
+# Fixed-width renditions of mirrored images, rendered on first request
+# (GET /media/<hash>/<width>) or ahead of time with generate_thumbnails
+THUMBNAILS = {
+    'WIDTHS': [236, 474, 564, 736],     # Same steps as the Pinterest CDN
+    'FORMAT': 'webp',                   # 'webp' or 'jpeg'
+    'QUALITY': 80,
+    'MAX_WORKERS': 2,                   # Render processes per web worker (each Gunicorn worker has its own pool)
+    'ROOT': BASE_DIR / 'thumbs',
+    'RENDER_TIMEOUT': 30,               # Seconds a request waits for a render
+    'MAX_BYTES': 2 * 1024 ** 3,         # LRU eviction above this budget...
+    'EVICT_EVERY_RENDERS': 200,         # ...checked after this many on-request renders per worker
+    'ACCEL_REDIRECT_PREFIX': '/_thumbs/',
+}
+
+# Pinterest client used for login and scraping. Point BACKEND at
+# 'home_feed.simulator.FakePinterestDL' to run the pipeline offline
+PINTEREST_DL = {
+    'BACKEND': 'pinterest_dl.PinterestDL',
+    'OPTIONS': {},      # Extra with_browser() arguments, e.g. the fake's seed, latency_ms, error_rate, server_url
+}
+
+# Where scraping pulls images from (home_feed.sources). Each source runs in
+# its own browser process and records its name on ImageURL.source.
+#   TYPE: 'home' (the account's home feed), 'board' (URL) or 'search' (QUERY)
+#   COOKIES: cookie file of the account to scrape as (None: logged out).
+#            BASE_DIR / 'cookies.json' is refreshed by the automated login.
+#   QUOTA: images per scrape
+SCRAPE_SOURCES = {
+    'home': {'TYPE': 'home', 'COOKIES': BASE_DIR / 'cookies.json', 'QUOTA': 10},
+    # 'second-account': {'TYPE': 'home', 'COOKIES': BASE_DIR / 'cookies-second.json', 'QUOTA': 10},
+    # 'travel-board': {'TYPE': 'board', 'URL': 'https://www.pinterest.com/<user>/<board>/', 'QUOTA': 25},
+    # 'blue-lakes': {'TYPE': 'search', 'QUERY': 'blue lake', 'COOKIES': BASE_DIR / 'cookies.json', 'QUOTA': 25},
+}
+
+SCRAPE_RUNNER = {
+    'MAX_PROCESSES': None,          # None: limited by CPU count and available RAM only
+    'MEMORY_PER_BROWSER_MB': 600,   # RSS of one headless Firefox while scrolling
+    'BROWSER_TIMEOUT': 10,
+    'TIMEOUT_SECONDS': 900,         # Whole run; unfinished sources are reported as timed out
+    'TERMINATE_GRACE_SECONDS': 10,  # After a timeout, time workers get to quit their browsers before being killed
+}
+
+# In-process scheduler (home_feed.scheduler). Every web worker polls the
+# ScheduledJob table; a DB lease makes sure only one of them runs a job, and
+# manual triggers (API, scrape_images) join a run that is already going.
+SCHEDULER = {
+    'ENABLED': True,
+    'POLL_SECONDS': 30,
+    'LEASE_SECONDS': 120,           # Renewed every LEASE_SECONDS / 3 while a job runs
+    'JOIN_TIMEOUT_SECONDS': 900,    # How long a caller waits for another process's run
+    'JOIN_POLL_SECONDS': 2,
+    'JOBS': {
+        'scrape_home_feed': {
+            'CALLABLE': 'home_feed.jobs.scrape_home_feed',
+            'CRON': '0 6 * * *',    # UTC
+            'JITTER_SECONDS': 300,
+            'KWARGS': {'count': 20},
+            'BACKOFF_BASE_SECONDS': 60,     # Retry after 1, 2, 4, ... minutes on failure
+            'BACKOFF_MAX_SECONDS': 3600,
+        },
+    },
+}
+
+# Server-Sent Events push of new images (api/stream/images/, ASGI only)
+IMAGE_STREAM = {
+    'POLL_SECONDS': 2,          # Check for rows committed by other processes
+    'HEARTBEAT_SECONDS': 15,    # Comment line sent to idle connections so proxies keep them open
+    'BATCH_MAX_IMAGES': 200,    # Images per event
+    'SUBSCRIBER_QUEUE': 32,     # Events buffered per client; a client further behind is disconnected and resumes
+    'HISTORY_MESSAGES': 64,     # Recent events kept to serve Last-Event-ID resumes without a query
+    'REPLAY_MAX_IMAGES': 1000,  # Cap on images replayed to a resuming client
+    'RETRY_MS': 3000,           # Client reconnect delay
+}
+
+# Admission control shared by all workers on the host (home_feed.ratelimit)
+RATE_LIMIT = {
+    'ENABLED': True,
+    'STORE': Path(tempfile.gettempdir()) / 'pinterest_feed_ratelimit.sqlite3',
+    # Token buckets: RATE tokens/second refill up to BURST, per client and overall
+    'SCOPES': {
+        'feed': {'RATE': 10, 'BURST': 30, 'GLOBAL_RATE': 200, 'GLOBAL_BURST': 400},
+        'scrape': {'RATE': 1 / 60, 'BURST': 3, 'GLOBAL_RATE': 1 / 30, 'GLOBAL_BURST': 5},
+    },
+    'SCRAPE_MAX_QUEUED': 4,         # Trigger requests waiting at once; more get 503
+    'SCRAPE_WAIT_SECONDS': 90,      # Longest a trigger request waits for a scrape; stays below gunicorn's 120s timeout
+    'SCRAPE_RETRY_AFTER': 60,
+}
+
+# Gives each test run its own RATE_LIMIT store and RESPONSE_POOLS stamp
+TEST_RUNNER = 'pinterest_feed.test_runner.IsolatedStateRunner'
 
 # Add Logging configuration
 LOGGING = {
@@ -19,6 +19,19 @@ DATABASES = {
     }
 }
 
+# Mirrored images live on a volume that the host nginx can read
+IMAGE_MIRROR = dict(IMAGE_MIRROR, ROOT="/app/mirror")
+THUMBNAILS = dict(THUMBNAILS, ROOT="/app/thumbs")
+
+# Rate-limit buckets shared by all Gunicorn workers; behind nginx, take the
+# client IP from X-Forwarded-For rather than the proxy's address
+RATE_LIMIT = dict(RATE_LIMIT, STORE="/app/db/ratelimit.sqlite3")
+REST_FRAMEWORK = dict(REST_FRAMEWORK, NUM_PROXIES=1)
+
+# Next to the database so every container that writes images (web, one-off
+# management commands) retires the web workers' response pools
+RESPONSE_POOLS = dict(RESPONSE_POOLS, STAMP="/app/db/pool_version")
+
 # Static files will be collected to this directory at build/deploy time
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 STATIC_URL = "/static/"
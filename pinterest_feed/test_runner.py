@@ -0,0 +1,32 @@
+"""
+Test runner that keeps host-wide state out of the shared temp directory.
+
+RATE_LIMIT['STORE'] and RESPONSE_POOLS['STAMP'] default to fixed files in
+/tmp so every worker on a host agrees on them. Under tests that would throttle
+and invalidate against earlier runs and any local dev server, so each run gets
+its own directory.
+"""
+
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class IsolatedStateRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._state_dir = tempfile.TemporaryDirectory(prefix='pinterest_feed_tests_')
+        root = Path(self._state_dir.name)
+        self._state_overrides = override_settings(
+            RATE_LIMIT=dict(settings.RATE_LIMIT, STORE=root / 'ratelimit.sqlite3'),
+            RESPONSE_POOLS=dict(settings.RESPONSE_POOLS, STAMP=root / 'pool_version'),
+        )
+        self._state_overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._state_overrides.disable()
+        self._state_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
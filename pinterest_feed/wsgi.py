@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pinterest_feed.settings')
 
 application = get_wsgi_application()
+
+from home_feed.impressions import start_impression_flusher  # noqa: E402  (needs the app registry)
+from home_feed.pools import start_response_pools  # noqa: E402
+from home_feed.scheduler import start_scheduler  # noqa: E402
+
+start_scheduler()
+start_response_pools()
+start_impression_flusher()